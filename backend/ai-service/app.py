@@ -1,15 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, Security
+from fastapi import FastAPI, HTTPException, Depends, Security, UploadFile, File, Form, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
-from services.question_generator import QuestionGenerator
+from services.question_generator import QuestionGenerator, CHUNK_MAX_CHARS
+from services.question_cache import QuestionCache
+from services.question_bank import QuestionBank
+from services.single_flight import SingleFlight
+from services.gemini_scheduler import GeminiScheduler
+from services.deadline import deadline_stats
+from services.circuit_breaker import CircuitBreaker
+from services.pool_warmer import QuestionPoolWarmer, parse_hours
+from services.fast_json import FastJSONResponse, FastJSONRoute, dumps
+from services.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from services.upload_limit import UploadLimitMiddleware
+from services.token_verifier import InvalidTokenError, TokenVerifier
+from services.jobs import JobContext, JobQueue, JobStore
+from services.url_guard import UnsafeURLError, check_public_url, pin_url
+from services.pdf_processor import PDFProcessor, PDFProcessingError
+from services.pdf_cache import PDFResultCache
+from services.content_analyzer import ContentAnalyzer
+from services.dedup import QuestionDeduplicator
+from services.embeddings import EmbeddingModel
+from services.chat_tutor import ChatTutor
+from services.keyword_engine import get_keyword_engine
+from services.topic_dictionary import BRANCH_SUBJECTS, TUTOR_ALIASES, TUTOR_RESPONSES, get_topic_matcher
 import os
+import asyncio
+import base64
+import hashlib
+import tempfile
+import httpx
+import aiofiles
 from dotenv import load_dotenv
 try:
     import google.generativeai as genai  # type: ignore
 except ImportError:
     genai = None
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+import uuid
 import logging
 from datetime import datetime
 
@@ -30,22 +59,34 @@ class QuestionGenerationRequest(BaseModel):
     branch: str = Field(default="", description="Academic branch")
     semester: int = Field(default=1, ge=1, le=8, description="Semester number")
 
+class BatchQuestionGenerationRequest(BaseModel):
+    requests: List[QuestionGenerationRequest] = Field(..., min_length=1, max_length=20, description="Question generation specs to run together")
+
 class ContentAnalysisRequest(BaseModel):
     content: str = Field(..., description="Text content to analyze")
     content_type: str = Field(default="syllabus", pattern="^(syllabus|notes|textbook)$", description="Type of content")
     branch: str = Field(default="", description="Academic branch")
     semester: int = Field(default=1, ge=1, le=8, description="Semester number")
 
+class BatchContentAnalysisRequest(BaseModel):
+    requests: List[ContentAnalysisRequest] = Field(..., min_length=1, max_length=50, description="Documents to analyze together")
+
 class ChatTutorRequest(BaseModel):
     message: str = Field(..., description="Student's question or message")
-    context: Optional[Dict[str, Any]] = Field(default=None, description="Optional context")
-    conversation_history: List[Dict[str, Any]] = Field(default=[], description="Previous conversation")
+    context: Optional[Dict[str, Any]] = Field(default=None, description="Optional context (subject, topic, collection)")
+    conversation_history: List[Dict[str, Any]] = Field(default=[], description="Previous conversation as {role, content} turns")
+
+class TutorIndexRequest(BaseModel):
+    content: str = Field(..., min_length=1, description="Syllabus or notes text to make searchable for the tutor")
+    source: str = Field(default="Course Notes", description="Name shown when the tutor cites this material")
+    collection: str = Field(default="default", description="Course or class the material belongs to")
 
 class PDFProcessRequest(BaseModel):
     pdf_url: Optional[str] = Field(default=None, description="URL of the PDF file")
-    pdf_base64: Optional[str] = Field(default=None, description="Base64 encoded PDF content")
+    pdf_base64: Optional[str] = Field(default=None, description="Base64 encoded PDF content (prefer /api/ai/process-pdf/upload for large files)")
     extract_images: bool = Field(default=False, description="Whether to extract images")
     analyze_structure: bool = Field(default=True, description="Whether to analyze document structure")
+    tutor_collection: Optional[str] = Field(default=None, description="Also index the extracted text for the chat tutor under this collection")
 
 class FeedbackRequest(BaseModel):
     performance_data: Dict[str, Any] = Field(default={}, description="Student's performance metrics")
@@ -57,8 +98,11 @@ class FeedbackRequest(BaseModel):
 app = FastAPI(
     title="AdaptiLearn AI Service",
     description="AI-powered question generation and content analysis for adaptive learning using Gemini AI",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Endpoints return dicts they built themselves; render them with orjson and skip re-validation
+app.router.route_class = FastJSONRoute
 
 # CORS middleware for frontend integration
 app.add_middleware(
@@ -78,6 +122,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, in-flight and payload size metrics, served at /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Initialize Gemini AI service
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 gemini_model = None
@@ -100,31 +149,215 @@ else:
     logger.warning("Google Generative AI library not available. AI features will be limited.")
     gemini_model = None
 
+# Cache for generated question sets (local LRU+TTL, plus Redis when REDIS_URL is set)
+question_cache = None
+if os.getenv("CACHE_ENABLED", "true").lower() == "true":
+    question_cache = QuestionCache(
+        max_entries=int(os.getenv("QUESTION_CACHE_MAX_ENTRIES", "1024")),
+        ttl=int(os.getenv("CACHE_TTL", "3600")),
+        redis_url=os.getenv("REDIS_URL")
+    )
+
+# Near-duplicate filtering of generated questions (exact-match only without sentence-transformers)
+embedding_model = None
+if os.getenv("EMBEDDING_DEDUP_ENABLED", "true").lower() == "true":
+    embedding_model = EmbeddingModel(
+        model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+        cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    )
+question_deduplicator = QuestionDeduplicator(
+    embedder=embedding_model,
+    threshold=float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", "0.9"))
+)
+
+# Validated AI questions are banked and served again before Gemini is asked for more
+question_bank = None
+if os.getenv("QUESTION_BANK_ENABLED", "true").lower() == "true":
+    question_bank = QuestionBank(os.getenv("QUESTION_BANK_PATH", "./data/question_bank.sqlite3"))
+
+# Priority admission for Gemini calls under this worker's share of the API quota
+gemini_scheduler = GeminiScheduler(
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    requests_per_minute=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60")),
+    tokens_per_minute=float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "0"))
+)
+
+# Short-circuits Gemini calls to the fallback path while the API is failing or too slow
+gemini_breaker = CircuitBreaker(
+    name="Gemini",
+    window_seconds=float(os.getenv("GEMINI_BREAKER_WINDOW_SECONDS", "60")),
+    min_calls=int(os.getenv("GEMINI_BREAKER_MIN_CALLS", "5")),
+    failure_rate=float(os.getenv("GEMINI_BREAKER_FAILURE_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("GEMINI_BREAKER_SLOW_CALL_SECONDS", "30")),
+    open_seconds=float(os.getenv("GEMINI_BREAKER_OPEN_SECONDS", "30"))
+)
+
 # Initialize services (Gemini only)
-question_generator = QuestionGenerator(gemini_model=gemini_model)
+question_generator = QuestionGenerator(
+    gemini_model=gemini_model,
+    scheduler=gemini_scheduler,
+    breaker=gemini_breaker,
+    request_timeout=float(os.getenv("TIMEOUT_SECONDS", "60")),
+    cache=question_cache,
+    chunk_concurrency=int(os.getenv("CHUNK_CONCURRENCY", "4")),
+    deduplicator=question_deduplicator,
+    bank=question_bank
+)
+
+# Off-peak precomputation of question pools for every branch/subject/difficulty/type;
+# runs in-process when POOL_WARMER_ENABLED is set, or standalone via warm_question_pool.py
+pool_warmer = None
+if question_bank and gemini_model:
+    pool_warmer = QuestionPoolWarmer(
+        question_generator,
+        question_bank,
+        pool_size=int(os.getenv("POOL_SIZE", "20")),
+        batch_size=int(os.getenv("POOL_BATCH_SIZE", "5")),
+        semesters=[int(semester) for semester in os.getenv("POOL_SEMESTERS", "1").split(",") if semester.strip()],
+        off_peak_hours=parse_hours(os.getenv("POOL_WARM_HOURS", "1-6")),
+        interval=float(os.getenv("POOL_WARM_INTERVAL", "300"))
+    )
+
+# Retrieval-augmented tutor over indexed course material (needs numpy + sentence-transformers)
+tutor = None
+if embedding_model:
+    tutor = ChatTutor(
+        embedder=embedding_model,
+        generate=question_generator.generate_text if gemini_model else None,
+        index_dir=os.getenv("TUTOR_INDEX_DIR") or None,
+        top_k=int(os.getenv("TUTOR_TOP_K", "4")),
+        min_score=float(os.getenv("TUTOR_MIN_SCORE", "0.35"))
+    )
+
+# Compile the branch topic dictionary once; every endpoint shares the automaton
+topic_matcher = get_topic_matcher()
+# Corpus IDF table for keyword ranking, loaded once (rebuild with build_idf_table.py)
+keyword_engine = get_keyword_engine(os.getenv("KEYWORD_IDF_PATH") or None)
+content_analyzer = ContentAnalyzer(matcher=topic_matcher, keyword_engine=keyword_engine)
+
+# PDF extraction runs in a process pool with per-document limits
+PDF_MAX_SIZE = int(os.getenv("PDF_MAX_SIZE", "50485760"))
+PDF_CHUNK_SIZE = 64 * 1024
+PDF_MAX_REDIRECTS = 5
+PDF_HEADER = b"%PDF-"
+# Multipart bodies are capped before parsing; one chunk of slack covers the form framing
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=PDF_MAX_SIZE + PDF_CHUNK_SIZE,
+    paths=["/api/ai/process-pdf/upload", "/api/jobs/process-pdf/upload"]
+)
+pdf_processor = PDFProcessor(
+    max_workers=int(os.getenv("PDF_WORKERS", "2")),
+    time_limit=float(os.getenv("PDF_TIME_LIMIT", "60")),
+    memory_limit_mb=int(os.getenv("PDF_MEMORY_LIMIT_MB", "1024")),
+    max_text_chars=int(os.getenv("PDF_MAX_TEXT_CHARS", "500000")),
+    method=os.getenv("TEXT_EXTRACTION_METHOD", "pdfplumber")
+)
+
+# Extraction results are cached on disk by the SHA-256 of the PDF bytes
+pdf_cache = None
+if os.getenv("PDF_CACHE_ENABLED", "true").lower() == "true":
+    pdf_cache = PDFResultCache(
+        directory=os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "adaptilearn-pdf-cache")),
+        max_bytes=int(os.getenv("PDF_CACHE_MAX_MB", "512")) * 1024 * 1024
+    )
+
+# Concurrent uploads of the same PDF share one extraction
+pdf_inflight = SingleFlight()
+
+# Long-running generation and PDF ingestion run as background jobs; state lives in
+# SQLite so queued and interrupted jobs are picked up again after a restart
+JOBS_SPOOL_DIR = os.getenv("JOBS_SPOOL_DIR", "./data/job_files")
+
+def _remove_spool_file(params: Dict[str, Any]) -> None:
+    spool_path = params.get("spool_path")
+    if spool_path and os.path.exists(spool_path):
+        os.remove(spool_path)
+
+job_queue = JobQueue(
+    JobStore(os.getenv("JOBS_DB_PATH", "./data/jobs.sqlite3")),
+    handlers={},
+    workers=int(os.getenv("JOBS_WORKERS", "2")),
+    retention_seconds=float(os.getenv("JOBS_RETENTION_HOURS", "24")) * 3600,
+    on_purge=lambda job: _remove_spool_file(job["params"])
+)
+
+@app.on_event("startup")
+async def preload_models() -> None:
+    if embedding_model and os.getenv("PRELOAD_MODELS", "true").lower() == "true":
+        # Load in the background so startup is not held up by the model download
+        app.state.embedding_preload = asyncio.create_task(embedding_model.load())
+    if pool_warmer and os.getenv("POOL_WARMER_ENABLED", "false").lower() == "true":
+        pool_warmer.start()
+    job_queue.start()
+    if token_verifier:
+        app.state.signing_key_preload = asyncio.create_task(token_verifier.keys.preload())
+
+@app.on_event("shutdown")
+async def shutdown_workers() -> None:
+    if pool_warmer:
+        await pool_warmer.stop()
+    await job_queue.stop()
+    job_queue.store.close()
+    pdf_processor.shutdown()
+    if question_bank:
+        question_bank.close()
+
+# Latency budget for AI endpoints; past it they answer from the bank or rule-based fallbacks
+DEFAULT_LATENCY_BUDGET_MS = int(float(os.getenv("FALLBACK_TIMEOUT", "5")) * 1000)
+MAX_LATENCY_BUDGET_MS = 120000
+
+def latency_budget(
+    budget_ms: Optional[int] = Query(default=None, ge=0, le=MAX_LATENCY_BUDGET_MS, description="Latency budget in milliseconds"),
+    x_latency_budget_ms: Optional[int] = Header(default=None, ge=0, le=MAX_LATENCY_BUDGET_MS)
+) -> float:
+    """Seconds an endpoint may wait on AI work: ?budget_ms=, then X-Latency-Budget-Ms, then FALLBACK_TIMEOUT"""
+    for value in (budget_ms, x_latency_budget_ms):
+        if value is not None:
+            return value / 1000
+    return DEFAULT_LATENCY_BUDGET_MS / 1000
 
 # Initialize security
 security = HTTPBearer()
 
+# Firebase ID tokens are verified against Google's cached signing keys when enabled;
+# otherwise any token is accepted and a development user is returned
+token_verifier = None
+if os.getenv("FIREBASE_VERIFY_TOKENS", "false").lower() == "true":
+    token_verifier = TokenVerifier(
+        project_id=os.getenv("FIREBASE_PROJECT_ID", ""),
+        cache_size=int(os.getenv("FIREBASE_TOKEN_CACHE_SIZE", "10000")),
+        leeway=int(os.getenv("FIREBASE_TOKEN_LEEWAY_SECONDS", "0"))
+    )
+
 # Dependency for Firebase Auth verification
 async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> Dict[str, str]:
     """
     Verify Firebase ID token from the frontend
-    In production, implement proper Firebase Admin SDK token verification
+    Signature checks are skipped for tokens already verified and not yet expired
     """
     try:
         token = credentials.credentials
         
-        # TODO: Implement Firebase Admin SDK token verification
-        # For now, accept any token for development with better validation
         if not token:
             raise HTTPException(status_code=401, detail="Authentication token is required")
         
+        if token_verifier:
+            try:
+                claims = await token_verifier.verify(token)
+            except InvalidTokenError as e:
+                logger.warning(f"Rejected authentication token: {str(e)}")
+                raise HTTPException(status_code=401, detail="Invalid authentication token")
+            return {
+                "uid": claims["sub"],
+                "email": claims.get("email", ""),
+                "verified": str(claims.get("email_verified", False)).lower()
+            }
+        
         if len(token) < 10:
             raise HTTPException(status_code=401, detail="Invalid authentication token format")
         
-        # In development, return mock user data
-        # In production, decode and verify the Firebase JWT token
+        # Verification is off (development): return mock user data
         return {
             "uid": f"user_{len(token)}", 
             "email": "demo@adaptilearn.com",
@@ -135,7 +368,7 @@ async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Secu
         raise
     except Exception as e:
         logger.error(f"Token verification error: {str(e)}")
-        raise HTTPException(status_code=401, detail="Token verification failed")
+        raise HTTPException(status_code=503, detail="Token verification is temporarily unavailable")
 
 # Health check endpoint
 @app.get("/health")
@@ -144,6 +377,22 @@ async def health_check() -> Dict[str, Any]:
     ai_services_status: Dict[str, Any] = {
         "gemini": bool(gemini_model),
         "question_generator": bool(question_generator),
+        "gemini_max_concurrency": question_generator.max_concurrency,
+        "gemini_scheduler": gemini_scheduler.stats(),
+        "gemini_circuit": gemini_breaker.stats(),
+        "latency_budgets": deadline_stats(),
+        "question_cache": question_cache.stats() if question_cache else None,
+        "pdf_cache": pdf_cache.stats() if pdf_cache else None,
+        "question_dedup": question_deduplicator.stats(),
+        "question_bank": question_bank.stats() if question_bank else None,
+        "question_pool": pool_warmer.stats() if pool_warmer else None,
+        "coalesced_requests": {
+            "generation": question_generator.inflight.stats(),
+            "pdf_extraction": pdf_inflight.stats()
+        },
+        "tutor": tutor.stats() if tutor else None,
+        "jobs": job_queue.stats(),
+        "auth": token_verifier.stats() if token_verifier else None,
         "timestamp": datetime.now().isoformat()
     }
     
@@ -153,11 +402,56 @@ async def health_check() -> Dict[str, Any]:
         "version": "1.0.0"
     }
 
+def _cache_lookups() -> Dict[Tuple[str, ...], float]:
+    """Hit and miss counts of each cache, read from the stats the caches already keep"""
+    lookups: Dict[Tuple[str, ...], float] = {}
+    if question_cache:
+        stats = question_cache.stats()
+        lookups.update({
+            ("question_cache", "local_hit"): stats["local_hits"],
+            ("question_cache", "redis_hit"): stats["redis_hits"],
+            ("question_cache", "miss"): stats["misses"]
+        })
+    if pdf_cache:
+        stats = pdf_cache.stats()
+        lookups.update({("pdf_cache", "hit"): stats["hits"], ("pdf_cache", "miss"): stats["misses"]})
+    if token_verifier:
+        stats = token_verifier.stats()
+        lookups.update({("verified_tokens", "hit"): stats["hits"], ("verified_tokens", "miss"): stats["misses"]})
+    return lookups
+
+def _cache_hit_ratios() -> Dict[Tuple[str, ...], float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), count in _cache_lookups().items():
+        hits_and_lookups = totals.setdefault(cache, [0, 0])
+        hits_and_lookups[0] += count if result != "miss" else 0
+        hits_and_lookups[1] += count
+    return {(cache,): hits / lookups if lookups else 0.0 for cache, (hits, lookups) in totals.items()}
+
+REGISTRY.callback(
+    "counter", "adaptilearn_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"), _cache_lookups
+)
+REGISTRY.callback(
+    "gauge", "adaptilearn_cache_hit_ratio", "Share of lookups served from each cache since startup", ("cache",), _cache_hit_ratios
+)
+REGISTRY.callback(
+    "gauge", "adaptilearn_gemini_queue_depth", "Gemini calls waiting for a scheduler slot", ("priority",),
+    lambda: {(priority,): depth for priority, depth in gemini_scheduler.queue_depth().items()}
+)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Metrics in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(REGISTRY.render(), headers={"Content-Type": CONTENT_TYPE})
+
 # Question Generation Endpoints
 @app.post("/api/ai/generate-questions")
 async def generate_questions(
     request: QuestionGenerationRequest,
-    user: Dict[str, str] = Depends(verify_firebase_token)
+    user: Dict[str, str] = Depends(verify_firebase_token),
+    budget: float = Depends(latency_budget)
 ) -> Dict[str, Any]:
     """
     Generate questions from provided content using AI
@@ -171,7 +465,9 @@ async def generate_questions(
             question_type=request.question_type,
             subject=request.subject,
             branch=request.branch,
-            semester=request.semester
+            semester=request.semester,
+            user_id=user["uid"],
+            budget=budget
         )
         
         logger.info(f"Generated {len(questions)} questions for user {user['uid']}")
@@ -184,6 +480,7 @@ async def generate_questions(
                 "difficulty": request.difficulty,
                 "question_type": request.question_type,
                 "subject": request.subject,
+                "latency_budget_ms": int(budget * 1000),
                 "generated_at": datetime.now().isoformat()
             }
         }
@@ -192,6 +489,96 @@ async def generate_questions(
         logger.error(f"Error generating questions: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate questions: {str(e)}")
 
+@app.post("/api/ai/generate-questions/stream")
+async def stream_questions(
+    request: QuestionGenerationRequest,
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> StreamingResponse:
+    """
+    Stream generated questions as NDJSON, one line per question as soon as it is parsed
+    """
+    async def question_lines() -> AsyncIterator[bytes]:
+        count = 0
+        try:
+            async for question in question_generator.stream_questions(
+                content=request.content,
+                num_questions=request.num_questions,
+                difficulty=request.difficulty,
+                question_type=request.question_type,
+                subject=request.subject,
+                branch=request.branch,
+                semester=request.semester,
+                user_id=user["uid"]
+            ):
+                yield dumps({"type": "question", "index": count, "question": question}) + b"\n"
+                count += 1
+            
+            logger.info(f"Streamed {count} questions for user {user['uid']}")
+            yield dumps({
+                "type": "done",
+                "metadata": {
+                    "total_questions": count,
+                    "difficulty": request.difficulty,
+                    "question_type": request.question_type,
+                    "subject": request.subject,
+                    "generated_at": datetime.now().isoformat()
+                }
+            }) + b"\n"
+        except Exception as e:
+            logger.error(f"Error streaming questions: {str(e)}")
+            yield dumps({"type": "error", "detail": f"Failed to generate questions: {str(e)}"}) + b"\n"
+    
+    return StreamingResponse(question_lines(), media_type="application/x-ndjson")
+
+@app.post("/api/ai/generate-questions/batch")
+async def generate_questions_batch(
+    request: BatchQuestionGenerationRequest,
+    user: Dict[str, str] = Depends(verify_firebase_token),
+    budget: float = Depends(latency_budget)
+) -> Dict[str, Any]:
+    """
+    Generate several question sets in one call, with a result and error per spec
+    """
+    try:
+        batch_results = await question_generator.generate_question_batch(
+            [spec.model_dump() for spec in request.requests],
+            user_id=user["uid"],
+            budget=budget
+        )
+        
+        results = []
+        for index, (spec, result) in enumerate(zip(request.requests, batch_results)):
+            results.append({
+                "index": index,
+                "success": result["success"],
+                "questions": result["questions"],
+                "error": result["error"],
+                "metadata": {
+                    "total_questions": len(result["questions"]),
+                    "difficulty": spec.difficulty,
+                    "question_type": spec.question_type,
+                    "subject": spec.subject
+                }
+            })
+        
+        total_questions = sum(len(result["questions"]) for result in results)
+        logger.info(f"Generated {total_questions} questions in {len(results)} sets for user {user['uid']}")
+        
+        return {
+            "success": True,
+            "results": results,
+            "metadata": {
+                "total_specs": len(results),
+                "succeeded": sum(1 for result in results if result["success"]),
+                "total_questions": total_questions,
+                "generated_at": datetime.now().isoformat()
+            }
+        }
+    
+    except Exception as e:
+        logger.error(f"Error generating question batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate question batch: {str(e)}")
+
 # Content Analysis Endpoints
 @app.post("/api/ai/analyze-content")
 async def analyze_content(
@@ -202,48 +589,8 @@ async def analyze_content(
     Analyze content and extract topics, keywords, and structure
     """
     try:
-        # Analyze content dynamically based on actual content
-        content_words = len(request.content.split())
-        content_length = len(request.content)
-        
-        # Extract topics from content (basic keyword extraction)
-        programming_topics = ["algorithm", "data structure", "programming", "software", "computer", 
-                             "network", "database", "machine learning", "ai", "web", "mobile", "security",
-                             "python", "java", "javascript", "react", "node", "mongodb", "mysql"]
-        found_topics = [topic.title() for topic in programming_topics if topic.lower() in request.content.lower()]
-        
-        # Extract keywords (most common words, filtering common words)
-        words = request.content.lower().split()
-        stop_words = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by", "is", "are", "was", "were"}
-        keywords = [word for word in words if len(word) > 3 and word not in stop_words]
-        keyword_counts: Dict[str, int] = {}
-        for word in keywords:
-            keyword_counts[word] = keyword_counts.get(word, 0) + 1
-        top_keywords = sorted(list(keyword_counts.keys()), key=lambda x: keyword_counts[x], reverse=True)[:8]
-        
-        # Determine difficulty based on content complexity
-        if content_words < 300:
-            difficulty = "beginner"
-        elif content_words < 800:
-            difficulty = "intermediate"
-        else:
-            difficulty = "advanced"
-            
-        # Estimate study time based on content length
-        estimated_hours = max(1, content_words // 150)  # Rough estimate: 150 words per hour
-        
-        analysis: Dict[str, Any] = {
-            "topics": found_topics[:6] if found_topics else ["General Programming"],
-            "keywords": top_keywords,
-            "difficulty_level": difficulty,
-            "estimated_study_time": f"{estimated_hours} hours",
-            "structure": {
-                "estimated_chapters": max(1, content_words // 250),
-                "estimated_sections": max(2, content_words // 100),
-                "content_length_words": content_words,
-                "content_length_chars": content_length
-            }
-        }
+        # Single pass over the content for topics, keywords and word counts
+        analysis: Dict[str, Any] = content_analyzer.analyze(request.content, request.branch)
         
         logger.info(f"Analyzed content for user {user['uid']}")
         
@@ -262,40 +609,90 @@ async def analyze_content(
         logger.error(f"Error analyzing content: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to analyze content: {str(e)}")
 
+@app.post("/api/ai/analyze-content/batch")
+async def analyze_content_batch(
+    request: BatchContentAnalysisRequest,
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> Dict[str, Any]:
+    """
+    Analyze many documents (e.g. a bulk syllabus import) in one call; keywords for
+    the whole batch are scored together
+    """
+    try:
+        items = request.requests
+        # CPU-bound for large imports, so keep it off the event loop
+        analyses = await asyncio.to_thread(
+            content_analyzer.analyze_batch,
+            [item.content for item in items],
+            [item.branch for item in items]
+        )
+        
+        logger.info(f"Analyzed {len(items)} documents for user {user['uid']}")
+        
+        return {
+            "success": True,
+            "results": [
+                {
+                    "index": index,
+                    "analysis": analysis,
+                    "content_type": item.content_type,
+                    "branch": item.branch,
+                    "semester": item.semester
+                }
+                for index, (item, analysis) in enumerate(zip(items, analyses))
+            ],
+            "metadata": {
+                "documents": len(items),
+                "analyzed_at": datetime.now().isoformat()
+            }
+        }
+    
+    except Exception as e:
+        logger.error(f"Error analyzing content batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to analyze content batch: {str(e)}")
+
 # AI Tutoring Endpoints
 @app.post("/api/ai/chat-tutor")
 async def chat_tutor(
     request: ChatTutorRequest,
-    user: Dict[str, str] = Depends(verify_firebase_token)
+    user: Dict[str, str] = Depends(verify_firebase_token),
+    budget: float = Depends(latency_budget)
 ) -> Dict[str, Any]:
     """
     AI tutoring chatbot for answering student questions
     """
     try:
-        # Generate dynamic response based on the user's message
-        message_lower = request.message.lower()
-        
-        # Generate contextual response based on content analysis
-        if "algorithm" in message_lower:
-            topic_response = "Algorithms are step-by-step procedures for solving problems. They're fundamental in computer science and help us solve complex problems efficiently."
-            sources = ["Data Structures and Algorithms Textbook", "Algorithm Design Manual"]
-            confidence = 0.9
-        elif "data structure" in message_lower:
-            topic_response = "Data structures organize and store data efficiently. Common ones include arrays, linked lists, trees, hash tables, and graphs. Each has specific use cases and performance characteristics."
-            sources = ["Introduction to Data Structures", "CS Fundamentals Course"]
-            confidence = 0.9
-        elif "programming" in message_lower or "code" in message_lower:
-            topic_response = "Programming involves writing instructions for computers to execute. It requires logical thinking, problem-solving skills, and understanding of syntax and algorithms."
-            sources = ["Programming Fundamentals", "Software Development Best Practices"]
-            confidence = 0.85
-        elif "database" in message_lower:
-            topic_response = "Databases store and manage data systematically. SQL databases use structured tables, while NoSQL databases offer flexible schemas for different data types."
-            sources = ["Database Systems Concepts", "SQL and NoSQL Guide"]
-            confidence = 0.88
-        elif "machine learning" in message_lower or "ml" in message_lower:
-            topic_response = "Machine Learning enables computers to learn patterns from data without explicit programming. It includes supervised, unsupervised, and reinforcement learning approaches."
-            sources = ["Introduction to Machine Learning", "AI and ML Fundamentals"]
-            confidence = 0.87
+        # Prefer an answer grounded in indexed course material
+        grounded = None
+        if tutor is not None:
+            grounded = await tutor.answer(request.message, request.context, request.conversation_history, budget)
+        
+        # Look up every dictionary term in the message with one automaton pass
+        matched = topic_matcher.match(request.message)
+        topics = {TUTOR_ALIASES.get(term, term) for term in matched}
+        tutor_topic = next((topic for topic in TUTOR_RESPONSES if topic in topics), None)
+        
+        if grounded:
+            topic_response = grounded["message"]
+            sources = grounded["sources"]
+            confidence = grounded["confidence"]
+        elif tutor_topic:
+            canned = TUTOR_RESPONSES[tutor_topic]
+            topic_response = canned["message"]
+            sources = list(canned["sources"])
+            confidence = canned["confidence"]
+        elif matched:
+            # A known topic from any branch: point the student at the subject it belongs to
+            term = max(matched, key=matched.__getitem__)
+            entry = next((entry for entry in topic_matcher.entries(term) if entry.subject), None)
+            display = topic_matcher.display_name(term)
+            if entry:
+                topic_response = f"{display} is a core topic in {entry.subject} ({entry.branch}). Let's break it down step by step, starting from the underlying principles and moving to worked examples."
+                sources = [f"{entry.subject} Textbook", f"{entry.branch} Course Materials"]
+            else:
+                topic_response = f"I understand you're asking about {display}. Let me provide some guidance and suggest resources for deeper learning."
+                sources = ["Course Materials", "Study Resources"]
+            confidence = 0.8
         else:
             # Generic helpful response based on the question
             topic_response = f"I understand you're asking about: '{request.message}'. This is an important topic in computer science. Let me provide some guidance and suggest resources for deeper learning."
@@ -313,6 +710,8 @@ async def chat_tutor(
                 "Would you like practice problems on this topic?"
             ]
         }
+        if grounded:
+            response["passages"] = grounded["passages"]
         
         logger.info(f"AI tutor responded to user {user['uid']}")
         
@@ -321,7 +720,9 @@ async def chat_tutor(
             "response": response,
             "metadata": {
                 "responded_at": datetime.now().isoformat(),
-                "conversation_length": len(request.conversation_history) + 1
+                "conversation_length": len(request.conversation_history) + 1,
+                "grounded": bool(grounded),
+                "answer_mode": grounded["mode"] if grounded else "topic"
             }
         }
         
@@ -329,7 +730,178 @@ async def chat_tutor(
         logger.error(f"Error in AI tutor: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI tutor error: {str(e)}")
 
+@app.post("/api/ai/tutor/index")
+async def index_tutor_material(
+    request: TutorIndexRequest,
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> Dict[str, Any]:
+    """
+    Add syllabus or notes text to the chat tutor's retrieval index
+    """
+    try:
+        if tutor is None or not tutor.available:
+            raise HTTPException(status_code=503, detail="Tutor retrieval is not available on this server")
+        
+        indexed = await tutor.index_text(request.content, request.source, request.collection)
+        
+        logger.info(f"Indexed {indexed} passages into '{request.collection}' for user {user['uid']}")
+        
+        return {
+            "success": True,
+            "indexed_passages": indexed,
+            "metadata": {
+                "collection": request.collection,
+                "source": request.source,
+                "total_passages": len(tutor.index) if tutor.index is not None else 0,
+                "indexed_at": datetime.now().isoformat()
+            }
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error indexing tutor material: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to index material: {str(e)}")
+
 # PDF Processing Endpoints
+async def _check_pdf_url(url: str) -> str:
+    try:
+        return await check_public_url(url)
+    except UnsafeURLError as e:
+        raise HTTPException(status_code=400, detail=f"pdf_url is not allowed: {str(e)}")
+
+async def _download_pdf(url: str, destination: str) -> Tuple[int, str]:
+    """
+    Stream a remote PDF to disk in chunks, enforcing PDF_MAX_SIZE. Returns (size, sha256)
+    Only public http(s) hosts are fetched, and each request connects to the address that
+    was checked. Redirects are followed by hand so that every target is checked too, at
+    most PDF_MAX_REDIRECTS of them.
+    """
+    size = 0
+    digest = hashlib.sha256()
+    async with httpx.AsyncClient(timeout=30.0, follow_redirects=False) as client:
+        for _ in range(PDF_MAX_REDIRECTS + 1):
+            pinned, headers, extensions = pin_url(url, await _check_pdf_url(url))
+            async with client.stream("GET", pinned, headers=headers, extensions=extensions) as response:
+                if response.is_redirect:
+                    url = str(httpx.URL(url).join(response.headers["location"]))
+                    continue
+                if response.status_code != 200:
+                    raise HTTPException(status_code=400, detail=f"Could not download PDF (HTTP {response.status_code})")
+                with open(destination, "wb") as pdf_file:
+                    async for chunk in response.aiter_bytes(PDF_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > PDF_MAX_SIZE:
+                            raise HTTPException(status_code=413, detail="PDF exceeds the maximum allowed size")
+                        digest.update(chunk)
+                        pdf_file.write(chunk)
+                return size, digest.hexdigest()
+    raise HTTPException(status_code=400, detail="Could not download PDF (too many redirects)")
+
+async def _save_upload(file: UploadFile, destination: str) -> Tuple[int, str]:
+    """
+    Copy a multipart upload to disk in chunks, enforcing PDF_MAX_SIZE. Returns (size, sha256)
+    Files without a PDF header are rejected before anything reaches the extraction workers.
+    """
+    size = 0
+    digest = hashlib.sha256()
+    async with aiofiles.open(destination, "wb") as pdf_file:
+        while True:
+            chunk = await file.read(PDF_CHUNK_SIZE)
+            if not chunk:
+                break
+            # The header may follow up to 1KB of leading junk
+            if size == 0 and PDF_HEADER not in chunk[:1024]:
+                raise HTTPException(status_code=415, detail="Uploaded file is not a PDF")
+            size += len(chunk)
+            if size > PDF_MAX_SIZE:
+                raise HTTPException(status_code=413, detail="PDF exceeds the maximum allowed size")
+            digest.update(chunk)
+            await pdf_file.write(chunk)
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded PDF is empty")
+    return size, digest.hexdigest()
+
+def _build_pdf_result(
+    extraction: Dict[str, Any],
+    file_size: int,
+    processing_method: str,
+    extract_images: bool,
+    analyze_structure: bool
+) -> Dict[str, Any]:
+    """Shape extraction output into the process-pdf response format"""
+    pages = extraction["pages"]
+    sections = [section["title"] for section in extraction["outline"]] or ["Main Content"]
+    
+    return {
+        "text_content": extraction["text_content"],
+        "images": extraction["images"] if extract_images else [],
+        "structure": {
+            "pages": pages,
+            "sections": sections,
+            "outline": extraction["outline"],
+            "estimated_read_time": f"{max(1, extraction['words'] // 200)} minutes"
+        } if analyze_structure else None,
+        "metadata": {
+            "pages": pages,
+            "file_size": f"{max(1, file_size // 1024)}KB",
+            "content_type": "Educational Material",
+            "processing_method": processing_method,
+            "extraction_method": extraction["extraction_method"],
+            "words": extraction["words"],
+            "characters": extraction["characters"],
+            "truncated": extraction["truncated"],
+            "processing_time": extraction["processing_time"]
+        }
+    }
+
+async def _extract_and_cache(path: str, digest: str, variant: str, extract_images: bool) -> Dict[str, Any]:
+    extraction = await pdf_processor.extract(path, extract_images=extract_images)
+    if pdf_cache:
+        await pdf_cache.set(digest, extraction, variant)
+    return extraction
+
+async def _process_pdf_file(
+    path: str,
+    file_size: int,
+    digest: str,
+    processing_method: str,
+    extract_images: bool,
+    analyze_structure: bool,
+    tutor_collection: Optional[str] = None,
+    source_name: str = "Uploaded PDF"
+) -> Dict[str, Any]:
+    """Run extraction on a PDF already on disk (or reuse a cached result) and build the endpoint response"""
+    variant = "images" if extract_images else "text"
+    extraction = await pdf_cache.get(digest, variant) if pdf_cache else None
+    cache_status = "hit" if extraction is not None else "miss"
+    if extraction is None:
+        extraction = await pdf_inflight.run(
+            f"{digest}:{variant}", lambda: _extract_and_cache(path, digest, variant, extract_images)
+        )
+    
+    result = _build_pdf_result(extraction, file_size, processing_method, extract_images, analyze_structure)
+    
+    # Optionally make the document searchable for the chat tutor
+    indexed_passages = None
+    if tutor_collection:
+        if tutor is None or not tutor.available:
+            raise HTTPException(status_code=503, detail="Tutor retrieval is not available on this server")
+        indexed_passages = await tutor.index_text(extraction["text_content"], source_name, tutor_collection)
+    
+    return {
+        "success": True,
+        "extracted_content": result,
+        "metadata": {
+            "processed_at": datetime.now().isoformat(),
+            "cache_status": cache_status if pdf_cache else "disabled",
+            "sha256": digest,
+            "extract_images": extract_images,
+            "analyze_structure": analyze_structure,
+            "tutor_indexed_passages": indexed_passages
+        }
+    }
+
 @app.post("/api/ai/process-pdf")
 async def process_pdf(
     request: PDFProcessRequest,
@@ -338,88 +910,364 @@ async def process_pdf(
     """
     Process PDF file and extract text content for analysis
     """
+    temp_path = None
     try:
         if not request.pdf_url and not request.pdf_base64:
             raise HTTPException(status_code=400, detail="Either pdf_url or pdf_base64 is required")
         
-        # Simulate PDF processing based on input type
+        fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        
         if request.pdf_url:
-            # Extract filename and estimate content
-            import urllib.parse
-            parsed_url = urllib.parse.urlparse(request.pdf_url)
-            filename = parsed_url.path.split('/')[-1] if parsed_url.path else "document.pdf"
-            
-            # Estimate pages based on filename or URL patterns
-            estimated_pages = 15  # Default estimate
-            if "tutorial" in filename.lower():
-                estimated_pages = 25
-            elif "guide" in filename.lower():
-                estimated_pages = 40
-            elif "manual" in filename.lower():
-                estimated_pages = 60
-                
-            text_content = f"Extracted content from {filename}. This document appears to contain educational material with {estimated_pages} pages of content covering various technical topics."
-            
+            file_size, digest = await _download_pdf(request.pdf_url, temp_path)
         else:
-            # Base64 content - estimate size
-            import base64
             try:
-                if request.pdf_base64:
-                    decoded_size = len(base64.b64decode(request.pdf_base64))
-                    estimated_pages = max(5, decoded_size // 50000)  # Rough estimate: 50KB per page
-                else:
-                    estimated_pages = 10
-                text_content = f"Extracted content from uploaded PDF. Estimated {estimated_pages} pages of technical documentation and learning materials."
-            except Exception:
-                estimated_pages = 10
-                text_content = "Extracted content from uploaded PDF document containing educational material."
-        
-        # Generate dynamic structure based on document size
-        sections = []
-        if estimated_pages <= 10:
-            sections = ["Introduction", "Main Content", "Summary"]
-        elif estimated_pages <= 30:
-            sections = ["Introduction", "Chapter 1", "Chapter 2", "Chapter 3", "Conclusion"]
+                pdf_bytes = base64.b64decode(request.pdf_base64 or "", validate=True)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="pdf_base64 is not valid base64")
+            if len(pdf_bytes) > PDF_MAX_SIZE:
+                raise HTTPException(status_code=413, detail="PDF exceeds the maximum allowed size")
+            with open(temp_path, "wb") as pdf_file:
+                pdf_file.write(pdf_bytes)
+            file_size = len(pdf_bytes)
+            digest = hashlib.sha256(pdf_bytes).hexdigest()
+            del pdf_bytes
+        
+        response = await _process_pdf_file(
+            temp_path,
+            file_size,
+            digest,
+            "URL" if request.pdf_url else "Base64 Upload",
+            request.extract_images,
+            request.analyze_structure,
+            request.tutor_collection,
+            request.pdf_url.rsplit("/", 1)[-1] if request.pdf_url else "Uploaded PDF"
+        )
+        
+        logger.info(f"Processed PDF ({response['extracted_content']['metadata']['pages']} pages) for user {user['uid']}")
+        
+        return response
+        
+    except HTTPException:
+        raise
+    except PDFProcessingError as e:
+        logger.warning(f"PDF could not be processed: {str(e)}")
+        raise HTTPException(status_code=422, detail=f"Failed to process PDF: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error processing PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+@app.post("/api/ai/process-pdf/upload")
+async def process_pdf_upload(
+    file: UploadFile = File(..., description="PDF file sent as multipart/form-data"),
+    extract_images: bool = Form(default=False),
+    analyze_structure: bool = Form(default=True),
+    tutor_collection: Optional[str] = Form(default=None),
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> Dict[str, Any]:
+    """
+    Process a PDF sent as a binary multipart upload. UploadLimitMiddleware caps the body
+    before the multipart parser spools it to disk; it is then copied to a temp file in
+    chunks, so memory use stays constant regardless of file size.
+    """
+    temp_path = None
+    try:
+        fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        
+        file_size, digest = await _save_upload(file, temp_path)
+        
+        response = await _process_pdf_file(
+            temp_path, file_size, digest, "Multipart Upload", extract_images, analyze_structure,
+            tutor_collection, file.filename or "Uploaded PDF"
+        )
+        
+        logger.info(f"Processed uploaded PDF {file.filename} ({file_size} bytes) for user {user['uid']}")
+        
+        return response
+    
+    except HTTPException:
+        raise
+    except PDFProcessingError as e:
+        logger.warning(f"PDF could not be processed: {str(e)}")
+        raise HTTPException(status_code=422, detail=f"Failed to process PDF: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error processing uploaded PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+    finally:
+        await file.close()
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# Background Job Endpoints
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public shape of a job record (parameters and owner are not echoed back)"""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": round(job["progress"], 3),
+        "partial_results": job["partial_results"],
+        "result": job["result"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+        "created_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+        "updated_at": datetime.fromtimestamp(job["updated_at"]).isoformat()
+    }
+
+async def _owned_job(job_id: str, user: Dict[str, str]) -> Dict[str, Any]:
+    job = await job_queue.get(job_id)
+    if job is None or job["user_id"] != user["uid"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _spool_path() -> str:
+    os.makedirs(JOBS_SPOOL_DIR, exist_ok=True)
+    return os.path.join(JOBS_SPOOL_DIR, f"{uuid.uuid4().hex}.pdf")
+
+async def _run_question_job(job: JobContext) -> Dict[str, Any]:
+    """Generate a question set, publishing each question as a partial result when it is ready"""
+    spec = job.params
+    questions: List[Dict[str, Any]] = []
+    if len(spec["content"]) > CHUNK_MAX_CHARS:
+        # Long material is covered section by section, so the questions arrive together
+        questions = await question_generator.generate_questions(**spec, user_id=job.user_id, priority="batch")
+        await job.report(1.0, *questions)
+    else:
+        async for question in question_generator.stream_questions(**spec, user_id=job.user_id, priority="batch"):
+            questions.append(question)
+            await job.report(len(questions) / spec["num_questions"], question)
+    
+    logger.info(f"Job {job.job_id} generated {len(questions)} questions for user {job.user_id}")
+    return {
+        "questions": questions,
+        "metadata": {
+            "total_questions": len(questions),
+            "difficulty": spec["difficulty"],
+            "question_type": spec["question_type"],
+            "subject": spec["subject"],
+            "generated_at": datetime.now().isoformat()
+        }
+    }
+
+async def _run_pdf_job(job: JobContext) -> Dict[str, Any]:
+    """Download (for URL jobs) and extract a PDF, reporting each stage"""
+    params = job.params
+    temp_path = None
+    try:
+        if params.get("spool_path"):
+            path, file_size, digest = params["spool_path"], params["file_size"], params["sha256"]
         else:
-            sections = ["Preface", "Chapter 1", "Chapter 2", "Chapter 3", "Chapter 4", "Chapter 5", "Appendix"]
-        
-        result: Dict[str, Any] = {
-            "text_content": text_content,
-            "images": [] if not request.extract_images else [f"extracted_image_{i+1}.png" for i in range(min(3, estimated_pages//5))],
-            "structure": {
-                "pages": estimated_pages,
-                "sections": sections,
-                "estimated_read_time": f"{estimated_pages * 2} minutes"
-            } if request.analyze_structure else None,
+            fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+            os.close(fd)
+            file_size, digest = await _download_pdf(params["pdf_url"], temp_path)
+            path = temp_path
+        await job.report(0.25)
+        
+        response = await _process_pdf_file(
+            path,
+            file_size,
+            digest,
+            params["processing_method"],
+            params["extract_images"],
+            params["analyze_structure"],
+            params["tutor_collection"],
+            params["source_name"]
+        )
+        _remove_spool_file(params)
+        logger.info(f"Job {job.job_id} processed a PDF ({response['extracted_content']['metadata']['pages']} pages)")
+        return response
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+job_queue.handlers.update({
+    "generate_questions": _run_question_job,
+    "process_pdf": _run_pdf_job
+})
+
+@app.post("/api/jobs/generate-questions", status_code=202)
+async def submit_question_job(
+    request: QuestionGenerationRequest,
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> Dict[str, Any]:
+    """
+    Queue question generation as a background job and return its id at once;
+    poll GET /api/jobs/{job_id} or subscribe to /api/jobs/{job_id}/events
+    """
+    try:
+        job = await job_queue.submit("generate_questions", request.model_dump(), user["uid"])
+        logger.info(f"Queued question job {job['id']} for user {user['uid']}")
+        return {
+            "success": True,
+            "job": _job_view(job),
             "metadata": {
-                "pages": estimated_pages,
-                "file_size": f"{estimated_pages * 100}KB",
-                "content_type": "Educational Material",
-                "processing_method": "URL" if request.pdf_url else "Base64 Upload"
+                "submitted_at": datetime.now().isoformat()
             }
         }
+    
+    except Exception as e:
+        logger.error(f"Error queuing question job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue job: {str(e)}")
+
+@app.post("/api/jobs/process-pdf", status_code=202)
+async def submit_pdf_job(
+    request: PDFProcessRequest,
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> Dict[str, Any]:
+    """
+    Queue PDF extraction as a background job. Base64 content is written to the job
+    spool right away; URLs are downloaded by the worker.
+    """
+    spool_path = None
+    try:
+        if not request.pdf_url and not request.pdf_base64:
+            raise HTTPException(status_code=400, detail="Either pdf_url or pdf_base64 is required")
+        if request.pdf_url:
+            # Checked again by the worker (and on every redirect) when it downloads
+            await _check_pdf_url(request.pdf_url)
         
-        logger.info(f"Processed PDF for user {user['uid']}")
+        params: Dict[str, Any] = {
+            "pdf_url": request.pdf_url,
+            "extract_images": request.extract_images,
+            "analyze_structure": request.analyze_structure,
+            "tutor_collection": request.tutor_collection,
+            "processing_method": "URL" if request.pdf_url else "Base64 Upload",
+            "source_name": request.pdf_url.rsplit("/", 1)[-1] if request.pdf_url else "Uploaded PDF"
+        }
+        if not request.pdf_url:
+            try:
+                pdf_bytes = base64.b64decode(request.pdf_base64 or "", validate=True)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="pdf_base64 is not valid base64")
+            if len(pdf_bytes) > PDF_MAX_SIZE:
+                raise HTTPException(status_code=413, detail="PDF exceeds the maximum allowed size")
+            spool_path = _spool_path()
+            async with aiofiles.open(spool_path, "wb") as pdf_file:
+                await pdf_file.write(pdf_bytes)
+            params.update(spool_path=spool_path, file_size=len(pdf_bytes), sha256=hashlib.sha256(pdf_bytes).hexdigest())
+            del pdf_bytes
         
+        job = await job_queue.submit("process_pdf", params, user["uid"])
+        logger.info(f"Queued PDF job {job['id']} for user {user['uid']}")
         return {
             "success": True,
-            "extracted_content": result,
+            "job": _job_view(job),
             "metadata": {
-                "processed_at": datetime.now().isoformat(),
-                "extract_images": request.extract_images,
-                "analyze_structure": request.analyze_structure
+                "submitted_at": datetime.now().isoformat()
             }
         }
+    
+    except HTTPException:
+        if spool_path and os.path.exists(spool_path):
+            os.remove(spool_path)
+        raise
+    except Exception as e:
+        if spool_path and os.path.exists(spool_path):
+            os.remove(spool_path)
+        logger.error(f"Error queuing PDF job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue job: {str(e)}")
+
+@app.post("/api/jobs/process-pdf/upload", status_code=202)
+async def submit_pdf_upload_job(
+    file: UploadFile = File(..., description="PDF file sent as multipart/form-data"),
+    extract_images: bool = Form(default=False),
+    analyze_structure: bool = Form(default=True),
+    tutor_collection: Optional[str] = Form(default=None),
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> Dict[str, Any]:
+    """
+    Queue extraction of a multipart PDF upload as a background job
+    """
+    spool_path = None
+    try:
+        spool_path = _spool_path()
+        file_size, digest = await _save_upload(file, spool_path)
         
+        job = await job_queue.submit("process_pdf", {
+            "pdf_url": None,
+            "spool_path": spool_path,
+            "file_size": file_size,
+            "sha256": digest,
+            "extract_images": extract_images,
+            "analyze_structure": analyze_structure,
+            "tutor_collection": tutor_collection,
+            "processing_method": "Multipart Upload",
+            "source_name": file.filename or "Uploaded PDF"
+        }, user["uid"])
+        logger.info(f"Queued PDF job {job['id']} for {file.filename} ({file_size} bytes) for user {user['uid']}")
+        return {
+            "success": True,
+            "job": _job_view(job),
+            "metadata": {
+                "submitted_at": datetime.now().isoformat()
+            }
+        }
+    
+    except HTTPException:
+        if spool_path and os.path.exists(spool_path):
+            os.remove(spool_path)
+        raise
     except Exception as e:
-        logger.error(f"Error processing PDF: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+        if spool_path and os.path.exists(spool_path):
+            os.remove(spool_path)
+        logger.error(f"Error queuing PDF upload job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue job: {str(e)}")
+    finally:
+        await file.close()
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> Dict[str, Any]:
+    """
+    Current status, progress, partial results and (once finished) result of a job
+    """
+    job = await _owned_job(job_id, user)
+    return {"success": True, "job": _job_view(job)}
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> StreamingResponse:
+    """
+    Server-sent events for a job: a progress event with the new partial results on
+    every change, then one final succeeded, failed or cancelled event with the job
+    """
+    await _owned_job(job_id, user)
+    
+    async def event_lines() -> AsyncIterator[str]:
+        async for event in job_queue.events(job_id):
+            if "job" in event:
+                event = {**event, "job": _job_view(event["job"])}
+            yield f"event: {event['type']}\ndata: {dumps(event).decode()}\n\n"
+    
+    return StreamingResponse(event_lines(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(
+    job_id: str,
+    user: Dict[str, str] = Depends(verify_firebase_token)
+) -> Dict[str, Any]:
+    """
+    Cancel a queued or running job; finished jobs are returned unchanged
+    """
+    await _owned_job(job_id, user)
+    job = await job_queue.cancel(job_id)
+    logger.info(f"Cancelled job {job_id} for user {user['uid']}")
+    return {"success": True, "job": _job_view(job)}
 
 # Enhanced Feedback Endpoints
 @app.post("/api/ai/enhance-feedback")
 async def enhance_feedback(
     request: FeedbackRequest,
-    user: Dict[str, str] = Depends(verify_firebase_token)
+    user: Dict[str, str] = Depends(verify_firebase_token),
+    budget: float = Depends(latency_budget)
 ) -> Dict[str, Any]:
     """
     Enhance performance feedback using AI insights
@@ -430,7 +1278,8 @@ async def enhance_feedback(
             performance_data=request.performance_data,
             test_results=request.test_results,
             learning_goals=request.learning_goals,
-            weak_areas=request.weak_areas
+            weak_areas=request.weak_areas,
+            budget=budget
         )
         
         logger.info(f"Generated enhanced feedback for user {user['uid']}")
@@ -459,22 +1308,8 @@ async def get_performance_analytics(
         # Generate dynamic performance data based on branch
         import random
         
-        # Define subjects by branch
-        branch_subjects = {
-            "CSE": ["Data Structures", "Algorithms", "Database Systems", "Operating Systems"],
-            "MECH": ["Thermodynamics", "Fluid Mechanics", "Manufacturing Processes", "Machine Design"],
-            "ECE": ["Digital Electronics", "Signal Processing", "Communication Systems", "Microprocessors"],
-            "CIVIL": ["Structural Analysis", "Construction Management", "Surveying", "Environmental Engineering"],
-            "EEE": ["Circuit Analysis", "Power Systems", "Control Systems", "Electrical Machines"],
-            "AUTOMOBILE": ["Vehicle Dynamics", "Engine Technology", "Automotive Electronics", "Vehicle Design"],
-            "AEROSPACE": ["Aerodynamics", "Flight Mechanics", "Propulsion Systems", "Aircraft Structures"],
-            "CHEMICAL": ["Process Engineering", "Reaction Engineering", "Process Control", "Mass Transfer"],
-            "BIOTECH": ["Biochemistry", "Cell Biology", "Bioprocess Engineering", "Molecular Biology"],
-            "IT": ["Software Engineering", "Web Technologies", "Network Security", "Mobile Computing"]
-        }
-        
         # Get subjects for the branch, default to CSE if branch not found
-        subjects = branch_subjects.get(branch.upper(), branch_subjects["CSE"])
+        subjects = BRANCH_SUBJECTS.get(branch.upper(), BRANCH_SUBJECTS["CSE"])
         subject_performance = []
         
         for subject in subjects:
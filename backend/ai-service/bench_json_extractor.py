@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the single-pass JSON extractor against the original regex-based response
+parsing, on large question responses and on the malformed outputs in data/llm_responses
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.json_extractor import IncrementalObjectExtractor, find_json_object, parse_object_array
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_responses")
+
+def legacy_parse(response: str) -> List[Dict[str, Any]]:
+    """The JSON step of _parse_ai_response this module replaced"""
+    try:
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        if json_match:
+            data = json.loads(json_match.group())
+            if "questions" in data:
+                return data["questions"]
+    except Exception:
+        pass
+    return []
+
+def make_response(num_questions: int, prose_braces: bool = False) -> str:
+    """A Gemini-style answer: a fenced JSON document, optionally with braces in the prose around it"""
+    questions = [
+        {
+            "id": f"q{i}",
+            "question": f"In a {{balanced}} tree of n keys, what bounds the \"height\" in case {i}?",
+            "type": "mcq",
+            "options": ["O(log n)", "O(n)", "O(1)", "O(n log n)"],
+            "correct_answer": 0,
+            "explanation": "Rebalancing after every insert keeps the height logarithmic. " * 3,
+            "difficulty": "medium",
+            "topic": "Trees",
+            "bloom_level": "understand",
+            "estimated_time": 2
+        }
+        for i in range(num_questions)
+    ]
+    document = json.dumps({"questions": questions}, indent=2)
+    if prose_braces:
+        return f"Here are the questions {{as requested}}:\n```json\n{document}\n```\nUse them {{wisely}}.\n"
+    return f"Here are the questions:\n```json\n{document}\n```\n"
+
+def time_call(fn: Callable[[str], Any], text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def stream_parse(text: str, chunk_size: int = 16) -> List[Dict[str, Any]]:
+    extractor = IncrementalObjectExtractor("questions")
+    objects: List[Dict[str, Any]] = []
+    for start in range(0, len(text), chunk_size):
+        objects.extend(extractor.feed(text[start:start + chunk_size]))
+    return objects
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+    print("📊 JSON extraction benchmark (best of 20)")
+    print(f"{'questions':>10} {'KB':>6} {'legacy (ms)':>12} {'single-pass (ms)':>17} {'streamed (ms)':>14} {'found with prose braces (legacy / new)':>40}")
+    for num_questions in (10, 50, 200):
+        response = make_response(num_questions)
+        legacy = time_call(legacy_parse, response, 20)
+        current = time_call(lambda text: parse_object_array(text, "questions"), response, 20)
+        streamed = time_call(stream_parse, response, 20)
+        with_prose = make_response(num_questions, prose_braces=True)
+        found = f"{len(legacy_parse(with_prose))} / {len(parse_object_array(with_prose, 'questions'))}"
+        print(
+            f"{num_questions:>10} {len(response) // 1024:>6} {legacy * 1000:>12.2f} {current * 1000:>17.2f} "
+            f"{streamed * 1000:>14.2f} {found:>40}"
+        )
+    
+    print("\n🧪 Malformed output fixtures (objects recovered; numbered_text has no JSON and goes to the plain-text parser)")
+    print(f"{'fixture':>26} {'legacy':>7} {'single-pass':>12}")
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        with open(os.path.join(FIXTURES_DIR, name)) as fixture:
+            response = fixture.read()
+        if name.startswith("feedback"):
+            legacy_found = "yes" if legacy_parse(response) or _legacy_object(response) else "no"
+            found = "yes" if find_json_object(response) else "no"
+        else:
+            legacy_found, found = len(legacy_parse(response)), len(parse_object_array(response, "questions"))
+        print(f"{name:>26} {legacy_found:>7} {found:>12}")
+
+def _legacy_object(response: str) -> Any:
+    try:
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        return json.loads(json_match.group()) if json_match else None
+    except ValueError:
+        return None
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory and encode/decode cost of a cached question set held as dicts,
+as JSON bytes, as Question objects, and in the packed binary form. The dict and object
+forms are built from JSON so that their strings are not shared with the source sets.
+"""
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.question_generator import QuestionGenerator
+from services.question_model import (
+    decode_questions, encode_questions, pack_questions, parse_questions, unpack_questions
+)
+
+SETS = 200
+QUESTIONS_PER_SET = 10
+
+def question_sets() -> List[List[Dict[str, Any]]]:
+    generator = QuestionGenerator()
+    sets = []
+    for index in range(SETS):
+        sets.append(asyncio.run(generator._generate_fallback_questions(
+            f"Binary search trees keep keys ordered. Hash tables trade order for lookups. Set {index}.",
+            QUESTIONS_PER_SET, "medium", "mcq", "Data Structures", "CSE", 3
+        )))
+    return sets
+
+def retained_bytes(build: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return size
+
+def best_time(func: Callable[[], Any], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    sets = question_sets()
+    parsed = [parse_questions(questions) for questions in sets]
+    encoded = [encode_questions(questions) for questions in parsed]
+    packed = [pack_questions(questions) for questions in parsed]
+    total = SETS * QUESTIONS_PER_SET
+    
+    forms = {
+        "dicts": (
+            lambda: [json.loads(payload) for payload in encoded],
+            None
+        ),
+        "JSON bytes": (
+            lambda: [encode_questions(questions) for questions in parsed],
+            lambda: [decode_questions(payload) for payload in encoded]
+        ),
+        "Question objects": (
+            lambda: [decode_questions(payload) for payload in encoded],
+            None
+        ),
+        "packed binary": (
+            lambda: [pack_questions(questions) for questions in parsed],
+            lambda: [unpack_questions(payload) for payload in packed]
+        )
+    }
+    
+    print(f"📊 {SETS} cached sets of {QUESTIONS_PER_SET} questions")
+    print(f"{'form':>18} {'bytes/question':>15} {'build (ms)':>12} {'decode (ms)':>12}")
+    for name, (build, decode) in forms.items():
+        size = retained_bytes(build)
+        build_ms = best_time(build) * 1000
+        decode_ms = f"{best_time(decode) * 1000:>12.2f}" if decode else f"{'-':>12}"
+        print(f"{name:>18} {size // total:>15} {build_ms:>12.2f} {decode_ms}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark response serialization per endpoint: FastAPI's default path (validation against
+the Dict[str, Any] return annotation, jsonable_encoder, stdlib json) against FastJSONResponse
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from services.content_analyzer import ContentAnalyzer
+from services.fast_json import FastJSONResponse, orjson
+from services.question_generator import QuestionGenerator
+
+SYLLABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "syllabi")
+
+def question_set(generator: QuestionGenerator, count: int) -> List[Dict[str, Any]]:
+    questions = asyncio.run(generator._generate_fallback_questions(
+        "Binary search trees keep keys ordered. Hash tables trade order for constant-time lookups.",
+        count, "medium", "mcq", "Data Structures", "CSE", 3
+    ))
+    for question in questions:
+        question["explanation"] = "Balanced trees keep every operation logarithmic in the number of keys. " * 4
+    return questions
+
+def endpoint_payloads() -> Dict[str, Dict[str, Any]]:
+    """Response bodies shaped like each endpoint's, built with the real services"""
+    generator = QuestionGenerator()
+    analyzer = ContentAnalyzer()
+    with open(os.path.join(SYLLABI_DIR, "cse.txt")) as syllabus_file:
+        syllabus = syllabus_file.read()
+    now = datetime.now().isoformat()
+    
+    return {
+        "generate-questions (50)": {
+            "success": True,
+            "questions": question_set(generator, 50),
+            "metadata": {"total_questions": 50, "difficulty": "medium", "question_type": "mcq", "generated_at": now}
+        },
+        "generate-questions/batch (5x10)": {
+            "success": True,
+            "results": [
+                {"index": index, "success": True, "questions": question_set(generator, 10), "error": None}
+                for index in range(5)
+            ],
+            "metadata": {"total_specs": 5, "succeeded": 5, "total_questions": 50, "generated_at": now}
+        },
+        "analyze-content": {
+            "success": True,
+            "analysis": analyzer.analyze(syllabus, "CSE"),
+            "metadata": {"content_type": "syllabus", "branch": "CSE", "semester": 3, "analyzed_at": now}
+        },
+        "process-pdf (200 pages)": {
+            "success": True,
+            "extracted_content": {
+                "text_content": syllabus * max(1, 400000 // max(1, len(syllabus))),
+                "images": [],
+                "structure": {
+                    "pages": 200,
+                    "sections": [f"Chapter {i}" for i in range(40)],
+                    "outline": [{"title": f"Chapter {i}", "page": i * 5} for i in range(40)]
+                }
+            },
+            "metadata": {"processed_at": now, "cache_status": "miss"}
+        },
+        "enhance-feedback": {
+            "success": True,
+            "enhanced_feedback": generator._generate_rule_based_feedback(
+                {"average_score": 62}, [{"score": score} for score in (55, 60, 71)], ["Pass DSA"], ["Graphs", "Trees"]
+            ),
+            "metadata": {"generated_at": now}
+        }
+    }
+
+async def default_render(payload: Dict[str, Any]) -> bytes:
+    field = create_response_field(name="Response_Benchmark", type_=Dict[str, Any])
+    content = await serialize_response(field=field, response_content=payload)
+    return JSONResponse(content).body
+
+async def fast_render(payload: Dict[str, Any]) -> bytes:
+    return FastJSONResponse(payload).body
+
+async def best_time(render: Callable[[Dict[str, Any]], Any], payload: Dict[str, Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await render(payload)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    print(f"📊 Response serialization per endpoint (best of 20, orjson {'installed' if orjson else 'NOT installed: stdlib fallback'})")
+    print(f"{'endpoint':>32} {'KB':>6} {'default (ms)':>13} {'fast (ms)':>10} {'speedup':>8}")
+    for name, payload in endpoint_payloads().items():
+        size = len(asyncio.run(fast_render(payload)))
+        default = asyncio.run(best_time(default_render, payload, 20))
+        fast = asyncio.run(best_time(fast_render, payload, 20))
+        print(f"{name:>32} {size // 1024:>6} {default * 1000:>13.2f} {fast * 1000:>10.2f} {default / fast:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
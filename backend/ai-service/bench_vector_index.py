@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark tutor retrieval: top-k search over tens of thousands of passage embeddings
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.vector_index import VectorIndex, np
+
+DIM = 384  # all-MiniLM-L6-v2
+
+def time_queries(index: VectorIndex, queries, k: int = 4) -> float:
+    """Median latency of one query, in milliseconds"""
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, k)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def main():
+    if np is None:
+        print("❌ numpy is required for this benchmark")
+        return 1
+    
+    print("📊 Vector index benchmark (median of 50 queries, k=4)\n")
+    print(f"{'passages':>10} {'in-memory (ms)':>15} {'memory-mapped (ms)':>19}")
+    
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(50, DIM)).astype(np.float32)
+    for size in (10000, 50000, 100000):
+        vectors = rng.normal(size=(size, DIM)).astype(np.float32)
+        index = VectorIndex()
+        index.add(vectors, [{"text": "", "source": "bench"} for _ in range(size)])
+        in_memory = time_queries(index, queries)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            mapped = VectorIndex.load(directory, mmap=True)
+            time_queries(mapped, queries[:5])  # fault the pages in
+            memory_mapped = time_queries(mapped, queries)
+        
+        print(f"{size:>10} {in_memory:>15.2f} {memory_mapped:>19.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
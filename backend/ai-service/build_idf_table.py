@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Build the keyword engine's IDF table from the reference syllabus corpus.
+Each unit/chapter of every file in data/syllabi counts as one document.
+
+Usage: python build_idf_table.py [corpus_dir] [output_path]
+"""
+import glob
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.keyword_engine import DEFAULT_IDF_PATH, build_idf_table, save_idf_table, split_documents
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "syllabi")
+
+def main():
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS_DIR
+    output_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_IDF_PATH
+    
+    documents = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as corpus_file:
+            documents.extend(split_documents(corpus_file.read()))
+    
+    if not documents:
+        print(f"❌ No documents found in {corpus_dir}")
+        return 1
+    
+    table = build_idf_table(documents)
+    save_idf_table(table, output_path)
+    print(f"✅ {len(table['df'])} terms from {table['documents']} documents -> {output_path} ({os.path.getsize(output_path)} bytes)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
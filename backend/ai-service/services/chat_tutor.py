@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.deadline import Deadline, finish_within
+from services.embeddings import EmbeddingModel
+from services.keyword_engine import STOP_WORDS
+from services.text_chunker import split_content
+from services.topic_dictionary import tokenize
+from services.vector_index import VectorIndex, saved_mtime
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Passage size used when indexing course material
+PASSAGE_MAX_CHARS = 1200
+# Earlier turns included in the retrieval query and the prompt
+HISTORY_TURNS = 6
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+LOCK_FILE = "index.lock"
+# Saved segments allowed before an ingest compacts the index into one file
+MAX_SEGMENTS = 16
+
+
+class ChatTutor:
+    """
+    Retrieval-augmented tutor. Course material is split into passages, embedded and
+    kept in a VectorIndex; each question retrieves the closest passages and the
+    answer is grounded in them, written by Gemini when available and extracted
+    from the passages otherwise.
+    """
+    
+    def __init__(
+        self,
+        embedder: EmbeddingModel,
+        generate: Optional[Callable[[str], Awaitable[str]]] = None,
+        index_dir: Optional[str] = None,
+        top_k: int = 4,
+        min_score: float = 0.35
+    ):
+        self.embedder = embedder
+        self.generate = generate
+        self.index_dir = index_dir
+        self.top_k = top_k
+        self.min_score = min_score
+        self.index: Optional[VectorIndex] = None
+        self._loaded_mtime = 0.0
+        if np is not None:
+            self.index = VectorIndex()
+            self._refresh()
+    
+    def _index_mtime(self) -> float:
+        return saved_mtime(self.index_dir or "")
+    
+    def _refresh(self) -> None:
+        """Reopen the on-disk index if another worker has saved a newer one"""
+        if not self.index_dir:
+            return
+        mtime = self._index_mtime()
+        if mtime <= self._loaded_mtime:
+            return
+        try:
+            # Memory-mapped so all workers on the host share one copy of each segment
+            self.index = VectorIndex.load(self.index_dir, mmap=True, reuse=self.index)
+            self._loaded_mtime = mtime
+            logger.info(f"Loaded tutor index with {len(self.index)} passages from {self.index_dir}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load tutor index from {self.index_dir}: {str(e)}")
+    
+    def _add_and_save(self, vectors: Any, entries: List[Dict[str, Any]], collection: str) -> Tuple[VectorIndex, float]:
+        """
+        Add passages on top of the latest saved index and write them out, under a file lock.
+        Only the new passages are written, as one more segment; every MAX_SEGMENTS ingests
+        the index is compacted into a single file. Runs in a worker thread, so it builds a
+        new index (sharing the segments already open) instead of touching self.index, which
+        requests on the event loop may be searching, and returns it with its mtime.
+        """
+        directory = self.index_dir or ""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, LOCK_FILE), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = VectorIndex.load(directory, mmap=True, reuse=self.index) if self._index_mtime() else VectorIndex()
+            index.add(vectors, entries, collection)
+            if index.segment_count >= MAX_SEGMENTS:
+                index.save(directory)
+                index = VectorIndex.load(directory, mmap=True)
+            else:
+                index.flush(directory)
+            return index, self._index_mtime()
+    
+    @property
+    def available(self) -> bool:
+        return self.index is not None and self.embedder.available
+    
+    async def index_text(self, text: str, source: str, collection: str = "default") -> int:
+        """Split text into passages, embed them in one batch and add them to the index"""
+        if not self.available or self.index is None:
+            raise RuntimeError("Tutor retrieval needs numpy and sentence-transformers")
+        
+        passages = split_content(text, PASSAGE_MAX_CHARS)
+        if not passages:
+            return 0
+        vectors = await self.embedder.embed(passages, use_cache=False)
+        if vectors is None:
+            raise RuntimeError("Embedding model unavailable")
+        
+        entries = [{"text": passage, "source": source, "chunk": i} for i, passage in enumerate(passages)]
+        if self.index_dir:
+            index, mtime = await asyncio.to_thread(self._add_and_save, vectors, entries, collection)
+            # Swapped in on the event loop, between requests rather than partway through one
+            self.index, self._loaded_mtime = index, mtime
+        else:
+            self.index.add(vectors, entries, collection)
+        return len(passages)
+    
+    async def retrieve(self, query: str, collection: Optional[str] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        self._refresh()
+        if not self.available or self.index is None or len(self.index) == 0:
+            return []
+        vectors = await self.embedder.embed([query])
+        if vectors is None:
+            return []
+        return self.index.search(vectors[0], self.top_k, collection, self.min_score)
+    
+    async def answer(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]],
+        history: List[Dict[str, Any]],
+        budget: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Answer from retrieved passages, or return None when nothing relevant is indexed
+        or retrieval does not finish within budget (seconds). A generated answer that
+        would overrun the budget is replaced by an extractive one.
+        """
+        deadline = Deadline(budget) if budget is not None else None
+        context = context or {}
+        collection = context.get("collection") or context.get("course_id")
+        finished, hits = await finish_within(
+            self.retrieve(self._build_query(message, context, history), collection), deadline, keep_running=False
+        )
+        if not finished:
+            logger.info(f"Tutor retrieval exceeded its {budget}s budget")
+            return None
+        if not hits:
+            return None
+        
+        mode = "extractive"
+        text = ""
+        if self.generate is not None:
+            try:
+                finished, generated = await finish_within(
+                    self.generate(self._build_prompt(message, context, history, hits)), deadline, keep_running=False
+                )
+                if finished:
+                    text = generated.strip()
+                    mode = "generative"
+            except Exception as e:
+                logger.warning(f"Grounded generation failed, answering extractively: {str(e)}")
+        if not text:
+            text = self._extract_answer(message, hits)
+            mode = "extractive"
+        
+        sources: List[str] = []
+        for _, passage in hits:
+            if passage["source"] not in sources:
+                sources.append(passage["source"])
+        
+        return {
+            "message": text,
+            "sources": sources,
+            "confidence": round(hits[0][0], 2),
+            "mode": mode,
+            "passages": [
+                {"source": passage["source"], "score": round(score, 3), "text": passage["text"][:300]}
+                for score, passage in hits
+            ]
+        }
+    
+    def _build_query(self, message: str, context: Dict[str, Any], history: List[Dict[str, Any]]) -> str:
+        parts = [message]
+        # Short follow-ups ("why?", "explain more") need the previous question to retrieve anything useful
+        if len(message.split()) < 8:
+            previous = [_turn_text(turn) for turn in history if turn.get("role", "user") == "user"]
+            if previous:
+                parts.append(str(previous[-1]))
+        for key in ("subject", "topic"):
+            if context.get(key):
+                parts.append(str(context[key]))
+        return " ".join(parts)
+    
+    def _build_prompt(
+        self,
+        message: str,
+        context: Dict[str, Any],
+        history: List[Dict[str, Any]],
+        hits: List[Tuple[float, Dict[str, Any]]]
+    ) -> str:
+        passages = "\n\n".join(
+            f"[{i}] ({passage['source']})\n{passage['text']}" for i, (_, passage) in enumerate(hits, 1)
+        )
+        conversation = "\n".join(
+            f"{str(turn.get('role', 'user')).upper()}: {_turn_text(turn)}" for turn in history[-HISTORY_TURNS:]
+        )
+        subject = context.get("subject", "their course")
+        
+        return f"""
+You are a patient tutor helping an engineering student studying {subject}.
+Answer the student's question using ONLY the course material below. If the material
+does not contain the answer, say so briefly and suggest what to review.
+Cite passages with their numbers, e.g. [1].
+
+COURSE MATERIAL:
+{passages}
+
+CONVERSATION SO FAR:
+{conversation or "(none)"}
+
+STUDENT QUESTION:
+{message}
+
+Answer in at most 200 words.
+"""
+
+    def _extract_answer(self, message: str, hits: List[Tuple[float, Dict[str, Any]]]) -> str:
+        """Pick the passage sentences that share the most terms with the question"""
+        query_terms = {term for term in tokenize(message.lower()) if term not in STOP_WORDS and len(term) > 2}
+        scored: List[Tuple[int, int, str]] = []
+        position = 0
+        for _, passage in hits:
+            for sentence in SENTENCE_BOUNDARY.split(passage["text"]):
+                sentence = " ".join(sentence.split())
+                if len(sentence) < 20:
+                    continue
+                overlap = len(query_terms.intersection(tokenize(sentence.lower())))
+                scored.append((overlap, -position, sentence))
+                position += 1
+        
+        best = [item for item in sorted(scored, reverse=True) if item[0] > 0][:3]
+        # Keep the chosen sentences in reading order
+        best.sort(key=lambda item: -item[1])
+        return " ".join(sentence for _, _, sentence in best) or hits[0][1]["text"][:500]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "index": self.index.stats() if self.index is not None else None,
+            "persisted": bool(self.index_dir)
+        }
+
+
+def _turn_text(turn: Dict[str, Any]) -> str:
+    return str(turn.get("content") or turn.get("message") or "")
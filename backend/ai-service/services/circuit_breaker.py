@@ -0,0 +1,128 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream service whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Tracks outcomes of upstream calls over a sliding time window. Once enough calls
+    have been seen and the share of failures (errors, or calls slower than
+    slow_call_seconds) reaches failure_rate, the circuit opens and calls are
+    rejected immediately. After open_seconds a limited number of probe calls are
+    let through (half-open): a success closes the circuit, a failure reopens it.
+    """
+    
+    def __init__(
+        self,
+        name: str = "upstream",
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: Optional[float] = None,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._probes = 0
+        # (finished_at, failed, latency)
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+    
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; every allowed call must be followed by a record_* call"""
+        if self.state == OPEN:
+            if self.clock() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"{self.name} circuit half-open, probing for recovery")
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+    
+    def record_success(self, latency: float) -> None:
+        if self.slow_call_seconds is not None and latency > self.slow_call_seconds:
+            self.record_failure(latency)
+            return
+        if self.state == HALF_OPEN:
+            self._close()
+            return
+        self._record(False, latency)
+    
+    def record_failure(self, latency: float) -> None:
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._record(True, latency)
+        failures, total = self._failure_counts()
+        if self.state == CLOSED and total >= self.min_calls and failures / total >= self.failure_rate:
+            self._open()
+    
+    def record_cancelled(self) -> None:
+        """The caller gave up before an outcome; frees a half-open probe without judging the upstream"""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+    
+    def _record(self, failed: bool, latency: float) -> None:
+        now = self.clock()
+        self._calls.append((now, failed, latency))
+        self._prune(now)
+    
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+    
+    def _failure_counts(self) -> Tuple[int, int]:
+        return sum(1 for _, failed, _ in self._calls if failed), len(self._calls)
+    
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.trips += 1
+        self._calls.clear()
+        logger.warning(f"{self.name} circuit opened; short-circuiting calls for {self.open_seconds}s")
+    
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._calls.clear()
+        logger.info(f"{self.name} circuit closed, upstream recovered")
+    
+    def stats(self) -> Dict[str, Any]:
+        self._prune(self.clock())
+        failures, total = self._failure_counts()
+        latencies = sorted(latency for _, _, latency in self._calls)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_failure_rate": round(failures / total, 3) if total else 0.0,
+            "window_p95_latency_ms": round(1000 * latencies[int(len(latencies) * 0.95)], 1) if latencies else None,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "open_for_seconds": round(self.clock() - self.opened_at, 1) if self.state == OPEN else None
+        }
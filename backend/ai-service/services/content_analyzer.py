@@ -0,0 +1,117 @@
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.keyword_engine import KeywordEngine, get_keyword_engine
+from services.topic_dictionary import TopicMatcher, get_topic_matcher, tokenize
+
+# Text is tokenized in blocks of about this many characters to bound peak memory
+BLOCK_CHARS = 1 << 20
+MAX_TOPICS = 6
+
+
+class ContentAnalyzer:
+    """
+    Linear-time content analysis. The text is lowercased once and tokenized block
+    by block; word counts are kept per distinct word, so memory follows the
+    vocabulary rather than the text. Topics come from the shared branch topic
+    dictionary in the same pass, and keywords are ranked by TF-IDF against the
+    reference corpus.
+    """
+    
+    def __init__(
+        self,
+        matcher: Optional[TopicMatcher] = None,
+        keyword_engine: Optional[KeywordEngine] = None,
+        max_keywords: int = 8
+    ):
+        self.matcher = matcher or get_topic_matcher()
+        self.keyword_engine = keyword_engine or get_keyword_engine()
+        self.max_keywords = max_keywords
+    
+    def scan(self, lowered: str) -> Tuple[Dict[str, int], Dict[str, int], int]:
+        """Count words, count dictionary topics and the total word count in one pass"""
+        counts: Counter = Counter()
+        topic_counts: Dict[str, int] = {}
+        total = 0
+        for block in _iter_blocks(lowered, BLOCK_CHARS):
+            tokens = tokenize(block)
+            total += len(tokens)
+            counts.update(tokens)
+            for key, count in self.matcher.count_terms(tokens).items():
+                topic_counts[key] = topic_counts.get(key, 0) + count
+        return counts, topic_counts, total
+    
+    def rank_topics(self, topic_counts: Dict[str, int], branch: str = "") -> List[str]:
+        """Most frequent topics first, with topics from the student's branch ahead of the rest"""
+        branch = branch.upper()
+        
+        def sort_key(key: str) -> Tuple[bool, int]:
+            in_branch = any(entry.branch == branch for entry in self.matcher.entries(key))
+            return (not in_branch, -topic_counts[key])
+        
+        ranked = sorted(topic_counts, key=sort_key) if branch else sorted(topic_counts, key=topic_counts.__getitem__, reverse=True)
+        return [self.matcher.display_name(key) for key in ranked]
+    
+    def analyze(self, content: str, branch: str = "") -> Dict[str, Any]:
+        """Analyze content and return topics, keywords, difficulty and structure estimates"""
+        counts, topic_counts, content_words = self.scan(content.lower())
+        keywords = self.keyword_engine.top_keywords(counts, self.max_keywords)
+        return self._summarize(content, keywords, topic_counts, content_words, branch)
+    
+    def analyze_batch(self, contents: List[str], branches: List[str]) -> List[Dict[str, Any]]:
+        """Analyze many documents, scoring all their keywords in one batch call"""
+        scans = [self.scan(content.lower()) for content in contents]
+        scored = self.keyword_engine.score_batch([counts for counts, _, _ in scans], self.max_keywords)
+        return [
+            self._summarize(content, [term for term, _ in keywords], topic_counts, content_words, branch)
+            for content, (_, topic_counts, content_words), keywords, branch in zip(contents, scans, scored, branches)
+        ]
+    
+    def _summarize(
+        self,
+        content: str,
+        keywords: List[str],
+        topic_counts: Dict[str, int],
+        content_words: int,
+        branch: str
+    ) -> Dict[str, Any]:
+        found_topics = self.rank_topics(topic_counts, branch)
+        
+        # Determine difficulty based on content complexity
+        if content_words < 300:
+            difficulty = "beginner"
+        elif content_words < 800:
+            difficulty = "intermediate"
+        else:
+            difficulty = "advanced"
+        
+        # Estimate study time based on content length
+        estimated_hours = max(1, content_words // 150)  # Rough estimate: 150 words per hour
+        
+        return {
+            "topics": found_topics[:MAX_TOPICS] if found_topics else ["General Programming"],
+            "keywords": keywords,
+            "difficulty_level": difficulty,
+            "estimated_study_time": f"{estimated_hours} hours",
+            "structure": {
+                "estimated_chapters": max(1, content_words // 250),
+                "estimated_sections": max(2, content_words // 100),
+                "content_length_words": content_words,
+                "content_length_chars": len(content)
+            }
+        }
+
+
+def _iter_blocks(text: str, size: int) -> Iterator[str]:
+    """Yield slices of about size characters, cut at whitespace so no word is split"""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = start + size
+        if end < length:
+            cut = text.rfind(" ", start, end)
+            newline = text.rfind("\n", start, end)
+            cut = max(cut, newline)
+            end = cut if cut > start else end
+        yield text[start:end]
+        start = end
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Work that outlived its request; referenced here so it is not garbage collected
+_background: Set["asyncio.Future[Any]"] = set()
+_stats = {"met": 0, "expired": 0}
+
+
+class Deadline:
+    """Point on the event loop clock by which a request must answer (None means no limit)"""
+    
+    def __init__(self, budget: Optional[float] = None):
+        self.budget = budget
+        self.expires_at = asyncio.get_running_loop().time() + budget if budget is not None else None
+    
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - asyncio.get_running_loop().time())
+    
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+async def finish_within(
+    awaitable: Awaitable[Any],
+    deadline: Optional[Deadline],
+    keep_running: bool = True
+) -> Tuple[bool, Any]:
+    """
+    Await work until the deadline. Returns (True, result) in time, otherwise (False, None)
+    while the work keeps running in the background (so it can still fill caches) or is
+    cancelled when keep_running is False.
+    """
+    task = asyncio.ensure_future(awaitable)
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is None:
+        return True, await task
+    
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), timeout=remaining)
+    except asyncio.TimeoutError:
+        _stats["expired"] += 1
+        if keep_running:
+            _background.add(task)
+            task.add_done_callback(_finish_background)
+        else:
+            task.cancel()
+        return False, None
+    _stats["met"] += 1
+    return True, result
+
+
+def _finish_background(task: "asyncio.Future[Any]") -> None:
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Background generation failed after its deadline: {str(task.exception())}")
+
+
+def deadline_stats() -> Dict[str, Any]:
+    return {**_stats, "background_tasks": len(_background)}
@@ -0,0 +1,74 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from services.embeddings import EmbeddingModel
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question_text(text: str) -> str:
+    """Lowercase and strip punctuation so trivially different copies compare equal"""
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", str(text).lower()).split())
+
+
+class QuestionDeduplicator:
+    """
+    Drops duplicate questions: exact copies (after normalization) always, and
+    paraphrases whose embedding cosine similarity reaches the threshold when an
+    embedding model is available. Earlier questions win.
+    """
+    
+    def __init__(self, embedder: Optional[EmbeddingModel] = None, threshold: float = 0.9):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.exact_dropped = 0
+        self.similar_dropped = 0
+    
+    async def dedupe(
+        self,
+        questions: List[Dict[str, Any]],
+        keep: Sequence[Dict[str, Any]] = ()
+    ) -> List[Dict[str, Any]]:
+        """Return the questions that duplicate neither each other nor anything in keep"""
+        seen = {normalize_question_text(q.get("question", "")) for q in keep}
+        candidates: List[Dict[str, Any]] = []
+        for question in questions:
+            normalized = normalize_question_text(question.get("question", ""))
+            if normalized in seen:
+                self.exact_dropped += 1
+                continue
+            seen.add(normalized)
+            candidates.append(question)
+        
+        if self.embedder is None or not candidates or len(candidates) + len(keep) < 2:
+            return candidates
+        
+        # Embed everything in one batch; vectors are unit length, so dot product = cosine
+        texts = [str(q.get("question", "")) for q in keep] + [str(q.get("question", "")) for q in candidates]
+        vectors = await self.embedder.embed(texts)
+        if vectors is None:
+            return candidates
+        
+        similarities = vectors @ vectors.T
+        kept_rows = list(range(len(keep)))
+        unique: List[Dict[str, Any]] = []
+        for offset, question in enumerate(candidates):
+            row = len(keep) + offset
+            if kept_rows and similarities[row, kept_rows].max() >= self.threshold:
+                self.similar_dropped += 1
+                continue
+            kept_rows.append(row)
+            unique.append(question)
+        
+        if len(unique) < len(candidates):
+            logger.info(f"Dropped {len(candidates) - len(unique)} near-duplicate questions")
+        return unique
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "exact_dropped": self.exact_dropped,
+            "similar_dropped": self.similar_dropped,
+            "embeddings": self.embedder.stats() if self.embedder is not None else None
+        }
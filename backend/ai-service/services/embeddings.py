@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None
+
+try:
+    from sentence_transformers import SentenceTransformer  # type: ignore
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    """Cache key for a piece of text (case and surrounding whitespace ignored)"""
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+class EmbeddingModel:
+    """
+    Sentence embeddings from a CPU sentence-transformers model. The model is loaded
+    once per worker on first use, encoding runs on a dedicated thread so the event
+    loop keeps serving requests, and vectors are cached by text hash.
+    """
+    
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache_size: int = 10000, batch_size: int = 64):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._model: Optional[Any] = None
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        # One thread: the model is not shared between concurrent encode calls
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+    
+    @property
+    def available(self) -> bool:
+        return SentenceTransformer is not None and np is not None and not self._load_failed
+    
+    def _load(self) -> Any:
+        with self._load_lock:
+            if self._model is None:
+                logger.info(f"Loading embedding model {self.model_name}")
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+            return self._model
+    
+    def _encode(self, texts: List[str]) -> Any:
+        model = self._load()
+        vectors = model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return vectors.astype(np.float32, copy=False)
+    
+    async def load(self) -> None:
+        """Load the model ahead of the first request"""
+        if not self.available:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._load)
+        except Exception as e:
+            self._load_failed = True
+            logger.warning(f"Embedding model unavailable: {str(e)}")
+    
+    async def embed(self, texts: List[str], use_cache: bool = True) -> Optional[Any]:
+        """
+        Return an (n, dim) array of unit-length embeddings, or None when no model is
+        available. All cache misses are encoded together in one batch. Bulk indexing
+        passes use_cache=False so document passages do not evict question vectors.
+        """
+        if not self.available or not texts:
+            return None
+        
+        if not use_cache:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, self._encode, texts)
+            except Exception as e:
+                if self._model is None:
+                    self._load_failed = True
+                logger.warning(f"Embedding failed: {str(e)}")
+                return None
+        
+        keys = [text_hash(text) for text in texts]
+        vectors_by_key: Dict[str, Any] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                vectors_by_key[key] = self._cache[key]
+            elif key not in missing:
+                missing[key] = text
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        
+        if missing:
+            try:
+                vectors = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._encode, list(missing.values())
+                )
+            except Exception as e:
+                if self._model is None:
+                    self._load_failed = True
+                logger.warning(f"Embedding failed: {str(e)}")
+                return None
+            for key, vector in zip(missing, vectors):
+                self._cache[key] = vector
+                vectors_by_key[key] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        
+        return np.stack([vectors_by_key[key] for key in keys])
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "available": self.available,
+            "loaded": self._model is not None,
+            "cached_vectors": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses
+        }
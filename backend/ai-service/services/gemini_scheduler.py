@@ -0,0 +1,268 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower rank is served first
+PRIORITIES = {"interactive": 0, "feedback": 1, "batch": 2}
+# Share of each bucket that lower priorities may not dip into, kept for interactive traffic
+DEFAULT_RESERVE = {"interactive": 0.0, "feedback": 0.1, "batch": 0.25}
+# Output allowance added to the prompt size when estimating a call's token cost
+EXPECTED_OUTPUT_TOKENS = 1024
+
+
+def estimate_tokens(prompt: str, expected_output: int = EXPECTED_OUTPUT_TOKENS) -> int:
+    """Rough token cost of a call: about 4 characters per prompt token plus the expected output"""
+    return len(prompt) // 4 + 1 + expected_output
+
+
+def response_tokens(response: Any) -> Optional[int]:
+    """Total tokens billed for a response, when the SDK reports usage"""
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None)
+    return total if isinstance(total, int) else None
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 tokens a second up to capacity; may go negative to record debt"""
+    
+    def __init__(
+        self,
+        per_minute: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self.tokens = self.capacity
+        self.clock = clock
+        self._updated = clock()
+    
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def delay(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until amount can be taken while leaving reserve (a fraction of capacity) untouched"""
+        self._refill()
+        # Calls larger than the bucket only wait for a full bucket, otherwise they would never run
+        amount = min(amount, self.capacity)
+        floor = min(reserve * self.capacity, self.capacity - amount)
+        needed = amount + floor - self.tokens
+        return needed / self.rate if needed > 0 else 0.0
+    
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+    
+    def adjust(self, delta: float) -> None:
+        """Correct an earlier take by delta tokens (positive when the real cost was higher)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class Grant:
+    """Permission for one Gemini call; report real usage with record_usage before release"""
+    __slots__ = ("priority", "tokens", "wait", "used_tokens", "released", "pending")
+    
+    def __init__(self, priority: str, tokens: int, wait: float):
+        self.priority = priority
+        self.tokens = tokens
+        self.wait = wait
+        self.used_tokens: Optional[int] = None
+        self.released = False
+        self.pending: Optional["asyncio.Future[Any]"] = None
+    
+    def record_usage(self, tokens: Optional[int]) -> None:
+        if tokens is not None:
+            self.used_tokens = tokens
+    
+    def hold_until(self, work: "asyncio.Future[Any]") -> None:
+        """Keep the slot past the end of the slot() block until work (e.g. an executor call) is done"""
+        self.pending = work
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "enqueued_at", "future")
+    
+    def __init__(self, priority: str, tokens: int, enqueued_at: float, future: "asyncio.Future[Grant]"):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+
+class _WaitStats:
+    def __init__(self, window: int = 512):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+    
+    def record(self, wait: float) -> None:
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+        self.recent.append(wait)
+    
+    def summary(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(1000 * self.total / self.count, 1) if self.count else 0.0,
+            "p95_ms": round(1000 * p95, 1),
+            "max_ms": round(1000 * self.max, 1)
+        }
+
+
+class GeminiScheduler:
+    """
+    Central admission control for outbound Gemini calls. Callers queue by priority
+    class (interactive, then feedback, then batch, FIFO within a class) and are
+    released when a concurrency slot is free and the requests-per-minute and
+    tokens-per-minute buckets allow it. Lower classes also leave part of each
+    bucket in reserve, so background work cannot starve interactive requests.
+    Limits apply per worker process; a rate of 0 disables that bucket.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        reserve: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.reserve = {**DEFAULT_RESERVE, **(reserve or {})}
+        self.clock = clock
+        self._rpm = TokenBucket(requests_per_minute, clock=clock) if requests_per_minute > 0 else None
+        self._tpm = TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute > 0 else None
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_due = 0.0
+        self._waits = {priority: _WaitStats() for priority in PRIORITIES}
+    
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive", tokens: int = 0) -> AsyncIterator[Grant]:
+        """Hold a call slot for the duration of the block"""
+        grant = await self.acquire(priority, tokens)
+        try:
+            yield grant
+        finally:
+            if grant.pending is not None and not grant.pending.done():
+                # The caller gave up (timeout or cancellation) but the call still occupies
+                # a worker thread; freeing the slot now would oversubscribe the executor
+                grant.pending.add_done_callback(lambda work: self._release_after(grant, work))
+            else:
+                self.release(grant)
+    
+    async def acquire(self, priority: str = "interactive", tokens: int = 0) -> Grant:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown Gemini priority: {priority}")
+        future: "asyncio.Future[Grant]" = asyncio.get_running_loop().create_future()
+        entry = (PRIORITIES[priority], next(self._sequence), _Waiter(priority, tokens, self.clock(), future))
+        heapq.heappush(self._queue, entry)
+        self._dispatch()
+        
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller gave up; hand the slot on
+                self.release(future.result())
+            elif entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._dispatch()
+            raise
+    
+    def release(self, grant: Grant) -> None:
+        if grant.released:
+            return
+        grant.released = True
+        self._active -= 1
+        if self._tpm is not None and grant.used_tokens is not None:
+            self._tpm.adjust(grant.used_tokens - grant.tokens)
+        self._dispatch()
+    
+    def _release_after(self, grant: Grant, work: "asyncio.Future[Any]") -> None:
+        if not work.cancelled():
+            work.exception()  # Retrieved so an abandoned call's error is not reported as unhandled
+        self.release(grant)
+    
+    def _delay(self, waiter: _Waiter) -> float:
+        reserve = self.reserve.get(waiter.priority, 0.0)
+        delay = 0.0
+        if self._rpm is not None:
+            delay = self._rpm.delay(1, reserve)
+        if self._tpm is not None:
+            delay = max(delay, self._tpm.delay(waiter.tokens, reserve))
+        return delay
+    
+    def _dispatch(self) -> None:
+        while self._queue and self._active < self.max_concurrency:
+            waiter = self._queue[0][2]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+            delay = self._delay(waiter)
+            if delay > 0:
+                # Strict priority: nothing behind the head may overtake it
+                self._wake_in(delay)
+                return
+            
+            heapq.heappop(self._queue)
+            if self._rpm is not None:
+                self._rpm.take(1)
+            if self._tpm is not None:
+                self._tpm.take(waiter.tokens)
+            self._active += 1
+            wait = self.clock() - waiter.enqueued_at
+            self._waits[waiter.priority].record(wait)
+            waiter.future.set_result(Grant(waiter.priority, waiter.tokens, wait))
+    
+    def _wake_in(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        due = loop.time() + delay
+        if self._timer is not None and self._timer_due <= due:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_due = due
+        self._timer = loop.call_at(due, self._on_timer)
+    
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+    
+    def queue_depth(self) -> Dict[str, int]:
+        depth = {priority: 0 for priority in PRIORITIES}
+        for _, _, waiter in self._queue:
+            if not waiter.future.done():
+                depth[waiter.priority] += 1
+        return depth
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queue_depth": self.queue_depth(),
+            "wait": {priority: stats.summary() for priority, stats in self._waits.items()},
+            "requests_per_minute": self.requests_per_minute or None,
+            "tokens_per_minute": self.tokens_per_minute or None,
+            "requests_available": round(self._rpm.tokens, 1) if self._rpm is not None else None,
+            "tokens_available": round(self._tpm.tokens) if self._tpm is not None else None
+        }
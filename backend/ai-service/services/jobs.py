@@ -0,0 +1,428 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATUSES = {SUCCEEDED, FAILED, CANCELLED}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, updated_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user_id, created_at);
+CREATE TABLE IF NOT EXISTS job_partials (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class JobStore:
+    """
+    SQLite record of every job's parameters, state, partial results and result; one dedicated thread.
+    Partial results are appended one row per item, so a progress report writes only what is new.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+    
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+    
+    async def create(self, kind: str, params: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+        return await self._run(self._create, kind, params, user_id)
+    
+    def _create(self, kind: str, params: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection.execute(
+            "INSERT INTO jobs (id, kind, user_id, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, user_id, QUEUED, json.dumps(params, ensure_ascii=False), now, now)
+        )
+        return self._get(job_id)
+    
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, job_id)
+    
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        items = self._connection.execute(
+            "SELECT item FROM job_partials WHERE job_id = ? ORDER BY seq", (job_id,)
+        ).fetchall()
+        return _row_to_job(row, [json.loads(item["item"]) for item in items])
+    
+    async def claim(self, job_id: str, worker: str) -> Optional[Dict[str, Any]]:
+        """Atomically move a queued job to running for this worker; None if someone else has it"""
+        return await self._run(self._claim, job_id, worker)
+    
+    def _claim(self, job_id: str, worker: str) -> Optional[Dict[str, Any]]:
+        with self._connection:
+            self._connection.execute("BEGIN")
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, progress = 0, "
+                "updated_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, worker, time.time(), job_id, QUEUED)
+            )
+            if cursor.rowcount:
+                # A rerun starts its partial results over
+                self._connection.execute("DELETE FROM job_partials WHERE job_id = ?", (job_id,))
+        return self._get(job_id) if cursor.rowcount else None
+    
+    async def update(self, job_id: str, worker: str, progress: float, items: List[Any], start: int) -> bool:
+        """Record progress and append the partial results that follow the first `start` already stored"""
+        return await self._run(self._update, job_id, worker, progress, items, start)
+    
+    def _update(self, job_id: str, worker: str, progress: float, items: List[Any], start: int) -> bool:
+        with self._connection:
+            self._connection.execute("BEGIN")
+            cursor = self._connection.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                (progress, time.time(), job_id, RUNNING, worker)
+            )
+            if cursor.rowcount and items:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO job_partials (job_id, seq, item) VALUES (?, ?, ?)",
+                    [(job_id, start + offset, json.dumps(item, ensure_ascii=False)) for offset, item in enumerate(items)]
+                )
+        return bool(cursor.rowcount)
+    
+    async def finish(
+        self,
+        job_id: str,
+        worker: str,
+        status: str,
+        result: Any = None,
+        error: Optional[str] = None
+    ) -> bool:
+        return await self._run(self._finish, job_id, worker, status, result, error)
+    
+    def _finish(self, job_id: str, worker: str, status: str, result: Any, error: Optional[str]) -> bool:
+        # Only the worker that still owns a running job may finish it (a cancel wins)
+        cursor = self._connection.execute(
+            "UPDATE jobs SET status = ?, progress = CASE WHEN ? THEN 1 ELSE progress END, result = ?, error = ?, "
+            "updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+            (
+                status, status == SUCCEEDED, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                error, time.time(), job_id, RUNNING, worker
+            )
+        )
+        return bool(cursor.rowcount)
+    
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._cancel, job_id)
+    
+    def _cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._connection.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (CANCELLED, time.time(), job_id, QUEUED, RUNNING)
+        )
+        return self._get(job_id)
+    
+    async def touch(self, job_ids: List[str], worker: str) -> None:
+        if job_ids:
+            await self._run(self._touch, job_ids, worker)
+    
+    def _touch(self, job_ids: List[str], worker: str) -> None:
+        now = time.time()
+        self._connection.executemany(
+            "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+            [(now, job_id, RUNNING, worker) for job_id in job_ids]
+        )
+    
+    async def recover(self, stale_before: float, max_attempts: int) -> List[str]:
+        """Requeue running jobs whose worker stopped heartbeating; return the ids of all queued jobs"""
+        return await self._run(self._recover, stale_before, max_attempts)
+    
+    def _recover(self, stale_before: float, max_attempts: int) -> List[str]:
+        now = time.time()
+        with self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND updated_at < ? AND attempts >= ?",
+                (FAILED, "Job was interrupted too many times", now, RUNNING, stale_before, max_attempts)
+            )
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, now, RUNNING, stale_before)
+            )
+        rows = self._connection.execute(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+        ).fetchall()
+        return [row["id"] for row in rows]
+    
+    async def purge(self, finished_before: float) -> List[Dict[str, Any]]:
+        """Delete finished jobs older than the cutoff and return them (for file cleanup)"""
+        return await self._run(self._purge, finished_before)
+    
+    def _purge(self, finished_before: float) -> List[Dict[str, Any]]:
+        placeholders = ", ".join("?" for _ in TERMINAL_STATUSES)
+        rows = self._connection.execute(
+            f"SELECT * FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?",
+            (*TERMINAL_STATUSES, finished_before)
+        ).fetchall()
+        if rows:
+            ids = [(row["id"],) for row in rows]
+            with self._connection:
+                self._connection.execute("BEGIN")
+                self._connection.executemany("DELETE FROM job_partials WHERE job_id = ?", ids)
+                self._connection.executemany("DELETE FROM jobs WHERE id = ?", ids)
+        return [_row_to_job(row) for row in rows]
+    
+    async def counts(self) -> Dict[str, int]:
+        return await self._run(self._counts)
+    
+    def _counts(self) -> Dict[str, int]:
+        rows = self._connection.execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["total"] for row in rows}
+    
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._connection.close()
+
+
+def _row_to_job(row: sqlite3.Row, partial: Optional[List[Any]] = None) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "user_id": row["user_id"],
+        "status": row["status"],
+        "params": json.loads(row["params"]),
+        "progress": row["progress"],
+        "partial_results": partial if partial is not None else [],
+        "result": json.loads(row["result"]) if row["result"] is not None else None,
+        "error": row["error"],
+        "attempts": row["attempts"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"]
+    }
+
+
+class JobContext:
+    """Handed to a job handler to read its parameters and publish progress and partial results"""
+    
+    def __init__(self, queue: "JobQueue", job: Dict[str, Any], worker: str):
+        self.job_id = job["id"]
+        self.kind = job["kind"]
+        self.user_id = job["user_id"]
+        self.params = job["params"]
+        self.partial: List[Any] = []
+        self.progress = 0.0
+        self._queue = queue
+        self._worker = worker
+    
+    async def report(self, progress: float, *partial: Any) -> None:
+        self.progress = max(0.0, min(1.0, progress))
+        start = len(self.partial)
+        self.partial.extend(partial)
+        await self._queue.store.update(self.job_id, self._worker, self.progress, list(partial), start)
+        self._queue.notify(self.job_id)
+
+
+JobHandler = Callable[[JobContext], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Runs long jobs outside the HTTP request. Jobs are persisted in a JobStore; workers
+    in this process claim them atomically, so several service processes can share one
+    store. Running jobs heartbeat, and a periodic sweep requeues jobs whose process
+    died, so work survives a restart. Finished jobs are purged after retention_seconds.
+    """
+    
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: Dict[str, JobHandler],
+        workers: int = 2,
+        heartbeat_seconds: float = 15.0,
+        max_attempts: int = 3,
+        retention_seconds: float = 86400.0,
+        on_purge: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.store = store
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retention_seconds = retention_seconds
+        self.on_purge = on_purge
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.completed = 0
+        self.failed = 0
+        # Refreshed by the maintenance loop so stats() never touches the store from the event loop
+        self.status_counts: Dict[str, int] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._enqueued: Set[str] = set()
+        self._running: Dict[str, "asyncio.Task[Any]"] = {}
+        self._signals: Dict[str, asyncio.Event] = {}
+        self._tasks: List["asyncio.Task[None]"] = []
+    
+    async def submit(self, kind: str, params: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = await self.store.create(kind, params, user_id)
+        self._enqueue(job["id"])
+        return job
+    
+    def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._enqueued:
+            self._enqueued.add(job_id)
+            self._queue.put_nowait(job_id)
+    
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(job_id)
+    
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.store.cancel(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        self.notify(job_id)
+        return job
+    
+    def notify(self, job_id: str) -> None:
+        signal = self._signals.pop(job_id, None)
+        if signal is not None:
+            signal.set()
+    
+    async def events(self, job_id: str, poll_interval: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield a progress event whenever the job changes (new partial results only) and a
+        final event once it finishes. Changes made in this process arrive at once; jobs
+        run by another process are picked up by polling the store.
+        """
+        sent = 0
+        last_update = None
+        while True:
+            signal = self._signals.setdefault(job_id, asyncio.Event())
+            job = await self.store.get(job_id)
+            if job is None:
+                return
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                partial = job["partial_results"]
+                if len(partial) < sent:
+                    # Restarted after a crash; partial results start over
+                    sent = 0
+                yield {
+                    "type": "progress",
+                    "status": job["status"],
+                    "progress": job["progress"],
+                    "partial_results": partial[sent:]
+                }
+                sent = len(partial)
+            if job["status"] in TERMINAL_STATUSES:
+                yield {"type": job["status"], "job": job}
+                return
+            try:
+                await asyncio.wait_for(signal.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+    
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._enqueued.discard(job_id)
+            job = await self.store.claim(job_id, self.worker_id)
+            if job is None:
+                continue
+            await self._run(job)
+    
+    async def _run(self, job: Dict[str, Any]) -> None:
+        context = JobContext(self, job, self.worker_id)
+        task = asyncio.create_task(self.handlers[job["kind"]](context))
+        self._running[job["id"]] = task
+        self.notify(job["id"])
+        try:
+            result = await task
+            await self.store.finish(job["id"], self.worker_id, SUCCEEDED, result=result)
+            self.completed += 1
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                # The worker itself is shutting down; leave the job to be recovered
+                task.cancel()
+                raise
+            await self.store.finish(job["id"], self.worker_id, CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['kind']}) failed: {str(e)}")
+            await self.store.finish(job["id"], self.worker_id, FAILED, error=str(e))
+            self.failed += 1
+        finally:
+            self._running.pop(job["id"], None)
+            self.notify(job["id"])
+    
+    async def _maintain(self) -> None:
+        """Heartbeat running jobs, pick up queued and orphaned jobs, purge old ones"""
+        while True:
+            try:
+                await self.store.touch(list(self._running), self.worker_id)
+                stale_before = time.time() - 3 * self.heartbeat_seconds
+                for job_id in await self.store.recover(stale_before, self.max_attempts):
+                    self._enqueue(job_id)
+                for job in await self.store.purge(time.time() - self.retention_seconds):
+                    if self.on_purge is not None:
+                        self.on_purge(job)
+                self.status_counts = await self.store.counts()
+            except Exception as e:
+                logger.error(f"Job maintenance failed: {str(e)}")
+            await asyncio.sleep(self.heartbeat_seconds)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker": self.worker_id,
+            "workers": self.workers,
+            "queued_here": self._queue.qsize(),
+            "running_here": len(self._running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "by_status": self.status_counts
+        }
@@ -0,0 +1,193 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+# Characters that can change the nesting or string state; everything else is skipped in C
+_STRUCTURAL = re.compile(r'[{}"\\\]]')
+
+
+def _candidate_spans(text: str) -> List[Tuple[int, int]]:
+    """
+    Start and end of every brace-balanced span that could be a top-level object, in one
+    string-aware pass. Besides the outermost closed spans this includes spans directly
+    inside a brace that never closes (prose such as "{see below" or a truncated document),
+    so an unbalanced brace cannot hide the JSON after it. The spans never overlap.
+    """
+    opened: List[int] = []
+    # (start, end, open braces around it)
+    closed: List[Tuple[int, int, int]] = []
+    in_string = False
+    skip_to = 0
+    for match in _STRUCTURAL.finditer(text):
+        i = match.start()
+        if i < skip_to:
+            continue
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                skip_to = i + 2
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            # Quotes only delimit strings inside an object; quotes in the prose around it are ignored
+            in_string = bool(opened)
+        elif ch == "{":
+            opened.append(i)
+        elif ch == "}" and opened:
+            start = opened.pop()
+            closed.append((start, i + 1, len(opened)))
+    
+    # Keep spans whose enclosing braces all stay open to the end of the text
+    return [
+        (start, end) for start, end, depth in closed
+        if depth <= len(opened) and (depth == 0 or start > opened[depth - 1])
+    ]
+
+
+def _decode_at(text: str, start: int) -> Any:
+    try:
+        return _decoder.raw_decode(text, start)[0]
+    except ValueError:
+        return None
+
+
+def find_json_object(text: str, required_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    First JSON object in a model response, ignoring prose and markdown around it. With
+    required_key only an object containing that key qualifies; otherwise any non-empty
+    object. Linear in the length of the text.
+    """
+    def qualifies(parsed: Any) -> bool:
+        return isinstance(parsed, dict) and bool(parsed) and (required_key is None or required_key in parsed)
+    
+    # Usual case: the first brace opens the document and the C decoder takes it in one go
+    first = text.find("{")
+    if first < 0:
+        return None
+    parsed = _decode_at(text, first)
+    if qualifies(parsed):
+        return parsed
+    
+    for start, _ in _candidate_spans(text):
+        if start != first:
+            parsed = _decode_at(text, start)
+            if qualifies(parsed):
+                return parsed
+    return None
+
+
+def parse_object_array(text: str, array_key: str) -> List[Dict[str, Any]]:
+    """
+    Objects in the array under array_key of a model response. If the document does not
+    parse (truncated output, a malformed element), every complete element that does
+    parse is recovered instead.
+    """
+    document = find_json_object(text, array_key)
+    if document is not None and isinstance(document[array_key], list):
+        return [item for item in document[array_key] if isinstance(item, dict)]
+    return IncrementalObjectExtractor(array_key).feed(text)
+
+
+class IncrementalObjectExtractor:
+    """
+    Extract complete JSON objects from an array (e.g. "questions": [...]) while the
+    text is still arriving. Each character is scanned once, and consumed text is
+    dropped from the buffer so memory stays at roughly one object. Feeding a whole
+    response at once recovers the complete elements of a truncated array.
+    """
+    
+    def __init__(self, array_key: str = "questions"):
+        self._marker = f'"{array_key}"'
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = -1
+    
+    @property
+    def done(self) -> bool:
+        """True once the closing bracket of the array has been seen"""
+        return self._done
+    
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add a chunk of text and return the objects it completed"""
+        if self._done or not chunk:
+            return []
+        self._buffer += chunk
+        objects: List[Dict[str, Any]] = []
+        
+        if not self._in_array and not self._find_array_start():
+            return objects
+        
+        buffer = self._buffer
+        i = len(buffer)
+        skip_to = self._pos
+        if self._escape:
+            # A backslash ended the previous chunk; the first new character is escaped
+            skip_to += 1
+            self._escape = False
+        for match in _STRUCTURAL.finditer(buffer, self._pos):
+            position = match.start()
+            if position < skip_to:
+                continue
+            ch = buffer[position]
+            if self._in_string:
+                if ch == "\\":
+                    skip_to = position + 2
+                    self._escape = skip_to > len(buffer)
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._object_start = position
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    parsed = self._decode(buffer[self._object_start:position + 1])
+                    if parsed is not None:
+                        objects.append(parsed)
+                    self._object_start = -1
+            elif ch == "]" and self._depth == 0:
+                self._done = True
+                i = position
+                break
+        
+        # Keep only the unfinished object (if any) in the buffer
+        keep_from = self._object_start if self._object_start >= 0 else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._object_start >= 0:
+            self._object_start = 0
+        return objects
+    
+    def _find_array_start(self) -> bool:
+        marker_index = self._buffer.find(self._marker)
+        if marker_index < 0:
+            # Keep enough of the tail to match a marker split across chunks
+            self._buffer = self._buffer[-len(self._marker):]
+            return False
+        bracket_index = self._buffer.find("[", marker_index + len(self._marker))
+        if bracket_index < 0:
+            return False
+        self._buffer = self._buffer[bracket_index + 1:]
+        self._pos = 0
+        self._in_array = True
+        return True
+    
+    def _decode(self, text: str) -> Any:
+        try:
+            parsed = json.loads(text)
+        except ValueError as e:
+            logger.warning(f"Skipping malformed streamed object: {str(e)}")
+            return None
+        return parsed if isinstance(parsed, dict) else None
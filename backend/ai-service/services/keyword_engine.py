@@ -0,0 +1,169 @@
+import gzip
+import heapq
+import json
+import logging
+import math
+import os
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None
+
+from services.pdf_processor import HEADING_PATTERN
+from services.topic_dictionary import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDF_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "idf_table.json.gz"
+)
+IDF_TABLE_VERSION = 1
+
+# Function words never worth reporting; corpus IDF takes care of domain filler ("introduction", "using")
+STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had
+has have having he her here hers herself him himself his how i if in into is it its itself just
+let may me might more most must my myself no nor not now of off on once only or other our ours
+ourselves out over own same shall she should so some such than that the their theirs them
+themselves then there these they this those through thus to too under until up upon us very was
+we were what when where which while who whom whose why will with within without would yet you
+your yours yourself yourselves
+""".split())
+
+
+def is_candidate(term: str) -> bool:
+    """Whether a token may be reported as a keyword"""
+    return len(term) > 2 and term not in STOP_WORDS and not term.isdigit()
+
+
+def split_documents(text: str) -> List[str]:
+    """Split a syllabus into one document per unit/chapter heading"""
+    documents: List[str] = []
+    current: List[str] = []
+    for line in text.splitlines():
+        if HEADING_PATTERN.match(line.strip()) and current:
+            documents.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        documents.append("\n".join(current))
+    return [document for document in documents if document.strip()]
+
+
+def build_idf_table(documents: Iterable[str]) -> Dict[str, Any]:
+    """Count document frequencies of candidate terms over a reference corpus"""
+    document_frequencies: Dict[str, int] = {}
+    num_documents = 0
+    for document in documents:
+        num_documents += 1
+        for term in set(tokenize(document.lower())):
+            if is_candidate(term):
+                document_frequencies[term] = document_frequencies.get(term, 0) + 1
+    return {
+        "version": IDF_TABLE_VERSION,
+        "documents": num_documents,
+        "df": dict(sorted(document_frequencies.items()))
+    }
+
+
+def save_idf_table(table: Dict[str, Any], path: str) -> None:
+    with gzip.open(path, "wt", encoding="utf-8") as table_file:
+        json.dump(table, table_file, separators=(",", ":"))
+
+
+class KeywordEngine:
+    """
+    TF-IDF keyword scoring against a precomputed corpus IDF table. Term weight is
+    (1 + ln tf) * idf with smoothed idf = ln((1 + N) / (1 + df)) + 1; terms missing
+    from the corpus get the maximum idf, since rare terms are usually the technical ones.
+    """
+    
+    def __init__(self, document_frequencies: Dict[str, int], num_documents: int):
+        self.num_documents = num_documents
+        self.max_idf = math.log(1 + num_documents) + 1
+        self.idf: Dict[str, float] = {
+            term: math.log((1 + num_documents) / (1 + df)) + 1
+            for term, df in document_frequencies.items()
+        }
+    
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_IDF_PATH) -> "KeywordEngine":
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as table_file:
+                table = json.load(table_file)
+            if table.get("version") != IDF_TABLE_VERSION:
+                raise ValueError(f"unsupported IDF table version {table.get('version')}")
+        except (OSError, ValueError) as e:
+            # Without a table every term gets the same idf, i.e. plain term frequency
+            logger.warning(f"Could not load IDF table from {path}: {str(e)}")
+            return cls({}, 0)
+        return cls(table["df"], table["documents"])
+    
+    def score(self, counts: Dict[str, int], k: int) -> List[Tuple[str, float]]:
+        """Top k (term, weight) pairs for one document's term counts"""
+        idf = self.idf
+        max_idf = self.max_idf
+        log = math.log
+        weights = (
+            (term, (1 + log(tf)) * idf.get(term, max_idf))
+            for term, tf in counts.items() if tf > 0 and is_candidate(term)
+        )
+        return heapq.nlargest(k, weights, key=itemgetter(1))
+    
+    def top_keywords(self, counts: Dict[str, int], k: int) -> List[str]:
+        return [term for term, _ in self.score(counts, k)]
+    
+    def score_batch(self, counts_list: List[Dict[str, int]], k: int) -> List[List[Tuple[str, float]]]:
+        """
+        Score many documents in one call. With numpy the batch becomes one sparse
+        document-term matrix (CSR arrays), weighted and ranked with vector operations.
+        """
+        if np is None or not counts_list:
+            return [self.score(counts, k) for counts in counts_list]
+        
+        # Batch vocabulary: each distinct term is looked up in the IDF table once
+        vocabulary: Dict[str, int] = {}
+        indices: List[int] = []
+        frequencies: List[int] = []
+        row_lengths: List[int] = []
+        for counts in counts_list:
+            row_lengths.append(len(counts))
+            indices.extend(vocabulary.setdefault(term, len(vocabulary)) for term in counts)
+            frequencies.extend(counts.values())
+        
+        terms = list(vocabulary)
+        idf = np.fromiter(
+            (self.idf.get(term, self.max_idf) if is_candidate(term) else 0.0 for term in terms),
+            dtype=np.float64,
+            count=len(terms)
+        )
+        index_array = np.asarray(indices, dtype=np.intp)
+        tf = np.maximum(np.asarray(frequencies, dtype=np.float64), 1.0)
+        data = (1.0 + np.log(tf)) * idf[index_array]
+        indptr = np.concatenate(([0], np.cumsum(row_lengths)))
+        
+        results: List[List[Tuple[str, float]]] = []
+        for row in range(len(counts_list)):
+            start, end = indptr[row], indptr[row + 1]
+            row_data = data[start:end]
+            if end - start > k:
+                top = np.argpartition(-row_data, k)[:k]
+            else:
+                top = np.arange(end - start)
+            top = top[np.argsort(-row_data[top], kind="stable")]
+            results.append([
+                (terms[index_array[start + i]], float(row_data[i]))
+                for i in top if row_data[i] > 0
+            ])
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_keyword_engine(path: Optional[str] = None) -> KeywordEngine:
+    """The shared engine, loaded once per process"""
+    return KeywordEngine.from_file(path or DEFAULT_IDF_PATH)
@@ -0,0 +1,357 @@
+import asyncio
+import bisect
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.circuit_breaker import CircuitOpenError
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; request latency and Gemini call latency (calls may take up to the request timeout)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+GEMINI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+# Bytes; 256B to 64MB in steps of four
+SIZE_BUCKETS = tuple(float(256 * 4 ** step) for step in range(10))
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeValue:
+    __slots__ = ("value",)
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+    
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+    
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+    
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+    
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """
+    A metric family with a fixed set of label names. labels(...) returns the child for one
+    set of label values; keep label values to small fixed vocabularies (route templates,
+    outcomes), never ids or free text.
+    """
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, Any] = {}
+    
+    def labels(self, *values: Any) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+    
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+    
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        for values, child in list(self._children.items()):
+            yield "", _format_labels(self.labelnames, [str(value) for value in values]), child.value
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self._samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+    
+    def _new_child(self) -> _CounterValue:
+        return _CounterValue()
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    
+    def _new_child(self) -> _GaugeValue:
+        return _GaugeValue()
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+    
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+    
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+    
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+    
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+    
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for values, child in list(self._children.items()):
+            values = [str(value) for value in values]
+            total = 0
+            for bound, count in zip(bounds, list(child.counts)):
+                total += count
+                yield "_bucket", _format_labels(self.labelnames + ("le",), values + [bound]), total
+            labels = _format_labels(self.labelnames, values)
+            yield "_sum", labels, child.sum
+            yield "_count", labels, total
+
+
+class CallbackMetric(Metric):
+    """Counter or gauge read at scrape time from stats another component already keeps"""
+    
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        read: Callable[[], Dict[Labels, float]]
+    ):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.read = read
+    
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        for values, value in self.read().items():
+            if value is not None:
+                yield "", _format_labels(self.labelnames, values), value
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text format. Metrics are updated from
+    the event loop thread only, so updates take no locks: an observation is a dict lookup,
+    a bisect and two additions.
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+    
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+    
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+    
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+    
+    def callback(
+        self,
+        kind: str,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        read: Callable[[], Dict[Labels, float]]
+    ) -> CallbackMetric:
+        """Register (or replace) a metric whose samples read() returns at scrape time"""
+        metric = CallbackMetric(kind, name, help, labelnames, read)
+        self._metrics[name] = metric
+        return metric
+    
+    def _register(self, metric: Any) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} is already registered differently")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+    
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "adaptilearn_http_request_duration_seconds",
+    "Time to answer a request, until the last body chunk for streamed responses",
+    ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "adaptilearn_http_requests_in_flight", "Requests being handled", ("method",)
+)
+HTTP_REQUEST_BYTES = REGISTRY.histogram(
+    "adaptilearn_http_request_size_bytes", "Request body size", ("route",), SIZE_BUCKETS
+)
+HTTP_RESPONSE_BYTES = REGISTRY.histogram(
+    "adaptilearn_http_response_size_bytes", "Response body size", ("route",), SIZE_BUCKETS
+)
+GEMINI_CALL_SECONDS = REGISTRY.histogram(
+    "adaptilearn_gemini_call_duration_seconds",
+    "Gemini call latency after admission by the scheduler (whole stream for streamed calls)",
+    ("mode", "outcome"),
+    GEMINI_BUCKETS
+)
+GEMINI_ERRORS = REGISTRY.counter(
+    "adaptilearn_gemini_errors_total", "Failed or rejected Gemini calls", ("mode", "reason")
+)
+AI_REQUESTS = REGISTRY.counter(
+    "adaptilearn_ai_requests_total", "Question and feedback generation requests", ("kind",)
+)
+AI_FALLBACKS = REGISTRY.counter(
+    "adaptilearn_ai_fallbacks_total",
+    "Rule-based answers served instead of (or to top up) model output",
+    ("kind", "reason")
+)
+AI_RESPONSES_PARSED = REGISTRY.counter(
+    "adaptilearn_ai_responses_parsed_total",
+    "Model responses by how questions were recovered: json, text or failed",
+    ("result",)
+)
+
+
+def gemini_error_reason(error: BaseException) -> str:
+    """Reason label for a failed Gemini call, from a small fixed vocabulary"""
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    return "error"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, in-flight requests and body sizes per route
+    template (taken from the matched endpoint, so path parameters do not add series).
+    Unmatched paths share the "unmatched" route label.
+    """
+    
+    def __init__(self, app: Any):
+        self.app = app
+        self._routes: Dict[Any, str] = {}
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[..., Any], send: Callable[..., Any]) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        sizes = [0, 0]
+        status = [500]
+        
+        async def counting_receive() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes[0] += len(message.get("body", b""))
+            return message
+        
+        async def counting_send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes[1] += len(message.get("body", b""))
+            await send(message)
+        
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            in_flight.dec()
+            route = self._route(scope)
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status[0])).observe(time.perf_counter() - started)
+            HTTP_REQUEST_BYTES.labels(route).observe(sizes[0])
+            HTTP_RESPONSE_BYTES.labels(route).observe(sizes[1])
+    
+    def _route(self, scope: Dict[str, Any]) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            router = scope.get("router")
+            for candidate in getattr(router, "routes", ()):
+                if getattr(candidate, "endpoint", None) is endpoint:
+                    route = candidate.path
+                    break
+            route = self._routes[endpoint] = route or "unmatched"
+        return route
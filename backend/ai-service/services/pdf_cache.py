@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PDFResultCache:
+    """
+    On-disk cache of PDF extraction results keyed by the SHA-256 of the PDF bytes.
+    Entries are evicted least-recently-used first (by mtime) once the cache
+    grows past max_bytes. Reads and writes run in worker threads; the size
+    bookkeeping and eviction happen under one lock.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = self._scan_size()
+    
+    async def get(self, digest: str, variant: str = "text") -> Optional[Dict[str, Any]]:
+        """Return the cached extraction for a PDF digest, or None"""
+        result = await asyncio.to_thread(self._read, self._path(digest, variant))
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+    
+    async def set(self, digest: str, extraction: Dict[str, Any], variant: str = "text") -> None:
+        """Store an extraction result, evicting old entries if the cache is full"""
+        await asyncio.to_thread(self._write, self._path(digest, variant), extraction)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes
+        }
+    
+    def _path(self, digest: str, variant: str) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.directory, digest[:2], f"{digest}.{variant}.json")
+    
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as cache_file:
+                result = json.load(cache_file)
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path, None)
+            return result
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable PDF cache entry {path}: {str(e)}")
+            with self._lock:
+                size = self._size(path)
+                if self._remove(path):
+                    self._total_bytes -= size
+            return None
+    
+    def _write(self, path: str, extraction: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+                json.dump(extraction, cache_file, ensure_ascii=False)
+            with self._lock:
+                # An overwritten entry's size is already counted
+                replaced_size = self._size(path)
+                # Atomic rename so concurrent workers never read a half-written entry
+                os.replace(temp_path, path)
+                self._total_bytes += self._size(path) - replaced_size
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+        except OSError as e:
+            logger.warning(f"Could not write PDF cache entry: {str(e)}")
+            self._remove(temp_path)
+    
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache is under 90% of its limit; caller holds the lock"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+        self._total_bytes = total
+    
+    def _scan_size(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        continue
+        return total
+    
+    def _size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import re
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import pdfplumber  # type: ignore
+except ImportError:
+    pdfplumber = None
+
+try:
+    from PyPDF2 import PdfReader  # type: ignore
+except ImportError:
+    PdfReader = None
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Lines that look like chapter/unit/section headings in syllabi and textbooks
+HEADING_PATTERN = re.compile(
+    r"^(?:(?:chapter|unit|module|part|section|lecture)\s+(?:\d+|[ivxlc]+)\b.{0,80}"
+    r"|\d+(?:\.\d+){0,2}\.?\s+[A-Z][A-Za-z0-9 ,:&()/'-]{2,80})$",
+    re.IGNORECASE
+)
+MAX_SECTIONS = 200
+MAX_IMAGES = 50
+
+
+class PDFProcessingError(Exception):
+    """Raised when a PDF cannot be parsed within the configured limits"""
+
+
+class _ExtractionTimeout(Exception):
+    pass
+
+
+def _init_worker(memory_limit_mb: int) -> None:
+    """Cap the address space of each worker so one huge document cannot exhaust memory"""
+    if resource is not None and memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Could not set PDF worker memory limit: {str(e)}")
+
+
+def _raise_timeout(signum: int, frame: Any) -> None:
+    raise _ExtractionTimeout()
+
+
+def _iter_pages(path: str, method: str, extract_images: bool) -> Iterator[Dict[str, Any]]:
+    """Yield one page at a time so only the current page's layout objects are alive"""
+    if method == "pdfplumber" and pdfplumber is not None:
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages:
+                images = []
+                if extract_images:
+                    images = [
+                        {"width": round(float(image.get("width", 0))), "height": round(float(image.get("height", 0)))}
+                        for image in page.images
+                    ]
+                yield {"text": page.extract_text() or "", "images": images}
+                # Drop the parsed layout for this page before moving on
+                page.flush_cache()
+        return
+    
+    if PdfReader is not None:
+        reader = PdfReader(path)
+        for page in reader.pages:
+            yield {"text": page.extract_text() or "", "images": []}
+        return
+    
+    raise PDFProcessingError("No PDF library available (install pdfplumber or PyPDF2)")
+
+
+def extract_pdf(
+    path: str,
+    method: str = "pdfplumber",
+    max_text_chars: int = 500000,
+    time_limit: float = 60.0,
+    extract_images: bool = False
+) -> Dict[str, Any]:
+    """
+    Extract text, page count, section outline and image metadata from a PDF file.
+    Runs inside a pool worker; text beyond max_text_chars is counted but not kept.
+    """
+    use_alarm = hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+    
+    started = time.monotonic()
+    text_parts: List[str] = []
+    kept_chars = 0
+    total_chars = 0
+    total_words = 0
+    pages = 0
+    outline: List[Dict[str, Any]] = []
+    images: List[Dict[str, Any]] = []
+    
+    try:
+        for page in _iter_pages(path, method, extract_images):
+            pages += 1
+            text = page["text"]
+            total_chars += len(text)
+            total_words += len(text.split())
+            
+            if kept_chars < max_text_chars and text:
+                text = text[:max_text_chars - kept_chars]
+                text_parts.append(text)
+                kept_chars += len(text)
+            
+            if len(outline) < MAX_SECTIONS:
+                for line in page["text"].splitlines()[:40]:
+                    line = line.strip()
+                    if 3 < len(line) <= 90 and HEADING_PATTERN.match(line):
+                        outline.append({"title": line, "page": pages})
+                        if len(outline) >= MAX_SECTIONS:
+                            break
+            
+            for image in page["images"]:
+                if len(images) < MAX_IMAGES:
+                    images.append({"page": pages, **image})
+    except _ExtractionTimeout:
+        raise PDFProcessingError(f"PDF extraction exceeded the {time_limit:.0f}s time limit")
+    except MemoryError:
+        raise PDFProcessingError("PDF extraction exceeded the worker memory limit")
+    except PDFProcessingError:
+        raise
+    except Exception as e:
+        raise PDFProcessingError(f"Could not parse PDF: {str(e)}")
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    
+    return {
+        "text_content": "\n\n".join(text_parts),
+        "pages": pages,
+        "outline": outline,
+        "images": images,
+        "characters": total_chars,
+        "words": total_words,
+        "truncated": total_chars > kept_chars,
+        "extraction_method": method if method == "pdfplumber" and pdfplumber is not None else "pypdf2",
+        "processing_time": round(time.monotonic() - started, 3)
+    }
+
+
+class PDFProcessor:
+    """Runs PDF extraction in a process pool with per-document time and memory limits"""
+    
+    def __init__(
+        self,
+        max_workers: int = 2,
+        time_limit: float = 60.0,
+        memory_limit_mb: int = 1024,
+        max_text_chars: int = 500000,
+        method: str = "pdfplumber"
+    ):
+        self.max_workers = max(1, max_workers)
+        self.time_limit = time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.max_text_chars = max_text_chars
+        self.method = method
+        self._pool: Optional[ProcessPoolExecutor] = None
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.memory_limit_mb,)
+            )
+        return self._pool
+    
+    async def extract(self, path: str, extract_images: bool = False) -> Dict[str, Any]:
+        """Extract a PDF file without blocking the event loop"""
+        if not os.path.exists(path):
+            raise PDFProcessingError("PDF file not found")
+        
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._get_pool(), extract_pdf, path, self.method, self.max_text_chars, self.time_limit, extract_images
+        )
+        try:
+            # The worker enforces the limit itself; this only guards against a stuck worker
+            return await asyncio.wait_for(future, timeout=self.time_limit + 10)
+        except asyncio.TimeoutError:
+            self._reset_pool()
+            raise PDFProcessingError(f"PDF extraction exceeded the {self.time_limit:.0f}s time limit")
+        except BrokenProcessPool:
+            # A worker was killed (e.g. by the memory limit); start a fresh pool for later requests
+            self._reset_pool()
+            raise PDFProcessingError("PDF extraction worker crashed while parsing the document")
+    
+    def _reset_pool(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def shutdown(self) -> None:
+        self._reset_pool()
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from services.question_bank import QuestionBank
+from services.question_generator import QuestionGenerator
+from services.question_model import DIFFICULTIES, QUESTION_TYPES
+from services.topic_dictionary import BRANCH_SUBJECTS, get_topic_matcher
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Dictionary terms named as the focus of each warm-up prompt; rotated between rounds for variety
+FOCUS_TERMS = 4
+
+
+class PoolSpec(NamedTuple):
+    branch: str
+    subject: str
+    semester: int
+    difficulty: str
+    question_type: str
+
+
+def parse_hours(value: str) -> Optional[Tuple[int, int]]:
+    """Parse an off-peak window such as "1-6" or "22-5" (local hours, end exclusive); empty means always"""
+    value = value.strip()
+    if not value:
+        return None
+    start, _, end = value.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+
+class QuestionPoolWarmer:
+    """
+    Keeps a pool of AI-generated questions in the question bank for every
+    branch x subject x semester x difficulty x type combination, so interactive
+    requests are answered from the bank. Each pass tops up every combination below
+    pool_size by at most batch_size questions, at batch priority and only inside the
+    off-peak window. A file lock next to the bank makes sure that only one process
+    on the host warms at a time.
+    """
+    
+    def __init__(
+        self,
+        generator: QuestionGenerator,
+        bank: QuestionBank,
+        pool_size: int = 20,
+        batch_size: int = 5,
+        semesters: Sequence[int] = (1,),
+        difficulties: Sequence[str] = DIFFICULTIES,
+        question_types: Sequence[str] = QUESTION_TYPES,
+        branch_subjects: Optional[Dict[str, List[str]]] = None,
+        off_peak_hours: Optional[Tuple[int, int]] = None,
+        interval: float = 300.0,
+        concurrency: int = 2
+    ):
+        self.generator = generator
+        self.bank = bank
+        self.pool_size = pool_size
+        self.batch_size = max(1, batch_size)
+        self.semesters = list(semesters)
+        self.difficulties = list(difficulties)
+        self.question_types = list(question_types)
+        self.branch_subjects = branch_subjects or BRANCH_SUBJECTS
+        self.off_peak_hours = off_peak_hours
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.matcher = get_topic_matcher()
+        self.passes = 0
+        self.generated = 0
+        self.last_pass: Optional[Dict[str, Any]] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+    
+    def combinations(self) -> Iterator[PoolSpec]:
+        for branch, subjects in self.branch_subjects.items():
+            for subject in subjects:
+                for semester in self.semesters:
+                    for difficulty in self.difficulties:
+                        for question_type in self.question_types:
+                            yield PoolSpec(branch, subject, semester, difficulty, question_type)
+    
+    def in_off_peak(self, now: Optional[datetime] = None) -> bool:
+        if self.off_peak_hours is None:
+            return True
+        hour = (now or datetime.now()).hour
+        start, end = self.off_peak_hours
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+    
+    def _focus_content(self, spec: PoolSpec, stored: int) -> str:
+        """Prompt material naming a rotating slice of the subject's dictionary terms"""
+        terms = self.matcher.subject_terms(spec.subject)
+        if not terms:
+            return ""
+        offset = (stored // self.batch_size * FOCUS_TERMS) % len(terms)
+        focus = (terms[offset:] + terms[:offset])[:FOCUS_TERMS]
+        return f"{spec.subject} ({spec.branch}): focus on {', '.join(focus)}."
+    
+    async def run_once(self) -> Dict[str, Any]:
+        """Top up every combination below pool_size by one batch"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summary = {"combinations": 0, "topped_up": 0, "generated": 0, "skipped": False}
+        
+        async def top_up(spec: PoolSpec) -> None:
+            async with semaphore:
+                # The breaker is open: generating now would only produce fallbacks
+                if self.generator.breaker.state == "open":
+                    summary["skipped"] = True
+                    return
+                stored = await self.bank.count(*spec)
+                missing = self.pool_size - stored
+                if missing <= 0:
+                    return
+                banked = await self.generator.generate_pool_questions(
+                    self._focus_content(spec, stored), min(missing, self.batch_size),
+                    spec.difficulty, spec.question_type, spec.subject, spec.branch, spec.semester
+                )
+                summary["topped_up"] += 1
+                summary["generated"] += banked
+        
+        specs = list(self.combinations())
+        summary["combinations"] = len(specs)
+        await asyncio.gather(*[top_up(spec) for spec in specs])
+        
+        self.passes += 1
+        self.generated += summary["generated"]
+        self.last_pass = {**summary, "finished_at": datetime.now().isoformat()}
+        logger.info(f"Question pool pass: {summary}")
+        return summary
+    
+    async def run_forever(self) -> None:
+        lock_file = self._acquire_lock()
+        if lock_file is False:
+            logger.info("Another process is warming the question pool; this one will not")
+            return
+        try:
+            while True:
+                if self.in_off_peak():
+                    try:
+                        await self.run_once()
+                    except Exception as e:
+                        logger.error(f"Question pool pass failed: {str(e)}")
+                await asyncio.sleep(self.interval)
+        finally:
+            if lock_file:
+                lock_file.close()
+    
+    def _acquire_lock(self) -> Any:
+        """Non-blocking host-wide lock; returns the open file, None without fcntl, or False if held"""
+        if fcntl is None:
+            return None
+        lock_file = open(os.path.abspath(self.bank.path) + ".warmer.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        return lock_file
+    
+    def start(self) -> "asyncio.Task[None]":
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+        return self._task
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "pool_size": self.pool_size,
+            "combinations": sum(1 for _ in self.combinations()),
+            "off_peak_hours": self.off_peak_hours,
+            "passes": self.passes,
+            "generated": self.generated,
+            "last_pass": self.last_pass
+        }
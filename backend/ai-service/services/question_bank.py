@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from services.dedup import normalize_question_text
+from services.question_model import Question
+
+logger = logging.getLogger(__name__)
+
+BANK_ID_PREFIX = "bank_"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    question_hash TEXT NOT NULL UNIQUE,
+    branch TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    semester INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    question_type TEXT NOT NULL,
+    bloom_level TEXT,
+    topic TEXT,
+    content_hash TEXT,  -- NULL for pool questions, which serve any material on the subject
+    payload TEXT NOT NULL,
+    served_count INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_lookup
+    ON questions (branch, subject, semester, difficulty, question_type, served_count);
+CREATE INDEX IF NOT EXISTS idx_questions_bloom ON questions (bloom_level);
+CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions (topic);
+CREATE TABLE IF NOT EXISTS seen (
+    user_id TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (user_id, question_id)
+) WITHOUT ROWID;
+"""
+
+
+def content_hash(content: str) -> str:
+    """Identify the material a question was generated from (whitespace and case ignored)"""
+    return hashlib.sha256(" ".join(content.lower().split()).encode("utf-8")).hexdigest()
+
+
+def bank_question_id(question: Dict[str, Any]) -> Optional[int]:
+    question_id = str(question.get("id", ""))
+    if question_id.startswith(BANK_ID_PREFIX) and question_id[len(BANK_ID_PREFIX):].isdigit():
+        return int(question_id[len(BANK_ID_PREFIX):])
+    return None
+
+
+class QuestionBank:
+    """
+    SQLite store of validated AI questions, indexed by branch, subject, semester,
+    difficulty, type, bloom level and topic, with a per-user record of served
+    questions. All database work runs on one dedicated thread.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.lookups = 0
+        self.served = 0
+        self.stored = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-bank")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+    
+    async def _run(self, function: Any, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+    
+    async def fetch(
+        self,
+        branch: str,
+        subject: str,
+        semester: int,
+        difficulty: str,
+        question_type: str,
+        limit: int,
+        user_id: Optional[str] = None,
+        material_hash: Optional[str] = None,
+        topic: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return up to limit stored questions matching the request that user_id has not
+        seen yet, served least often first. With material_hash, only questions generated
+        from that material or banked for the whole subject (pool questions) match;
+        without it, questions from any material do.
+        """
+        if limit <= 0:
+            return []
+        self.lookups += 1
+        questions = await self._run(
+            self._fetch, _norm_branch(branch), _norm_subject(subject), semester, difficulty, question_type,
+            limit, user_id, material_hash, topic
+        )
+        self.served += len(questions)
+        return questions
+    
+    def _fetch(
+        self,
+        branch: str,
+        subject: str,
+        semester: int,
+        difficulty: str,
+        question_type: str,
+        limit: int,
+        user_id: Optional[str],
+        material_hash: Optional[str],
+        topic: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        sql = [
+            "SELECT id, payload FROM questions",
+            "WHERE branch = ? AND subject = ? AND semester = ? AND difficulty = ? AND question_type = ?"
+        ]
+        params: List[Any] = [branch, subject, semester, difficulty, question_type]
+        if topic:
+            sql.append("AND topic = ?")
+            params.append(topic)
+        if material_hash:
+            sql.append("AND (content_hash = ? OR content_hash IS NULL)")
+            params.append(material_hash)
+        if user_id:
+            sql.append("AND NOT EXISTS (SELECT 1 FROM seen WHERE seen.user_id = ? AND seen.question_id = questions.id)")
+            params.append(user_id)
+        sql.append("ORDER BY (content_hash IS NOT NULL AND content_hash = ?) DESC, served_count, id LIMIT ?")
+        params.extend([material_hash or "", limit])
+        
+        rows = self._connection.execute(" ".join(sql), params).fetchall()
+        if rows:
+            self._connection.executemany(
+                "UPDATE questions SET served_count = served_count + 1 WHERE id = ?", [(row[0],) for row in rows]
+            )
+        questions = []
+        for question_id, payload in rows:
+            question = json.loads(payload)
+            question["id"] = f"{BANK_ID_PREFIX}{question_id}"
+            questions.append(question)
+        return questions
+    
+    async def count(self, branch: str, subject: str, semester: int, difficulty: str, question_type: str) -> int:
+        """Number of stored questions for one branch/subject/semester/difficulty/type combination"""
+        return await self._run(
+            self._count, _norm_branch(branch), _norm_subject(subject), semester, difficulty, question_type
+        )
+    
+    def _count(self, branch: str, subject: str, semester: int, difficulty: str, question_type: str) -> int:
+        row = self._connection.execute(
+            "SELECT COUNT(*) FROM questions WHERE branch = ? AND subject = ? AND semester = ? "
+            "AND difficulty = ? AND question_type = ?",
+            (branch, subject, semester, difficulty, question_type)
+        ).fetchone()
+        return int(row[0])
+    
+    async def add(
+        self,
+        questions: List[Dict[str, Any]],
+        branch: str,
+        subject: str,
+        semester: int,
+        difficulty: str,
+        question_type: str,
+        material_hash: Optional[str] = None
+    ) -> None:
+        """Store questions (skipping ones already banked) and give each its bank id"""
+        if not questions:
+            return
+        ids = await self._run(
+            self._add, questions, _norm_branch(branch), _norm_subject(subject), semester, difficulty,
+            question_type, material_hash
+        )
+        for question, question_id in zip(questions, ids):
+            if question_id is not None:
+                question["id"] = f"{BANK_ID_PREFIX}{question_id}"
+    
+    def _add(
+        self,
+        questions: List[Dict[str, Any]],
+        branch: str,
+        subject: str,
+        semester: int,
+        difficulty: str,
+        question_type: str,
+        material_hash: Optional[str]
+    ) -> List[Optional[int]]:
+        ids: List[Optional[int]] = []
+        now = time.time()
+        with self._connection:
+            self._connection.execute("BEGIN")
+            for question in questions:
+                # One row per question text and filter combination, so an existing row is
+                # never returned (and recorded as served) for a different difficulty or semester
+                question_hash = hashlib.sha1(
+                    f"{branch}|{subject}|{semester}|{difficulty}|{question_type}|"
+                    f"{normalize_question_text(question.get('question', ''))}".encode("utf-8")
+                ).hexdigest()
+                parsed = Question.parse(question)
+                if parsed is None:
+                    ids.append(None)
+                    continue
+                payload = parsed.to_dict()
+                del payload["id"]
+                cursor = self._connection.execute(
+                    "INSERT OR IGNORE INTO questions (question_hash, branch, subject, semester, difficulty, question_type, "
+                    "bloom_level, topic, content_hash, payload, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        question_hash, branch, subject, semester, difficulty, question_type,
+                        question.get("bloom_level"), question.get("topic"), material_hash,
+                        json.dumps(payload, ensure_ascii=False, separators=(",", ":")), now
+                    )
+                )
+                if cursor.rowcount:
+                    self.stored += 1
+                    ids.append(cursor.lastrowid)
+                else:
+                    row = self._connection.execute(
+                        "SELECT id FROM questions WHERE question_hash = ?", (question_hash,)
+                    ).fetchone()
+                    ids.append(row[0] if row else None)
+        return ids
+    
+    async def mark_seen(self, user_id: Optional[str], questions: Iterable[Dict[str, Any]]) -> None:
+        """Record that user_id was served these questions so later lookups skip them"""
+        question_ids = [question_id for question_id in map(bank_question_id, questions) if question_id is not None]
+        if user_id and question_ids:
+            await self._run(self._mark_seen, user_id, question_ids)
+    
+    async def seen(self, user_id: str, questions: Iterable[Dict[str, Any]]) -> Set[int]:
+        """Bank ids among questions that user_id has already been served"""
+        question_ids = [question_id for question_id in map(bank_question_id, questions) if question_id is not None]
+        if not user_id or not question_ids:
+            return set()
+        return await self._run(self._seen, user_id, question_ids)
+    
+    def _seen(self, user_id: str, question_ids: List[int]) -> Set[int]:
+        placeholders = ",".join("?" * len(question_ids))
+        rows = self._connection.execute(
+            f"SELECT question_id FROM seen WHERE user_id = ? AND question_id IN ({placeholders})",
+            [user_id, *question_ids]
+        ).fetchall()
+        return {row[0] for row in rows}
+    
+    def _mark_seen(self, user_id: str, question_ids: List[int]) -> None:
+        now = time.time()
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO seen (user_id, question_id, seen_at) VALUES (?, ?, ?)",
+            [(user_id, question_id, now) for question_id in question_ids]
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "served_from_bank": self.served,
+            "stored": self.stored
+        }
+    
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._connection.close()
+
+
+def _norm_branch(branch: str) -> str:
+    return branch.strip().upper()
+
+
+def _norm_subject(subject: str) -> str:
+    return " ".join(subject.lower().split())
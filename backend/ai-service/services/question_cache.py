@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.question_model import decode_questions, encode_questions, pack_questions, parse_questions, unpack_questions
+
+try:
+    import redis.asyncio as aioredis  # type: ignore
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds to stop talking to Redis after an error, so an unavailable Redis
+# does not add a connection timeout to every request
+REDIS_RETRY_INTERVAL = 30.0
+
+
+def make_question_cache_key(
+    content: str,
+    num_questions: int,
+    difficulty: str,
+    question_type: str,
+    subject: str,
+    branch: str,
+    semester: int
+) -> str:
+    """Build a content-addressed key from the normalized generation inputs"""
+    normalized = {
+        "content": " ".join(content.split()),
+        "num_questions": num_questions,
+        "difficulty": difficulty.strip().lower(),
+        "question_type": question_type.strip().lower(),
+        "subject": " ".join(subject.split()).lower(),
+        "branch": branch.strip().upper(),
+        "semester": semester
+    }
+    digest = hashlib.sha256(
+        json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f"qset:{digest}"
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after a fixed TTL"""
+    
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+    
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class QuestionCache:
+    """
+    Two-tier cache for generated question sets: local LRU+TTL, then optional Redis.
+    The local tier holds each set in the packed binary question form.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: int = 3600,
+        redis_url: Optional[str] = None
+    ):
+        self.ttl = ttl
+        self._local = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._redis: Optional[Any] = None
+        self._redis_retry_at = 0.0
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+        
+        if redis_url and aioredis:
+            self._redis = aioredis.from_url(
+                redis_url, socket_connect_timeout=0.25, socket_timeout=0.25
+            )
+        elif redis_url:
+            logger.warning("redis package not available. Question cache will be local only.")
+    
+    async def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return a fresh copy of the cached question set, or None on a miss"""
+        packed = self._local.get(key)
+        if packed is not None:
+            self.local_hits += 1
+            return [question.to_dict() for question in unpack_questions(packed)]
+        
+        if self._redis_available():
+            try:
+                payload = await self._redis.get(key)  # type: ignore
+            except Exception as e:
+                self._redis_failed(e)
+                payload = None
+            if payload is not None:
+                questions = decode_questions(payload)
+                self._local.set(key, pack_questions(questions))
+                self.redis_hits += 1
+                return [question.to_dict() for question in questions]
+        
+        self.misses += 1
+        return None
+    
+    async def set(self, key: str, questions: List[Dict[str, Any]]) -> None:
+        """Store a question set in both tiers: packed binary locally, JSON in Redis"""
+        parsed = parse_questions(questions)
+        self._local.set(key, pack_questions(parsed))
+        
+        if self._redis_available():
+            try:
+                await self._redis.set(key, encode_questions(parsed), ex=self.ttl)  # type: ignore
+            except Exception as e:
+                self._redis_failed(e)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self._local),
+            "redis_enabled": self._redis is not None,
+            "redis_errors": self.redis_errors
+        }
+    
+    def _redis_available(self) -> bool:
+        return self._redis is not None and time.monotonic() >= self._redis_retry_at
+    
+    def _redis_failed(self, error: Exception) -> None:
+        self.redis_errors += 1
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        logger.warning(f"Question cache Redis error, using local tier only: {str(error)}")
@@ -1,15 +1,115 @@
+import asyncio
 import json
 import re
 import random
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import logging
 
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.deadline import Deadline, finish_within
+from services.dedup import QuestionDeduplicator
+from services.json_extractor import IncrementalObjectExtractor, find_json_object, parse_object_array
+from services.gemini_scheduler import GeminiScheduler, estimate_tokens, response_tokens
+from services.metrics import AI_FALLBACKS, AI_REQUESTS, AI_RESPONSES_PARSED, GEMINI_CALL_SECONDS, GEMINI_ERRORS, gemini_error_reason
+from services.question_bank import QuestionBank, bank_question_id, content_hash
+from services.question_cache import QuestionCache, make_question_cache_key
+from services.question_model import Question, validate_questions
+from services.single_flight import SingleFlight, make_flight_key
+from services.text_chunker import allocate_questions, select_evenly, split_content
+from services.topic_dictionary import get_topic_matcher
+
 logger = logging.getLogger(__name__)
 
+# Batch specs at or below this size may share a Gemini prompt with other specs
+PACK_MAX_QUESTIONS_PER_SPEC = 10
+# Upper bound on questions requested from a single packed prompt
+PACK_MAX_QUESTIONS = 20
+
+# Content longer than this is split into chunks and generated map-reduce style
+CHUNK_MAX_CHARS = 4000
+# Upper bound on chunk prompts per request, regardless of document length
+MAX_CHUNKS_PER_REQUEST = 10
+
+# Plain-text fallback parsing: numbered question blocks and lettered MCQ options
+QUESTION_BLOCK_PATTERN = re.compile(r'\n\s*\d+[\.\)]\s*')
+OPTION_PATTERN = re.compile(r'^[A-D][\.\)]\s*')
+ANSWER_LETTER_PATTERN = re.compile(r'[A-D]')
+
+# Marks the end of a Gemini stream relayed from the executor thread
+_STREAM_END = object()
+
+# Last-resort questions used when padding a short set; rotated so no two are alike
+GENERIC_QUESTION_TEMPLATES = [
+    ("What is a key concept from the provided content?", [
+        "A fundamental principle covered in the material",
+        "An unrelated concept from another field",
+        "A deprecated method no longer in use",
+        "A purely theoretical idea with no applications"
+    ], "remember"),
+    ("Which statement best describes the main purpose of the topic covered in the material?", [
+        "It explains how and why the core technique works",
+        "It lists historical facts without any application",
+        "It covers a topic from an unrelated discipline",
+        "It only defines terminology without explanation"
+    ], "understand"),
+    ("How would you apply the central idea of the material to a new problem?", [
+        "Identify the governing principle and use it to model the problem",
+        "Memorize the examples and reuse their answers unchanged",
+        "Ignore the assumptions stated in the material",
+        "Pick whichever formula appears first in the chapter"
+    ], "apply"),
+    ("What is the best way to verify your understanding of this material?", [
+        "Solve practice problems and compare the reasoning with worked examples",
+        "Re-read the headings only",
+        "Skip the examples and memorize definitions",
+        "Rely only on the summary at the end of the chapter"
+    ], "evaluate"),
+    ("Which assumption is most important when using the methods described in the material?", [
+        "The conditions under which the method is valid",
+        "The order in which the chapters are printed",
+        "The name of the author who proposed it",
+        "The number of pages devoted to the topic"
+    ], "analyze")
+]
+
 class QuestionGenerator:
-    def __init__(self, gemini_model: Optional[Any] = None):
+    def __init__(
+        self,
+        gemini_model: Optional[Any] = None,
+        max_concurrency: int = 8,
+        request_timeout: float = 60.0,
+        cache: Optional[QuestionCache] = None,
+        chunk_concurrency: int = 4,
+        deduplicator: Optional[QuestionDeduplicator] = None,
+        bank: Optional[QuestionBank] = None,
+        scheduler: Optional[GeminiScheduler] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
         self.gemini_model = gemini_model
         self.has_ai = bool(gemini_model)
+        self.cache = cache
+        self.bank = bank
+        # Admits Gemini calls by priority within the concurrency cap and per-minute quotas;
+        # extra callers wait here instead of blocking the event loop
+        self.scheduler = scheduler or GeminiScheduler(max_concurrency=max_concurrency)
+        self.max_concurrency = self.scheduler.max_concurrency
+        # While Gemini is failing, calls are rejected at once and callers take the fallback path
+        self.breaker = breaker or CircuitBreaker(name="Gemini")
+        self.request_timeout = request_timeout
+        self.chunk_concurrency = max(1, chunk_concurrency)
+        self.topic_matcher = get_topic_matcher()
+        # Exact-duplicate filtering only, unless an embedding-backed deduplicator is passed in
+        self.deduplicator = deduplicator or QuestionDeduplicator()
+        # Identical concurrent requests share one generation instead of one Gemini call each
+        self.inflight = SingleFlight()
+        # Only used when the SDK has no async API (the sync call runs off the event loop)
+        self._gemini_executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="gemini"
+        )
         
     async def generate_questions(
         self,
@@ -19,22 +119,122 @@ class QuestionGenerator:
         question_type: str = "mcq",
         subject: str = "General",
         branch: str = "",
-        semester: int = 1
+        semester: int = 1,
+        user_id: Optional[str] = None,
+        priority: str = "interactive",
+        budget: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Serve questions from the question bank first, skipping ones user_id has already
+        seen, and generate only the shortfall. If budget (seconds) runs out first, the
+        shortfall is filled with rule-based questions while AI generation finishes in
+        the background and fills the cache and bank for later requests.
+        """
+        AI_REQUESTS.labels("questions").inc()
+        deadline = Deadline(budget) if budget is not None else None
+        banked = await self._fetch_banked(
+            content, num_questions, difficulty, question_type, subject, branch, semester, user_id
+        )
+        questions = banked
+        if len(banked) < num_questions:
+            shortfall = num_questions - len(banked)
+            finished, generated = await finish_within(self._generate_unseen(
+                content, shortfall, difficulty, question_type, subject, branch, semester,
+                user_id=user_id, priority=priority
+            ), deadline)
+            if not finished:
+                logger.info(f"Question generation exceeded its {budget}s budget; serving rule-based questions")
+                AI_FALLBACKS.labels("questions", "deadline").inc()
+                generated = await self._generate_fallback_questions(
+                    content, shortfall, difficulty, question_type, subject, branch, semester
+                )
+            questions = banked + (await self.deduplicator.dedupe(generated, keep=banked) if banked else generated)
+        await self._mark_served(user_id, questions)
+        return questions
+    
+    async def _generate_new_questions(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        question_type: str,
+        subject: str,
+        branch: str,
+        semester: int,
+        priority: str = "interactive"
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate questions from content using AI or fallback to rule-based generation.
+        Concurrent calls with the same normalized inputs share a single generation.
+        """
+        key = make_question_cache_key(content, num_questions, difficulty, question_type, subject, branch, semester)
+        return await self.inflight.run(key, lambda: self._generate_uncoalesced(
+            content, num_questions, difficulty, question_type, subject, branch, semester, priority
+        ))
+    
+    async def _generate_unseen(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        question_type: str,
+        subject: str,
+        branch: str,
+        semester: int,
+        user_id: Optional[str] = None,
+        priority: str = "interactive"
     ) -> List[Dict[str, Any]]:
         """
-        Generate questions from content using AI or fallback to rule-based generation
+        _generate_new_questions for one user. Cached and coalesced sets are shared between
+        users and can hold bank questions user_id was already served; those are replaced
+        with freshly generated questions.
         """
+        questions = await self._generate_new_questions(
+            content, num_questions, difficulty, question_type, subject, branch, semester, priority=priority
+        )
+        unseen = await self._unseen(user_id, questions)
+        if len(unseen) == len(questions):
+            return questions
+        fresh = await self._generate_uncoalesced(
+            content, num_questions - len(unseen), difficulty, question_type, subject, branch, semester,
+            priority, use_cache=False
+        )
+        return unseen + await self.deduplicator.dedupe(fresh, keep=unseen)
+    
+    async def _generate_uncoalesced(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        question_type: str,
+        subject: str,
+        branch: str,
+        semester: int,
+        priority: str,
+        use_cache: bool = True
+    ) -> List[Dict[str, Any]]:
         try:
             if self.has_ai:
+                cache_key = None
+                if self.cache is not None and use_cache:
+                    cache_key = make_question_cache_key(
+                        content, num_questions, difficulty, question_type, subject, branch, semester
+                    )
+                    cached = await self.cache.get(cache_key)
+                    if cached is not None:
+                        return cached
                 return await self._generate_ai_questions(
-                    content, num_questions, difficulty, question_type, subject, branch, semester
+                    content, num_questions, difficulty, question_type, subject, branch, semester,
+                    cache_key=cache_key, priority=priority
                 )
             else:
+                AI_FALLBACKS.labels("questions", "no_ai").inc()
                 return await self._generate_fallback_questions(
                     content, num_questions, difficulty, question_type, subject, branch, semester
                 )
         except Exception as e:
             logger.error(f"Error in question generation: {str(e)}")
+            AI_FALLBACKS.labels("questions", "error").inc()
             # Always fallback to rule-based generation on error
             return await self._generate_fallback_questions(
                 content, num_questions, difficulty, question_type, subject, branch, semester
@@ -48,48 +248,415 @@ class QuestionGenerator:
         question_type: str,
         subject: str,
         branch: str,
-        semester: int
+        semester: int,
+        cache_key: Optional[str] = None,
+        priority: str = "interactive",
+        pooled: bool = False
     ) -> List[Dict[str, Any]]:
-        """Generate questions using AI (OpenAI or Gemini)"""
-        
-        prompt = self._create_question_prompt(
-            content, num_questions, difficulty, question_type, subject, branch, semester
-        )
+        """
+        Generate questions using AI (OpenAI or Gemini). Pooled questions are banked for
+        the whole subject rather than for the material they were generated from.
+        """
         
         try:
             # Use Gemini for AI generation
-            if self.gemini_model:
-                response = await self._generate_with_gemini(prompt)
-            else:
+            if not self.gemini_model:
                 raise Exception("No AI service available")
+            
+            if len(content) > CHUNK_MAX_CHARS:
+                questions = await self._generate_chunked_questions(
+                    content, num_questions, difficulty, question_type, subject, branch, semester, priority
+                )
+            else:
+                prompt = self._create_question_prompt(
+                    content, num_questions, difficulty, question_type, subject, branch, semester
+                )
+                response = await self._generate_with_gemini(prompt, priority)
                 
-            # Parse AI response into structured questions
-            questions = self._parse_ai_response(response, question_type)
+                # Parse AI response into structured questions
+                questions = self._parse_ai_response(response, question_type)
+            
+            # Validate, deduplicate and top up questions
+            validated_questions, ai_count = await self._validate_questions(
+                questions, num_questions, content, difficulty, question_type, subject, branch, semester
+            )
+            
+            await self._store_in_bank(
+                validated_questions[:ai_count], None if pooled else content,
+                difficulty, question_type, subject, branch, semester
+            )
             
-            # Validate and clean questions
-            validated_questions = self._validate_questions(questions, num_questions)
+            # Only cache sets the model fully answered, not ones padded with fallbacks
+            if cache_key and self.cache is not None and ai_count >= num_questions:
+                await self.cache.set(cache_key, validated_questions)
             
-            return validated_questions[:num_questions]
+            return validated_questions
             
         except Exception as e:
             logger.error(f"AI generation failed: {str(e)}")
+            AI_FALLBACKS.labels("questions", "ai_failed").inc()
             # Fallback to rule-based generation
             return await self._generate_fallback_questions(
                 content, num_questions, difficulty, question_type, subject, branch, semester
             )
     
-    async def _generate_with_gemini(self, prompt: str) -> str:
-        """Generate content using Gemini AI"""
+    async def _generate_chunked_questions(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        question_type: str,
+        subject: str,
+        branch: str,
+        semester: int,
+        priority: str = "interactive"
+    ) -> List[Dict[str, Any]]:
+        """
+        Map-reduce generation for long content: split on structural boundaries, spread
+        the questions across chunks by size, generate per chunk concurrently, then
+        merge and deduplicate.
+        """
+        chunks = split_content(content, CHUNK_MAX_CHARS)
+        chunks = select_evenly(chunks, min(num_questions, MAX_CHUNKS_PER_REQUEST))
+        allocation = allocate_questions([len(chunk) for chunk in chunks], num_questions)
+        semaphore = asyncio.Semaphore(self.chunk_concurrency)
+        
+        async def generate_chunk(chunk: str, count: int) -> List[Dict[str, Any]]:
+            async with semaphore:
+                prompt = self._create_question_prompt(
+                    chunk, count, difficulty, question_type, subject, branch, semester
+                )
+                response = await self._generate_with_gemini(prompt, priority)
+            return validate_questions(self._parse_ai_response(response, question_type))[:count]
+        
+        results = await asyncio.gather(
+            *[generate_chunk(chunk, count) for chunk, count in zip(chunks, allocation) if count > 0],
+            return_exceptions=True
+        )
+        
+        merged: List[Dict[str, Any]] = []
+        failures = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                failures += 1
+                logger.warning(f"Chunk generation failed: {str(result)}")
+                continue
+            merged.extend(result)
+        
+        # Chunks overlap in topic, so drop repeats across them before renumbering
+        merged = await self.deduplicator.dedupe(merged)
+        for index, question in enumerate(merged, 1):
+            question["id"] = f"ai_q_{index}"
+        
+        if failures == len(results):
+            raise Exception("All chunk generations failed")
+        
+        logger.info(f"Generated {len(merged)} questions from {len(results)} content chunks")
+        return merged
+    
+    async def stream_questions(
+        self,
+        content: str,
+        num_questions: int = 10,
+        difficulty: str = "medium",
+        question_type: str = "mcq",
+        subject: str = "General",
+        branch: str = "",
+        semester: int = 1,
+        user_id: Optional[str] = None,
+        priority: str = "interactive"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield banked questions first, then the rest one at a time as soon as each is
+        parsed from Gemini's streaming output
+        """
+        AI_REQUESTS.labels("questions").inc()
+        banked = await self._fetch_banked(
+            content, num_questions, difficulty, question_type, subject, branch, semester, user_id
+        )
+        for question in banked:
+            yield question
+        remaining = num_questions - len(banked)
+        if remaining <= 0:
+            await self._mark_served(user_id, banked)
+            return
+        
+        cache_key = None
+        if self.has_ai and self.cache is not None:
+            cache_key = make_question_cache_key(
+                content, remaining, difficulty, question_type, subject, branch, semester
+            )
+            cached = await self.cache.get(cache_key)
+            # A cached set holding questions this user was already served is not reused
+            if cached is not None and len(await self._unseen(user_id, cached)) == len(cached):
+                cached = await self.deduplicator.dedupe(cached, keep=banked)
+                for question in cached:
+                    yield question
+                await self._mark_served(user_id, banked + cached)
+                return
+        
+        streamed: List[Dict[str, Any]] = []
+        if self.has_ai:
+            prompt = self._create_question_prompt(
+                content, remaining, difficulty, question_type, subject, branch, semester
+            )
+            extractor = IncrementalObjectExtractor("questions")
+            try:
+                async with aclosing(self._stream_with_gemini(prompt, priority)) as chunks:
+                    async for chunk in chunks:
+                        for item in extractor.feed(chunk):
+                            parsed = Question.parse(item)
+                            if parsed is None or len(streamed) >= remaining:
+                                continue
+                            question = parsed.to_dict()
+                            if not await self.deduplicator.dedupe([question], keep=banked + streamed):
+                                continue
+                            streamed.append(question)
+                            yield question
+                        if extractor.done or len(streamed) >= remaining:
+                            break
+            except Exception as e:
+                logger.error(f"AI streaming generation failed: {str(e)}")
+        
+        # Bank what the model produced; ids are assigned in place on the yielded dicts
+        await self._store_in_bank(streamed, content, difficulty, question_type, subject, branch, semester)
+        
+        # Top up with rule-based questions if the stream ended short or AI is unavailable
+        shortfall = remaining - len(streamed)
+        if shortfall > 0:
+            AI_FALLBACKS.labels("questions", "top_up" if streamed else "ai_failed" if self.has_ai else "no_ai").inc()
+            fallback = await self._generate_fallback_questions(
+                content, shortfall, difficulty, question_type, subject, branch, semester
+            )
+            topped_up = await self.deduplicator.dedupe(fallback, keep=banked + streamed)
+            for question in topped_up:
+                yield question
+            for index in range(len(streamed) + len(topped_up), remaining):
+                yield self._create_fallback_question(index + 1)
+        elif cache_key and self.cache is not None:
+            await self.cache.set(cache_key, streamed)
+        await self._mark_served(user_id, banked + streamed)
+    
+    async def generate_question_batch(
+        self,
+        specs: List[Dict[str, Any]],
+        user_id: Optional[str] = None,
+        priority: str = "batch",
+        budget: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate several question sets concurrently. Each spec is served from the
+        question bank first; small specs that share the same content, branch and
+        semester are packed into a single Gemini prompt for their shortfall.
+        Specs still generating when budget (seconds) runs out get rule-based questions.
+        Returns one result per spec, in order, each with its own error.
+        """
+        deadline = Deadline(budget) if budget is not None else None
+        results: List[Optional[Dict[str, Any]]] = [None] * len(specs)
+        banked: List[List[Dict[str, Any]]] = []
+        pending: List[int] = []
+        # Copies, so shortfall counts do not leak back to the caller
+        specs = [dict(spec) for spec in specs]
+        
+        for index, spec in enumerate(specs):
+            banked.append(await self._fetch_banked(user_id=user_id, **spec))
+            if len(banked[index]) >= spec["num_questions"]:
+                results[index] = {"success": True, "questions": banked[index], "error": None}
+                continue
+            spec["num_questions"] -= len(banked[index])
+            if self.has_ai and self.cache is not None:
+                cached = await self.cache.get(self._spec_cache_key(spec))
+                if cached is not None and len(await self._unseen(user_id, cached)) == len(cached):
+                    results[index] = {"success": True, "questions": cached, "error": None}
+                    continue
+            pending.append(index)
+        
+        single_specs: List[int] = []
+        packed_groups: List[List[int]] = []
+        if self.has_ai:
+            groups: Dict[Any, List[int]] = {}
+            for index in pending:
+                spec = specs[index]
+                if spec["num_questions"] > PACK_MAX_QUESTIONS_PER_SPEC:
+                    single_specs.append(index)
+                    continue
+                group_key = (" ".join(spec["content"].split()), spec["branch"].upper(), spec["semester"])
+                groups.setdefault(group_key, []).append(index)
+            
+            for group in groups.values():
+                # Split each group into prompts holding at most PACK_MAX_QUESTIONS questions
+                current: List[int] = []
+                total = 0
+                for index in group:
+                    if current and total + specs[index]["num_questions"] > PACK_MAX_QUESTIONS:
+                        packed_groups.append(current)
+                        current, total = [], 0
+                    current.append(index)
+                    total += specs[index]["num_questions"]
+                if current:
+                    packed_groups.append(current)
+            
+            single_specs.extend(group[0] for group in packed_groups if len(group) == 1)
+            packed_groups = [group for group in packed_groups if len(group) > 1]
+        else:
+            single_specs = pending
+        
+        async def run_single(index: int) -> None:
+            try:
+                questions = await self._generate_unseen(user_id=user_id, priority=priority, **specs[index])
+                results[index] = {"success": True, "questions": questions, "error": None}
+            except Exception as e:
+                logger.error(f"Batch spec {index} failed: {str(e)}")
+                results[index] = {"success": False, "questions": [], "error": str(e)}
+        
+        async def run_packed(group: List[int]) -> None:
+            try:
+                question_sets = await self._generate_packed_questions([specs[i] for i in group], priority)
+                for index, questions in zip(group, question_sets):
+                    results[index] = {"success": True, "questions": questions, "error": None}
+            except Exception as e:
+                logger.error(f"Packed batch generation failed: {str(e)}")
+                await asyncio.gather(*[run_single(index) for index in group])
+        
+        finished, _ = await finish_within(asyncio.gather(
+            *[run_single(index) for index in single_specs],
+            *[run_packed(group) for group in packed_groups]
+        ), deadline)
+        # Late sets keep generating into results (and the cache); answer from a snapshot
+        outcome = list(results)
+        if not finished:
+            for index in range(len(outcome)):
+                if outcome[index] is None:
+                    fallback = await self._generate_fallback_questions(**specs[index])
+                    outcome[index] = {"success": True, "questions": fallback, "error": None}
+        
+        for index, result in enumerate(outcome):
+            if result is None or not result["success"]:
+                continue
+            if banked[index] and result["questions"] is not banked[index]:
+                result["questions"] = banked[index] + await self.deduplicator.dedupe(
+                    result["questions"], keep=banked[index]
+                )
+            await self._mark_served(user_id, result["questions"])
+        
+        return [
+            result if result is not None else {"success": False, "questions": [], "error": "Not processed"}
+            for result in outcome
+        ]
+    
+    async def _generate_packed_questions(
+        self,
+        specs: List[Dict[str, Any]],
+        priority: str = "batch"
+    ) -> List[List[Dict[str, Any]]]:
+        """Generate question sets for several small specs with a single Gemini call"""
+        prompt = self._create_packed_prompt(specs)
+        
         try:
-            if self.gemini_model is None:
-                raise Exception("Gemini model is not initialized")
-            response = self.gemini_model.generate_content(prompt)
-            return response.text
+            response = await self._generate_with_gemini(prompt, priority)
+            question_sets = self._parse_packed_response(response, len(specs))
         except Exception as e:
-            logger.error(f"Gemini generation error: {str(e)}")
-            raise
+            logger.error(f"Packed AI generation failed: {str(e)}")
+            return [await self._generate_fallback_questions(**spec) for spec in specs]
+        
+        results: List[List[Dict[str, Any]]] = []
+        for spec, questions in zip(specs, question_sets):
+            validated, ai_count = await self._validate_questions(
+                questions, spec["num_questions"], spec["content"], spec["difficulty"], spec["question_type"],
+                spec["subject"], spec["branch"], spec["semester"]
+            )
+            await self._store_in_bank(
+                validated[:ai_count], spec["content"], spec["difficulty"], spec["question_type"],
+                spec["subject"], spec["branch"], spec["semester"]
+            )
+            if self.cache is not None and ai_count >= spec["num_questions"]:
+                await self.cache.set(self._spec_cache_key(spec), validated)
+            results.append(validated)
+        
+        return results
     
-    def _create_question_prompt(
+    def _create_packed_prompt(self, specs: List[Dict[str, Any]]) -> str:
+        """Create one prompt that asks for a separate question set per spec"""
+        first = specs[0]
+        branch = first["branch"]
+        branch_context = self._get_branch_context(branch)
+        content = first["content"]
+        
+        set_lines = []
+        for set_number, spec in enumerate(specs, 1):
+            set_lines.append(
+                f"- Set {set_number}: {spec['num_questions']} {spec['question_type'].upper()} questions, "
+                f"subject {spec['subject']} (focus: {self._get_subject_keywords(spec['subject'])}), "
+                f"difficulty {spec['difficulty']}"
+            )
+        sets_text = "\n".join(set_lines)
+        
+        return f"""
+Generate {len(specs)} separate sets of high-quality questions for {branch_context}.
+
+ACADEMIC CONTEXT:
+- Branch: {branch_context}
+- Semester: {first['semester']} (Semester {first['semester']} level complexity)
+
+QUESTION SETS:
+{sets_text}
+
+CONTENT TO ANALYZE:
+{content[:CHUNK_MAX_CHARS] if content.strip() else "Generate questions based on the core topics of each subject"}
+
+SPECIFIC REQUIREMENTS:
+1. Each set MUST contain exactly the requested number of questions for its subject, type and difficulty
+2. Questions must be appropriate for semester {first['semester']} {branch} engineering students
+3. For MCQ: 4 options with 1 clearly correct answer and 3 plausible distractors
+4. Do not repeat questions across sets
+
+OUTPUT FORMAT (JSON):
+{{
+    "question_sets": [
+        {{
+            "set": 1,
+            "questions": [
+                {{
+                    "id": "q1",
+                    "question": "Question text here",
+                    "type": "mcq/short_answer/essay",
+                    "difficulty": "easy/medium/hard",
+                    "subject": "Subject of this set",
+                    "branch": "{branch}",
+                    "options": ["A", "B", "C", "D"],  // For MCQ only
+                    "correct_answer": 1,  // Index for MCQ, text for others
+                    "explanation": "Detailed explanation",
+                    "keywords": ["key1", "key2"],  // For short answer
+                    "topic": "Specific topic",
+                    "bloom_level": "remember/understand/apply/analyze/evaluate/create",
+                    "estimated_time": 2
+                }}
+            ]
+        }}
+    ]
+}}
+"""
+
+    def _parse_packed_response(self, response: str, num_sets: int) -> List[List[Dict[str, Any]]]:
+        """Split a packed AI response back into one question list per set"""
+        # Complete sets are kept even when the response was cut off
+        raw_sets = parse_object_array(response, "question_sets")
+        if not raw_sets:
+            raise ValueError("No question sets found in packed response")
+        
+        question_sets: List[List[Dict[str, Any]]] = [[] for _ in range(num_sets)]
+        for position, question_set in enumerate(raw_sets):
+            if not isinstance(question_set, dict):
+                continue
+            set_number = question_set.get("set", position + 1)
+            if isinstance(set_number, int) and 1 <= set_number <= num_sets:
+                question_sets[set_number - 1].extend(
+                    q for q in question_set.get("questions", []) if isinstance(q, dict)
+                )
+        
+        return question_sets
+    
+    async def generate_pool_questions(
         self,
         content: str,
         num_questions: int,
@@ -98,8 +665,215 @@ class QuestionGenerator:
         subject: str,
         branch: str,
         semester: int
-    ) -> str:
-        """Create a detailed prompt for AI question generation"""
+    ) -> int:
+        """
+        Generate fresh AI questions straight into the question bank at batch priority,
+        bypassing cache and bank reads. Returns how many questions were banked.
+        """
+        if not self.has_ai or self.bank is None:
+            return 0
+        questions = await self._generate_ai_questions(
+            content, num_questions, difficulty, question_type, subject, branch, semester,
+            priority="batch", pooled=True
+        )
+        return sum(1 for question in questions if bank_question_id(question) is not None)
+    
+    async def _fetch_banked(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        question_type: str,
+        subject: str,
+        branch: str,
+        semester: int,
+        user_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        if self.bank is None:
+            return []
+        try:
+            return await self.bank.fetch(
+                branch, subject, semester, difficulty, question_type, num_questions,
+                user_id=user_id, material_hash=content_hash(content) if content.strip() else None
+            )
+        except Exception as e:
+            logger.error(f"Question bank lookup failed: {str(e)}")
+            return []
+    
+    async def _store_in_bank(
+        self,
+        questions: List[Dict[str, Any]],
+        content: Optional[str],
+        difficulty: str,
+        question_type: str,
+        subject: str,
+        branch: str,
+        semester: int
+    ) -> None:
+        """
+        Keep model-written questions (never rule-based fallbacks) for later requests on the
+        same material, or for any request on the subject when content is None (pool questions)
+        """
+        if self.bank is None or not questions:
+            return
+        try:
+            await self.bank.add(
+                questions, branch, subject, semester, difficulty, question_type,
+                content_hash(content) if content is not None else None
+            )
+        except Exception as e:
+            logger.error(f"Failed to store questions in bank: {str(e)}")
+    
+    async def _unseen(self, user_id: Optional[str], questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """questions without the bank questions user_id has already been served"""
+        if self.bank is None or not user_id:
+            return questions
+        try:
+            seen = await self.bank.seen(user_id, questions)
+        except Exception as e:
+            logger.error(f"Question bank seen lookup failed: {str(e)}")
+            return questions
+        return [question for question in questions if bank_question_id(question) not in seen]
+    
+    async def _mark_served(self, user_id: Optional[str], questions: List[Dict[str, Any]]) -> None:
+        if self.bank is None or not user_id:
+            return
+        try:
+            await self.bank.mark_seen(user_id, questions)
+        except Exception as e:
+            logger.error(f"Failed to record served questions: {str(e)}")
+    
+    def _spec_cache_key(self, spec: Dict[str, Any]) -> str:
+        return make_question_cache_key(
+            spec["content"], spec["num_questions"], spec["difficulty"], spec["question_type"],
+            spec["subject"], spec["branch"], spec["semester"]
+        )
+    
+    async def generate_text(self, prompt: str, priority: str = "interactive") -> str:
+        """Run a free-form prompt (e.g. a tutor answer) through the same Gemini scheduler"""
+        return await self._generate_with_gemini(prompt, priority)
+    
+    async def _generate_with_gemini(self, prompt: str, priority: str = "interactive") -> str:
+        """Generate content using Gemini AI without blocking the event loop"""
+        if self.gemini_model is None:
+            raise Exception("Gemini model is not initialized")
+        if not self.breaker.allow():
+            GEMINI_ERRORS.labels("generate", "circuit_open").inc()
+            raise CircuitOpenError("Gemini circuit is open")
+        
+        recorded = False
+        try:
+            async with self.scheduler.slot(priority, estimate_tokens(prompt)) as grant:
+                started = time.perf_counter()
+                try:
+                    if hasattr(self.gemini_model, "generate_content_async"):
+                        call = self.gemini_model.generate_content_async(prompt)
+                    else:
+                        loop = asyncio.get_running_loop()
+                        worker = loop.run_in_executor(
+                            self._gemini_executor, self.gemini_model.generate_content, prompt
+                        )
+                        # A timeout cannot stop the thread, so the slot stays taken until it returns
+                        grant.hold_until(worker)
+                        call = asyncio.shield(worker)
+                    response = await asyncio.wait_for(call, timeout=self.request_timeout)
+                    text = response.text
+                except Exception as e:
+                    recorded = True
+                    elapsed = time.perf_counter() - started
+                    self.breaker.record_failure(elapsed)
+                    GEMINI_CALL_SECONDS.labels("generate", "error").observe(elapsed)
+                    GEMINI_ERRORS.labels("generate", gemini_error_reason(e)).inc()
+                    raise
+                recorded = True
+                elapsed = time.perf_counter() - started
+                self.breaker.record_success(elapsed)
+                GEMINI_CALL_SECONDS.labels("generate", "success").observe(elapsed)
+                grant.record_usage(response_tokens(response))
+            return text
+        except Exception as e:
+            logger.error(f"Gemini generation error: {str(e)}")
+            raise
+        finally:
+            if not recorded:
+                self.breaker.record_cancelled()
+    
+    async def _stream_with_gemini(self, prompt: str, priority: str = "interactive") -> AsyncIterator[str]:
+        """Yield text chunks from Gemini's streaming API, reporting the outcome to the circuit breaker"""
+        if self.gemini_model is None:
+            raise Exception("Gemini model is not initialized")
+        if not self.breaker.allow():
+            GEMINI_ERRORS.labels("stream", "circuit_open").inc()
+            raise CircuitOpenError("Gemini circuit is open")
+        
+        recorded = False
+        started = time.perf_counter()
+        try:
+            async with aclosing(self._stream_chunks(prompt, priority)) as chunks:
+                async for text in chunks:
+                    if not recorded:
+                        # Time to first chunk is what the latency check is about
+                        recorded = True
+                        self.breaker.record_success(time.perf_counter() - started)
+                    yield text
+            if not recorded:
+                recorded = True
+                self.breaker.record_success(time.perf_counter() - started)
+            GEMINI_CALL_SECONDS.labels("stream", "success").observe(time.perf_counter() - started)
+        except Exception as e:
+            if not recorded:
+                recorded = True
+                self.breaker.record_failure(time.perf_counter() - started)
+            GEMINI_CALL_SECONDS.labels("stream", "error").observe(time.perf_counter() - started)
+            GEMINI_ERRORS.labels("stream", gemini_error_reason(e)).inc()
+            raise
+        finally:
+            if not recorded:
+                self.breaker.record_cancelled()
+    
+    async def _stream_chunks(self, prompt: str, priority: str) -> AsyncIterator[str]:
+        """Yield text chunks from Gemini's streaming API without blocking the event loop"""
+        async with self.scheduler.slot(priority, estimate_tokens(prompt)) as grant:
+            if hasattr(self.gemini_model, "generate_content_async"):
+                response = await asyncio.wait_for(
+                    self.gemini_model.generate_content_async(prompt, stream=True),
+                    timeout=self.request_timeout
+                )
+                async for chunk in response:
+                    yield chunk.text
+                return
+            
+            # Sync SDK: iterate the stream in the executor and hand chunks back through a queue
+            loop = asyncio.get_running_loop()
+            queue: "asyncio.Queue[Any]" = asyncio.Queue()
+            gemini_model = self.gemini_model
+            stopped = threading.Event()
+            
+            def produce() -> None:
+                try:
+                    for chunk in gemini_model.generate_content(prompt, stream=True):
+                        if stopped.is_set():
+                            return
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+                    loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+                except Exception as e:
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+            
+            # The slot stays taken until the producer thread notices the consumer is gone
+            grant.hold_until(loop.run_in_executor(self._gemini_executor, produce))
+            try:
+                while True:
+                    item = await asyncio.wait_for(queue.get(), timeout=self.request_timeout)
+                    if item is _STREAM_END:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                stopped.set()
+    
+    def _get_branch_context(self, branch: str) -> str:
+        """Describe an academic branch for prompt context"""
         
         # Define branch-specific context
         branch_contexts = {
@@ -115,23 +889,30 @@ class QuestionGenerator:
             "IT": "Information Technology focusing on software engineering, web technologies, network security, and mobile computing"
         }
         
-        branch_context = branch_contexts.get(branch.upper(), f"{branch} Engineering")
-        
-        # Define subject-specific question examples
-        subject_examples = {
-            "Data Structures": "arrays, linked lists, stacks, queues, trees, graphs, hash tables, searching and sorting algorithms",
-            "Algorithms": "time complexity, space complexity, sorting algorithms, graph algorithms, dynamic programming, greedy algorithms",
-            "Thermodynamics": "heat transfer, energy conversion, entropy, enthalpy, thermodynamic cycles, laws of thermodynamics",
-            "Fluid Mechanics": "fluid properties, flow measurement, Bernoulli's equation, flow through pipes, fluid statics",
-            "Digital Electronics": "logic gates, Boolean algebra, combinational circuits, sequential circuits, flip-flops, counters",
-            "Signal Processing": "Fourier transforms, filtering, sampling, digital signal processing, analog-to-digital conversion",
-            "Database Systems": "SQL queries, normalization, relational algebra, ACID properties, indexing, database design",
-            "Operating Systems": "process management, memory management, file systems, scheduling algorithms, deadlocks",
-            "Circuit Analysis": "Ohm's law, Kirchhoff's laws, AC/DC circuits, network theorems, circuit analysis techniques",
-            "Structural Analysis": "stress analysis, beam design, load calculations, structural mechanics, material properties"
-        }
+        return branch_contexts.get(branch.upper(), f"{branch} Engineering")
+    
+    def _get_subject_keywords(self, subject: str) -> str:
+        """Describe the focus areas of a subject for prompt context"""
+        terms = self.topic_matcher.subject_terms(subject)
+        if terms:
+            return ", ".join(terms[:8])
         
-        subject_keywords = subject_examples.get(subject, f"{subject} concepts and principles")
+        return f"{subject} concepts and principles"
+    
+    def _create_question_prompt(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        question_type: str,
+        subject: str,
+        branch: str,
+        semester: int
+    ) -> str:
+        """Create a detailed prompt for AI question generation"""
+        
+        branch_context = self._get_branch_context(branch)
+        subject_keywords = self._get_subject_keywords(subject)
         
         prompt = f"""
 Generate {num_questions} high-quality {question_type.upper()} questions for {branch_context}.
@@ -145,7 +926,7 @@ ACADEMIC CONTEXT:
 - Subject Focus: {subject_keywords}
 
 CONTENT TO ANALYZE:
-{content[:2000] if content.strip() else f"Generate questions based on {subject} topics including: {subject_keywords}"}
+{content[:CHUNK_MAX_CHARS] if content.strip() else f"Generate questions based on {subject} topics including: {subject_keywords}"}
 
 SPECIFIC REQUIREMENTS:
 1. Questions MUST be directly related to {subject} in {branch} engineering
@@ -196,19 +977,20 @@ Generate questions that a {branch} engineering student would encounter in their
     def _parse_ai_response(self, response: str, question_type: str) -> List[Dict[str, Any]]:
         """Parse AI response into structured question format"""
         try:
-            # Try to extract JSON from response
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                data = json.loads(json_str)
-                if "questions" in data:
-                    return data["questions"]
+            # Valid questions are recovered even from truncated or partly broken JSON
+            questions = parse_object_array(response, "questions")
+            if questions:
+                AI_RESPONSES_PARSED.labels("json").inc()
+                return questions
             
-            # If JSON parsing fails, try to parse manually
-            return self._manual_parse_response(response, question_type)
+            # No JSON at all: parse a numbered plain-text list
+            questions = self._manual_parse_response(response, question_type)
+            AI_RESPONSES_PARSED.labels("text" if questions else "failed").inc()
+            return questions
             
         except Exception as e:
             logger.error(f"Error parsing AI response: {str(e)}")
+            AI_RESPONSES_PARSED.labels("failed").inc()
             return []
     
     def _manual_parse_response(self, response: str, question_type: str) -> List[Dict[str, Any]]:
@@ -216,7 +998,7 @@ Generate questions that a {branch} engineering student would encounter in their
         questions: List[Dict[str, Any]] = []
         
         # Split response into question blocks
-        question_blocks = re.split(r'\n\s*\d+[\.\)]\s*', response)
+        question_blocks = QUESTION_BLOCK_PATTERN.split(response)
         
         for i, block in enumerate(question_blocks[1:], 1):  # Skip first empty block
             try:
@@ -254,12 +1036,12 @@ Generate questions that a {branch} engineering student would encounter in their
             correct_answer = 0
             
             for line in lines[1:]:
-                if re.match(r'^[A-D][\.\)]\s*', line):
-                    option_text = re.sub(r'^[A-D][\.\)]\s*', '', line)
-                    options.append(option_text)
+                option_match = OPTION_PATTERN.match(line)
+                if option_match:
+                    options.append(line[option_match.end():])
                 elif "correct" in line.lower() or "answer" in line.lower():
                     # Try to find correct answer indicator
-                    match = re.search(r'[A-D]', line)
+                    match = ANSWER_LETTER_PATTERN.search(line)
                     if match:
                         correct_answer = ord(match.group()) - ord('A')
             
@@ -271,37 +1053,38 @@ Generate questions that a {branch} engineering student would encounter in their
         
         return question_data
     
-    def _validate_questions(self, questions: List[Dict[str, Any]], target_count: int) -> List[Dict[str, Any]]:
-        """Validate and clean generated questions"""
-        validated: List[Dict[str, Any]] = []
-        
-        for question in questions:
-            if self._is_valid_question(question):
-                validated.append(question)
+    async def _validate_questions(
+        self,
+        questions: List[Dict[str, Any]],
+        target_count: int,
+        content: str,
+        difficulty: str,
+        question_type: str,
+        subject: str,
+        branch: str,
+        semester: int
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Validate, deduplicate and top up generated questions to target_count.
+        Returns the questions and how many of them came from the model.
+        """
+        valid = validate_questions(questions)
+        validated = (await self.deduplicator.dedupe(valid))[:target_count]
+        ai_count = len(validated)
+        
+        # Top up with content-based rule questions first, then with distinct generic ones
+        if len(validated) < target_count:
+            AI_FALLBACKS.labels("questions", "top_up").inc()
+            fallback = await self._generate_fallback_questions(
+                content, target_count - len(validated), difficulty, question_type, subject, branch, semester
+            )
+            validated.extend(await self.deduplicator.dedupe(fallback, keep=validated))
+            validated = validated[:target_count]
         
-        # If we don't have enough valid questions, generate fallback questions
         while len(validated) < target_count:
-            fallback_q = self._create_fallback_question(len(validated) + 1)
-            validated.append(fallback_q)
-        
-        return validated
-    
-    def _is_valid_question(self, question: Dict[str, Any]) -> bool:
-        """Check if a question is valid"""
-        required_fields = ["id", "question", "type"]
-        
-        for field in required_fields:
-            if field not in question or not question[field]:
-                return False
-        
-        # Additional validation for MCQ
-        if question.get("type") == "mcq":
-            if not question.get("options") or len(question["options"]) < 4:
-                return False
-            if "correct_answer" not in question:
-                return False
+            validated.append(self._create_fallback_question(len(validated) + 1))
         
-        return True
+        return validated, ai_count
     
     async def _generate_fallback_questions(
         self,
@@ -400,21 +1183,21 @@ Generate questions that a {branch} engineering student would encounter in their
                 # Use predefined questions if available
                 if subject_questions and i < len(subject_questions):
                     predefined = subject_questions[i]
-                    question: Dict[str, Any] = {
-                        "id": f"predefined_{branch}_{subject}_{i+1}",
-                        "question": predefined["q"],
-                        "type": "mcq",
-                        "difficulty": difficulty,
-                        "subject": subject,
-                        "branch": branch,
-                        "semester": semester,
-                        "options": predefined["options"],
-                        "correct_answer": predefined["correct"],
-                        "explanation": f"This is a fundamental concept in {subject} for {branch} engineering students.",
-                        "topic": subject,
-                        "bloom_level": "understand" if difficulty == "easy" else "apply" if difficulty == "medium" else "analyze",
-                        "estimated_time": 2
-                    }
+                    question = Question(
+                        id=f"predefined_{branch}_{subject}_{i+1}",
+                        question=predefined["q"],
+                        type="mcq",
+                        difficulty=difficulty,
+                        subject=subject,
+                        branch=branch,
+                        semester=semester,
+                        options=predefined["options"],
+                        correct_answer=predefined["correct"],
+                        explanation=f"This is a fundamental concept in {subject} for {branch} engineering students.",
+                        topic=subject,
+                        bloom_level="understand" if difficulty == "easy" else "apply" if difficulty == "medium" else "analyze",
+                        estimated_time=2
+                    ).to_dict()
                 else:
                     # Generate custom question based on type
                     if question_type == "mcq":
@@ -435,22 +1218,17 @@ Generate questions that a {branch} engineering student would encounter in their
     
     def _extract_key_terms(self, content: str) -> List[str]:
         """Extract key terms from content using simple NLP"""
-        # Remove common words and extract meaningful terms
-        words = re.findall(r'\b[A-Z][a-z]+\b|\b[a-z]{4,}\b', content)
-        
-        # Common technical terms in computer science
-        tech_terms = [
-            "algorithm", "data structure", "database", "programming", "software",
-            "network", "security", "machine learning", "artificial intelligence",
-            "operating system", "compiler", "object oriented", "recursion"
-        ]
+        # Dictionary terms (any branch, multi-word included) come first
+        key_terms: Dict[str, None] = dict.fromkeys(self.topic_matcher.find_terms(content))
         
-        key_terms: List[str] = []
-        for word in words:
-            if word.lower() in tech_terms or len(word) > 6:
-                key_terms.append(word)
+        # Then other long words as likely domain vocabulary
+        for word in re.findall(r'\b[A-Z][a-z]+\b|\b[a-z]{4,}\b', content):
+            if len(key_terms) >= 20:
+                break
+            if len(word) > 6:
+                key_terms.setdefault(word, None)
         
-        return list(set(key_terms))[:20]  # Limit to 20 terms
+        return list(key_terms)[:20]  # Limit to 20 terms
     
     def _extract_concepts(self, content: str, subject: str) -> List[str]:
         """Extract main concepts from content"""
@@ -526,20 +1304,20 @@ Generate questions that a {branch} engineering student would encounter in their
         # Generate plausible options
         options = self._generate_fallback_options(term, concept, subject, branch)
         
-        return {
-            "id": f"fallback_q_{index}",
-            "question": question_text,
-            "type": "mcq",
-            "difficulty": difficulty,
-            "subject": subject,
-            "branch": branch,
-            "options": options,
-            "correct_answer": 0,  # First option is correct
-            "explanation": f"This is the correct definition/application of {term} in {subject} for {branch} students.",
-            "topic": concept,
-            "bloom_level": "understand",
-            "estimated_time": 2
-        }
+        return Question(
+            id=f"fallback_q_{index}",
+            question=question_text,
+            type="mcq",
+            difficulty=difficulty,
+            subject=subject,
+            branch=branch,
+            options=options,
+            correct_answer=0,  # First option is correct
+            explanation=f"This is the correct definition/application of {term} in {subject} for {branch} students.",
+            topic=concept,
+            bloom_level="understand",
+            estimated_time=2
+        ).to_dict()
     
     def _generate_fallback_options(self, term: str, concept: str, subject: str, branch: str = "") -> List[str]:
         """Generate plausible MCQ options based on branch and subject"""
@@ -624,19 +1402,19 @@ Generate questions that a {branch} engineering student would encounter in their
         template = random.choice(templates)
         question_text = template.format(term=term, concept=concept, subject=subject)
         
-        return {
-            "id": f"fallback_sa_{index}",
-            "question": question_text,
-            "type": "short_answer",
-            "difficulty": difficulty,
-            "subject": subject,
-            "branch": branch,
-            "keywords": [term, concept, subject.lower()],
-            "expected_answer": f"A comprehensive explanation covering {concept} and its applications in {subject} for {branch} engineering.",
-            "topic": concept,
-            "bloom_level": "understand",
-            "estimated_time": 5
-        }
+        return Question(
+            id=f"fallback_sa_{index}",
+            question=question_text,
+            type="short_answer",
+            difficulty=difficulty,
+            subject=subject,
+            branch=branch,
+            keywords=[term, concept, subject.lower()],
+            expected_answer=f"A comprehensive explanation covering {concept} and its applications in {subject} for {branch} engineering.",
+            topic=concept,
+            bloom_level="understand",
+            estimated_time=5
+        ).to_dict()
     
     def _create_fallback_essay(
         self, index: int, key_terms: List[str], concepts: List[str],
@@ -680,23 +1458,23 @@ Generate questions that a {branch} engineering student would encounter in their
         template = random.choice(templates)
         question_text = template.format(term=term, concept=concept, subject=subject)
         
-        return {
-            "id": f"fallback_essay_{index}",
-            "question": question_text,
-            "type": "essay",
-            "difficulty": difficulty,
-            "subject": subject,
-            "branch": branch,
-            "grading_rubric": [
+        return Question(
+            id=f"fallback_essay_{index}",
+            question=question_text,
+            type="essay",
+            difficulty=difficulty,
+            subject=subject,
+            branch=branch,
+            grading_rubric=[
                 f"Clear understanding of {concept}",
                 f"Detailed examples from {subject}",
                 "Logical organization and flow",
                 "Critical analysis and evaluation"
             ],
-            "topic": concept,
-            "bloom_level": "analyze",
-            "estimated_time": 15
-        }
+            topic=concept,
+            bloom_level="analyze",
+            estimated_time=15
+        ).to_dict()
     
     def _create_basic_fallback_question(self, index: int, subject: str, branch: str = "") -> Dict[str, Any]:
         """Create a basic fallback question when all else fails"""
@@ -715,61 +1493,78 @@ Generate questions that a {branch} engineering student would encounter in their
             question_text = f"What is an important concept in {subject}?"
             options = ["Core principles and applications", "Unrelated concepts", "Outdated theories", "Irrelevant information"]
         
-        return {
-            "id": f"basic_fallback_{index}",
-            "question": question_text,
-            "type": "mcq",
-            "difficulty": "easy",
-            "subject": subject,
-            "branch": branch,
-            "options": options,
-            "correct_answer": 0,
-            "explanation": f"This covers fundamental concepts in {subject} for {branch} students.",
-            "topic": subject,
-            "bloom_level": "remember",
-            "estimated_time": 1
-        }
+        return Question(
+            id=f"basic_fallback_{index}",
+            question=question_text,
+            type="mcq",
+            difficulty="easy",
+            subject=subject,
+            branch=branch,
+            options=options,
+            correct_answer=0,
+            explanation=f"This covers fundamental concepts in {subject} for {branch} students.",
+            topic=subject,
+            bloom_level="remember",
+            estimated_time=1
+        ).to_dict()
     
     def _create_fallback_question(self, index: int) -> Dict[str, Any]:
         """Create a basic fallback question when all else fails"""
-        return {
-            "id": f"basic_fallback_{index}",
-            "question": f"Question {index}: What is a key concept from the provided content?",
-            "type": "mcq",
-            "difficulty": "medium",
-            "options": [
-                "A fundamental principle covered in the material",
-                "An unrelated concept from another field",
-                "A deprecated method no longer in use",
-                "A purely theoretical idea with no applications"
-            ],
-            "correct_answer": 0,
-            "explanation": "This represents a core concept from the study material.",
-            "topic": "General Knowledge",
-            "bloom_level": "remember",
-            "estimated_time": 2
-        }
+        question, options, bloom_level = GENERIC_QUESTION_TEMPLATES[(index - 1) % len(GENERIC_QUESTION_TEMPLATES)]
+        return Question(
+            id=f"basic_fallback_{index}",
+            question=f"Question {index}: {question}",
+            type="mcq",
+            difficulty="medium",
+            options=list(options),
+            correct_answer=0,
+            explanation="This represents a core concept from the study material.",
+            topic="General Knowledge",
+            bloom_level=bloom_level,
+            estimated_time=2
+        ).to_dict()
     
     async def generate_enhanced_feedback(
+        self,
+        performance_data: Dict[str, Any],
+        test_results: List[Dict[str, Any]],
+        learning_goals: List[str],
+        weak_areas: List[str],
+        budget: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Generate AI-enhanced feedback, or rule-based feedback once budget (seconds) runs out"""
+        AI_REQUESTS.labels("feedback").inc()
+        deadline = Deadline(budget) if budget is not None else None
+        key = make_flight_key("feedback", performance_data, test_results, learning_goals, weak_areas)
+        finished, feedback = await finish_within(self.inflight.run(key, lambda: self._generate_feedback_uncoalesced(
+            performance_data, test_results, learning_goals, weak_areas
+        )), deadline)
+        if finished:
+            return feedback
+        logger.info(f"Feedback generation exceeded its {budget}s budget; serving rule-based feedback")
+        AI_FALLBACKS.labels("feedback", "deadline").inc()
+        return self._generate_rule_based_feedback(performance_data, test_results, learning_goals, weak_areas)
+    
+    async def _generate_feedback_uncoalesced(
         self,
         performance_data: Dict[str, Any],
         test_results: List[Dict[str, Any]],
         learning_goals: List[str],
         weak_areas: List[str]
     ) -> Dict[str, Any]:
-        """Generate AI-enhanced feedback for student performance"""
-        
         try:
             if self.has_ai:
                 return await self._generate_ai_feedback(
                     performance_data, test_results, learning_goals, weak_areas
                 )
             else:
+                AI_FALLBACKS.labels("feedback", "no_ai").inc()
                 return self._generate_rule_based_feedback(
                     performance_data, test_results, learning_goals, weak_areas
                 )
         except Exception as e:
             logger.error(f"Error generating enhanced feedback: {str(e)}")
+            AI_FALLBACKS.labels("feedback", "error").inc()
             return self._generate_rule_based_feedback(
                 performance_data, test_results, learning_goals, weak_areas
             )
@@ -822,7 +1617,7 @@ Provide detailed feedback in JSON format:
         
         try:
             if self.gemini_model:
-                response = await self._generate_with_gemini(prompt)
+                response = await self._generate_with_gemini(prompt, "feedback")
             else:
                 raise Exception("No AI service available")
             
@@ -832,18 +1627,18 @@ Provide detailed feedback in JSON format:
             
         except Exception as e:
             logger.error(f"AI feedback generation failed: {str(e)}")
+            AI_FALLBACKS.labels("feedback", "ai_failed").inc()
             return self._generate_rule_based_feedback(
                 performance_data, test_results, learning_goals, weak_areas
             )
     
     def _parse_feedback_response(self, response: str) -> Dict[str, Any]:
         """Parse AI feedback response"""
-        try:
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-        except Exception as e:
-            logger.warning(f"Failed to parse feedback response: {str(e)}")
+        feedback = find_json_object(response)
+        if feedback is not None:
+            return feedback
+        logger.warning("No JSON object found in feedback response")
+        AI_FALLBACKS.labels("feedback", "parse_failed").inc()
         
         # Fallback to rule-based feedback if parsing fails
         return {
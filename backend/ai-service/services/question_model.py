@@ -0,0 +1,184 @@
+import json
+import marshal
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+QUESTION_TYPES = ("mcq", "short_answer", "essay")
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# Known fields in the order they appear in API responses; any other key is kept in extra
+FIELDS = (
+    "id", "question", "type", "difficulty", "subject", "branch", "semester", "options", "correct_answer",
+    "explanation", "keywords", "expected_answer", "grading_rubric", "topic", "bloom_level", "estimated_time"
+)
+_KNOWN = frozenset(FIELDS)
+_LIST_FIELDS = ("options", "keywords", "grading_rubric")
+
+# First byte of the binary form, bumped whenever FIELDS changes
+_BINARY_VERSION = b"\x01"
+
+
+def _intern(value: Any, lower: bool = False) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return sys.intern(text.lower() if lower else text)
+
+
+def _strings(value: Any) -> Optional[Tuple[str, ...]]:
+    if isinstance(value, (list, tuple)):
+        return tuple(str(item) for item in value)
+    return None
+
+
+class Question:
+    """
+    One generated question. Slots instead of a per-question dict, interned strings for
+    the type, difficulty, bloom level, subject, branch and topic, and tuples for option
+    lists keep cached sets small. Build one from untrusted data with Question.parse,
+    the single place where questions are validated.
+    """
+    
+    __slots__ = FIELDS + ("extra",)
+    
+    def __init__(
+        self,
+        id: str,
+        question: str,
+        type: str,
+        difficulty: Optional[str] = None,
+        subject: Optional[str] = None,
+        branch: Optional[str] = None,
+        semester: Optional[int] = None,
+        options: Optional[Sequence[str]] = None,
+        correct_answer: Any = None,
+        explanation: Optional[str] = None,
+        keywords: Optional[Sequence[str]] = None,
+        expected_answer: Optional[str] = None,
+        grading_rubric: Optional[Sequence[str]] = None,
+        topic: Optional[str] = None,
+        bloom_level: Optional[str] = None,
+        estimated_time: Any = None,
+        extra: Optional[Dict[str, Any]] = None
+    ):
+        self.id = str(id)
+        self.question = question
+        self.type = _intern(type, lower=True)
+        self.difficulty = _intern(difficulty, lower=True)
+        self.subject = _intern(subject)
+        self.branch = _intern(branch)
+        self.semester = semester
+        self.options = _strings(options)
+        self.correct_answer = correct_answer
+        self.explanation = explanation
+        self.keywords = _strings(keywords)
+        self.expected_answer = expected_answer
+        self.grading_rubric = _strings(grading_rubric)
+        self.topic = _intern(topic)
+        self.bloom_level = _intern(bloom_level, lower=True)
+        self.estimated_time = estimated_time
+        self.extra = extra or None
+    
+    @classmethod
+    def parse(cls, data: Any) -> Optional["Question"]:
+        """
+        Validate a question dict (typically model output): it needs an id, text and type,
+        and an MCQ needs at least four options and a correct answer. None if invalid.
+        """
+        if not isinstance(data, dict):
+            return None
+        if not data.get("id") or not data.get("question") or not data.get("type"):
+            return None
+        if str(data["type"]).strip().lower() == "mcq":
+            options = data.get("options")
+            if not isinstance(options, (list, tuple)) or len(options) < 4 or "correct_answer" not in data:
+                return None
+        
+        extra = {key: value for key, value in data.items() if key not in _KNOWN}
+        return cls(**{key: data[key] for key in FIELDS if key in data}, extra=extra)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """The API shape of the question; fields that are not set are left out"""
+        data: Dict[str, Any] = {}
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = list(value) if name in _LIST_FIELDS else value
+        if self.extra:
+            data.update(self.extra)
+        return data
+    
+    def to_json(self) -> str:
+        if orjson is not None:
+            return orjson.dumps(self.to_dict()).decode("utf-8")
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+    
+    @classmethod
+    def from_json(cls, payload: Any) -> Optional["Question"]:
+        return cls.parse(_loads(payload))
+    
+    def to_tuple(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in Question.__slots__)
+    
+    @classmethod
+    def from_tuple(cls, values: Sequence[Any]) -> "Question":
+        """Rebuild from to_tuple output (trusted; not validated again)"""
+        question = cls.__new__(cls)
+        for name, value in zip(Question.__slots__, values):
+            setattr(question, name, value)
+        return question
+    
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Question) and self.to_tuple() == other.to_tuple()
+    
+    def __repr__(self) -> str:
+        return f"Question(id={self.id!r}, type={self.type!r}, question={self.question[:40]!r})"
+
+
+def _loads(payload: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def parse_questions(items: Iterable[Any]) -> List[Question]:
+    """Valid questions from a list of dicts, invalid ones dropped"""
+    return [question for question in map(Question.parse, items) if question is not None]
+
+
+def validate_questions(items: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Valid questions from a list of dicts, in normalized API shape"""
+    return [question.to_dict() for question in parse_questions(items)]
+
+
+def encode_questions(questions: Sequence[Question]) -> bytes:
+    """JSON array of the questions' API shape (portable: Redis, SQLite, other services)"""
+    items = [question.to_dict() for question in questions]
+    if orjson is not None:
+        return orjson.dumps(items)
+    return json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_questions(payload: Any) -> List[Question]:
+    items = _loads(payload)
+    return parse_questions(items) if isinstance(items, list) else []
+
+
+def pack_questions(questions: Sequence[Question]) -> bytes:
+    """
+    Compact binary form for in-process caches: field values only, no key names. marshal
+    keeps interned strings interned on load. Not portable across Python versions, so
+    anything stored outside the process uses encode_questions.
+    """
+    return _BINARY_VERSION + marshal.dumps(tuple(question.to_tuple() for question in questions))
+
+
+def unpack_questions(data: bytes) -> List[Question]:
+    if data[:1] != _BINARY_VERSION:
+        raise ValueError("Unknown packed question format")
+    return [Question.from_tuple(values) for values in marshal.loads(data[1:])]
@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def make_flight_key(*parts: Any) -> str:
+    """Stable key for arbitrary JSON-like inputs (dict order does not matter)"""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one in-flight task, so a burst
+    of identical requests costs one upstream call. Every caller receives the same
+    result object, which must be treated as read-only. A caller that is cancelled
+    does not cancel the shared task for the others.
+    """
+    
+    def __init__(self) -> None:
+        self._calls: Dict[str, "asyncio.Future[Any]"] = {}
+        self.started = 0
+        self.coalesced = 0
+    
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+    
+    def _finish(self, key: str, task: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the error as retrieved when every caller has gone away
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Shared call {key[:12]} failed: {str(task.exception())}")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
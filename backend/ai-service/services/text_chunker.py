@@ -0,0 +1,97 @@
+import re
+from typing import List
+
+from services.pdf_processor import HEADING_PATTERN
+
+# Sentence boundary used when a single paragraph is larger than a chunk
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_content(content: str, max_chars: int = 4000) -> List[str]:
+    """
+    Split long content into chunks of at most max_chars, preferring structural
+    boundaries: headings first, then blank lines, then sentences.
+    """
+    content = content.strip()
+    if len(content) <= max_chars:
+        return [content] if content else []
+    
+    # Group paragraphs into sections that start at a heading line
+    sections: List[List[str]] = [[]]
+    for paragraph in re.split(r"\n\s*\n", content):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        first_line = paragraph.split("\n", 1)[0].strip()
+        if HEADING_PATTERN.match(first_line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(paragraph)
+    
+    chunks: List[str] = []
+    current = ""
+    for section in sections:
+        section_text = "\n\n".join(section)
+        if len(section_text) > max_chars:
+            # Oversized section: flush and pack its paragraphs/sentences on their own
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_pack(_split_units(section, max_chars), max_chars))
+        elif current and len(current) + len(section_text) + 2 > max_chars:
+            chunks.append(current)
+            current = section_text
+        else:
+            current = f"{current}\n\n{section_text}" if current else section_text
+    if current:
+        chunks.append(current)
+    
+    return chunks
+
+
+def allocate_questions(chunk_sizes: List[int], total: int) -> List[int]:
+    """Spread total questions across chunks in proportion to their size (largest remainder)"""
+    size_sum = sum(chunk_sizes)
+    if not chunk_sizes or size_sum == 0:
+        return [0] * len(chunk_sizes)
+    
+    exact = [total * size / size_sum for size in chunk_sizes]
+    allocation = [int(share) for share in exact]
+    remaining = total - sum(allocation)
+    by_remainder = sorted(range(len(exact)), key=lambda i: exact[i] - allocation[i], reverse=True)
+    for i in by_remainder[:remaining]:
+        allocation[i] += 1
+    return allocation
+
+
+def select_evenly(chunks: List[str], limit: int) -> List[str]:
+    """Pick at most limit chunks spread evenly across the document"""
+    if len(chunks) <= limit:
+        return chunks
+    step = len(chunks) / limit
+    return [chunks[int(i * step)] for i in range(limit)]
+
+
+def _split_units(paragraphs: List[str], max_chars: int) -> List[str]:
+    units: List[str] = []
+    for paragraph in paragraphs:
+        if len(paragraph) <= max_chars:
+            units.append(paragraph)
+            continue
+        for sentence in SENTENCE_BOUNDARY.split(paragraph):
+            # Hard split as a last resort for text without sentence punctuation
+            units.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+    return units
+
+
+def _pack(units: List[str], max_chars: int) -> List[str]:
+    chunks: List[str] = []
+    current = ""
+    for unit in units:
+        if current and len(current) + len(unit) + 1 > max_chars:
+            chunks.append(current)
+            current = unit
+        else:
+            current = f"{current}\n{unit}" if current else unit
+    if current:
+        chunks.append(current)
+    return chunks
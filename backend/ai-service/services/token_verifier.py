@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.single_flight import SingleFlight
+
+try:
+    import httpx  # type: ignore
+except ImportError:
+    httpx = None
+
+try:
+    from jose import JWTError, jwt  # type: ignore
+except ImportError:
+    jwt = None
+    JWTError = Exception
+
+logger = logging.getLogger(__name__)
+
+# Google's x509 certificates for Firebase ID tokens, keyed by "kid"
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+KeyFetcher = Callable[[], Awaitable[Tuple[Dict[str, str], Optional[float]]]]
+
+
+class InvalidTokenError(Exception):
+    """Raised for a token that is malformed, expired, or not signed for this project"""
+
+
+def parse_max_age(cache_control: str) -> Optional[float]:
+    match = _MAX_AGE.search(cache_control or "")
+    return float(match.group(1)) if match else None
+
+
+async def fetch_google_certs(url: str = GOOGLE_CERTS_URL) -> Tuple[Dict[str, str], Optional[float]]:
+    """Download the signing certificates and how long they may be cached (Cache-Control max-age)"""
+    if httpx is None:
+        raise RuntimeError("httpx is required to fetch signing keys")
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.json(), parse_max_age(response.headers.get("cache-control", ""))
+
+
+class SigningKeyCache:
+    """
+    Public signing keys cached for as long as their Cache-Control header allows.
+    Within refresh_margin of expiry the keys are refreshed in the background while
+    the current ones keep being served. An unknown key id forces a refresh (keys
+    can rotate early). Refreshes are attempted at most once per min_refresh_interval,
+    concurrent ones share one fetch, and a failed fetch keeps serving the previous keys.
+    """
+    
+    def __init__(
+        self,
+        fetch: KeyFetcher = fetch_google_certs,
+        refresh_margin: float = 300.0,
+        min_refresh_interval: float = 30.0,
+        default_max_age: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.default_max_age = default_max_age
+        self.clock = clock
+        self.refreshes = 0
+        self.failures = 0
+        self._keys: Dict[str, str] = {}
+        self._attempted_at = float("-inf")
+        self._expires_at = float("-inf")
+        self._inflight = SingleFlight()
+        self._background: Optional["asyncio.Task[None]"] = None
+    
+    async def get(self, kid: str) -> Optional[str]:
+        now = self.clock()
+        may_refresh = now - self._attempted_at >= self.min_refresh_interval
+        if now >= self._expires_at and (may_refresh or not self._keys):
+            await self._refresh(raise_errors=not self._keys)
+        elif now >= self._expires_at - self.refresh_margin and may_refresh:
+            self._refresh_in_background()
+        
+        key = self._keys.get(kid)
+        if key is None and self.clock() - self._attempted_at >= self.min_refresh_interval:
+            await self._refresh(raise_errors=False)
+            key = self._keys.get(kid)
+        return key
+    
+    async def preload(self) -> None:
+        """Fetch the keys ahead of the first request"""
+        await self._refresh(raise_errors=False)
+    
+    async def _refresh(self, raise_errors: bool) -> None:
+        self._attempted_at = self.clock()
+        try:
+            await self._inflight.run("keys", self._fetch_keys)
+        except Exception as e:
+            self.failures += 1
+            if raise_errors:
+                raise
+            logger.error(f"Signing key refresh failed, keeping {len(self._keys)} cached keys: {str(e)}")
+    
+    def _refresh_in_background(self) -> None:
+        if self._background is None or self._background.done():
+            self._background = asyncio.create_task(self._refresh(raise_errors=False))
+    
+    async def _fetch_keys(self) -> None:
+        keys, max_age = await self.fetch()
+        self._keys = dict(keys)
+        self._expires_at = self.clock() + (max_age if max_age is not None else self.default_max_age)
+        self.refreshes += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._keys),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "expires_in_seconds": round(self._expires_at - self.clock(), 1) if self._keys else None
+        }
+
+
+class TokenVerifier:
+    """
+    Verifies Firebase ID tokens (RS256, audience and issuer of the project) against
+    cached signing keys. Verified tokens are remembered in a bounded LRU keyed by
+    the token's SHA-256 until their exp, so a client reusing its token skips the
+    signature check. Like firebase-admin without check_revoked, a revoked token stays
+    accepted until it expires.
+    """
+    
+    def __init__(
+        self,
+        project_id: str,
+        keys: Optional[SigningKeyCache] = None,
+        cache_size: int = 10000,
+        leeway: int = 0,
+        clock: Callable[[], float] = time.time
+    ):
+        if jwt is None:
+            raise RuntimeError("python-jose is required for token verification")
+        if not project_id:
+            raise ValueError("A Firebase project id is required for token verification")
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.keys = keys or SigningKeyCache()
+        self.cache_size = max(1, cache_size)
+        self.leeway = leeway
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self._verified: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+    
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Claims of a valid token; raises InvalidTokenError otherwise"""
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        cached = self._verified.get(digest)
+        if cached is not None:
+            claims, expires_at = cached
+            if self.clock() < expires_at:
+                self._verified.move_to_end(digest)
+                self.hits += 1
+                return claims
+            del self._verified[digest]
+        
+        self.misses += 1
+        try:
+            claims = await self._verify_signature(token)
+        except InvalidTokenError:
+            self.rejected += 1
+            raise
+        
+        self._verified[digest] = (claims, float(claims["exp"]) + self.leeway)
+        if len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
+        return claims
+    
+    async def _verify_signature(self, token: str) -> Dict[str, Any]:
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError:
+            raise InvalidTokenError("Malformed token")
+        if header.get("alg") != "RS256" or not header.get("kid"):
+            raise InvalidTokenError("Token must be RS256-signed with a key id")
+        
+        key = await self.keys.get(header["kid"])
+        if key is None:
+            raise InvalidTokenError("Token was signed with an unknown key")
+        
+        try:
+            claims = jwt.decode(
+                token, key, algorithms=["RS256"], audience=self.project_id, issuer=self.issuer,
+                options={"leeway": self.leeway, "verify_at_hash": False}
+            )
+        except JWTError as e:
+            raise InvalidTokenError(str(e))
+        
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise InvalidTokenError("Token has an invalid subject")
+        if "exp" not in claims or claims.get("auth_time", 0) > self.clock() + self.leeway:
+            raise InvalidTokenError("Token has invalid timestamps")
+        return claims
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cached_tokens": len(self._verified),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "rejected": self.rejected,
+            "signing_keys": self.keys.stats()
+        }
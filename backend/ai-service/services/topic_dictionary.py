@@ -0,0 +1,289 @@
+import string
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+# Branch -> subject -> topic terms. The first terms of each subject double as the
+# "Subject Focus" line in question prompts, so keep the most central ones first.
+BRANCH_TOPICS: Dict[str, Dict[str, List[str]]] = {
+    "CSE": {
+        "Data Structures": ["arrays", "linked lists", "stacks", "queues", "trees", "graphs", "hash tables", "searching and sorting algorithms", "binary search tree", "heap", "AVL tree", "B-tree", "trie", "priority queue", "adjacency list"],
+        "Algorithms": ["time complexity", "space complexity", "sorting algorithms", "graph algorithms", "dynamic programming", "greedy algorithms", "divide and conquer", "backtracking", "merge sort", "quick sort", "Dijkstra's algorithm", "minimum spanning tree", "big O notation", "recursion"],
+        "Database Systems": ["SQL queries", "normalization", "relational algebra", "ACID properties", "indexing", "database design", "ER diagram", "transactions", "concurrency control", "primary key", "foreign key", "NoSQL", "query optimization"],
+        "Operating Systems": ["process management", "memory management", "file systems", "scheduling algorithms", "deadlocks", "virtual memory", "paging", "segmentation", "semaphores", "threads", "context switching", "system calls"]
+    },
+    "IT": {
+        "Software Engineering": ["software development life cycle", "agile", "scrum", "requirements engineering", "UML", "design patterns", "software testing", "unit testing", "version control", "code review", "object oriented design"],
+        "Web Technologies": ["HTML", "CSS", "JavaScript", "HTTP", "REST API", "DOM", "React", "Node.js", "web server", "cookies", "sessions", "responsive design"],
+        "Network Security": ["cryptography", "encryption", "public key infrastructure", "firewalls", "intrusion detection", "SSL/TLS", "authentication", "digital signatures", "malware", "SQL injection", "cross-site scripting"],
+        "Mobile Computing": ["Android", "iOS", "mobile app development", "GSM", "cellular networks", "mobile IP", "Bluetooth", "location based services", "push notifications"]
+    },
+    "ECE": {
+        "Digital Electronics": ["logic gates", "Boolean algebra", "combinational circuits", "sequential circuits", "flip-flops", "counters", "multiplexers", "Karnaugh map", "registers", "shift registers", "decoders", "finite state machines"],
+        "Signal Processing": ["Fourier transforms", "filtering", "sampling", "digital signal processing", "analog-to-digital conversion", "Z-transform", "convolution", "FIR filters", "IIR filters", "Nyquist rate", "aliasing", "DFT"],
+        "Communication Systems": ["amplitude modulation", "frequency modulation", "phase modulation", "modulation", "demodulation", "bandwidth", "noise", "signal-to-noise ratio", "multiplexing", "pulse code modulation", "channel capacity", "antennas"],
+        "Microprocessors": ["8085", "8086", "instruction set", "addressing modes", "assembly language", "interrupts", "memory interfacing", "microcontrollers", "registers", "bus architecture", "DMA"]
+    },
+    "EEE": {
+        "Circuit Analysis": ["Ohm's law", "Kirchhoff's laws", "AC/DC circuits", "network theorems", "circuit analysis techniques", "Thevenin's theorem", "Norton's theorem", "superposition theorem", "mesh analysis", "nodal analysis", "RLC circuits", "resonance"],
+        "Power Systems": ["power generation", "transmission lines", "distribution systems", "load flow analysis", "fault analysis", "power factor", "circuit breakers", "protection relays", "grid stability", "substations"],
+        "Control Systems": ["transfer function", "block diagram", "feedback control", "stability", "Routh-Hurwitz criterion", "root locus", "Bode plot", "Nyquist plot", "PID controller", "state space analysis", "steady state error"],
+        "Electrical Machines": ["DC machines", "transformers", "induction motors", "synchronous machines", "alternators", "armature reaction", "slip", "torque-speed characteristics", "efficiency", "equivalent circuit"]
+    },
+    "MECH": {
+        "Thermodynamics": ["heat transfer", "energy conversion", "entropy", "enthalpy", "thermodynamic cycles", "laws of thermodynamics", "Carnot cycle", "Rankine cycle", "Otto cycle", "isothermal process", "adiabatic process", "specific heat"],
+        "Fluid Mechanics": ["fluid properties", "flow measurement", "Bernoulli's equation", "flow through pipes", "fluid statics", "viscosity", "Reynolds number", "laminar flow", "turbulent flow", "boundary layer", "continuity equation", "pressure head"],
+        "Manufacturing Processes": ["casting", "welding", "machining", "forging", "rolling", "CNC machining", "lathe", "milling", "drilling", "metal forming", "additive manufacturing", "tolerances"],
+        "Machine Design": ["factor of safety", "stress concentration", "fatigue", "shafts", "gears", "bearings", "springs", "keys and couplings", "theories of failure", "bolted joints", "welded joints"]
+    },
+    "CIVIL": {
+        "Structural Analysis": ["stress analysis", "beam design", "load calculations", "structural mechanics", "material properties", "bending moment", "shear force", "deflection", "trusses", "moment distribution method", "influence lines", "indeterminate structures"],
+        "Construction Management": ["project planning", "critical path method", "PERT", "cost estimation", "scheduling", "quality control", "bill of quantities", "tendering", "resource allocation", "site management"],
+        "Surveying": ["chain surveying", "compass surveying", "levelling", "theodolite", "total station", "contours", "triangulation", "traversing", "GPS surveying", "remote sensing"],
+        "Environmental Engineering": ["water treatment", "wastewater treatment", "air pollution", "solid waste management", "BOD", "COD", "sedimentation", "filtration", "environmental impact assessment", "noise pollution"]
+    },
+    "AUTOMOBILE": {
+        "Vehicle Dynamics": ["suspension", "steering", "tyre mechanics", "vehicle stability", "rolling resistance", "aerodynamic drag", "braking dynamics", "ride comfort", "cornering", "weight transfer"],
+        "Engine Technology": ["internal combustion engine", "spark ignition engine", "compression ignition engine", "fuel injection", "turbocharging", "combustion chamber", "valve timing", "emissions", "engine cooling", "lubrication"],
+        "Automotive Electronics": ["engine control unit", "CAN bus", "sensors", "actuators", "anti-lock braking system", "electronic stability control", "ignition system", "battery management system", "infotainment"],
+        "Vehicle Design": ["chassis", "body design", "crashworthiness", "ergonomics", "powertrain", "transmission", "differential", "clutch", "gearbox", "drivetrain layout"]
+    },
+    "AEROSPACE": {
+        "Aerodynamics": ["lift", "drag", "airfoil", "angle of attack", "boundary layer", "compressible flow", "shock waves", "Mach number", "wind tunnel", "pressure distribution"],
+        "Flight Mechanics": ["aircraft performance", "stability and control", "range and endurance", "takeoff and landing", "climb performance", "trim", "longitudinal stability", "lateral stability"],
+        "Propulsion Systems": ["jet engines", "turbofan", "turbojet", "ramjet", "rocket propulsion", "specific impulse", "thrust", "nozzles", "combustors", "compressors"],
+        "Aircraft Structures": ["monocoque", "semi-monocoque", "stress analysis", "buckling", "fatigue", "composite materials", "wing box", "fuselage", "shear flow", "thin-walled structures"]
+    },
+    "CHEMICAL": {
+        "Process Engineering": ["material balance", "energy balance", "unit operations", "process flow diagram", "distillation", "heat exchangers", "evaporation", "drying", "process design", "scale-up"],
+        "Reaction Engineering": ["reaction kinetics", "rate law", "batch reactor", "CSTR", "plug flow reactor", "residence time distribution", "catalysis", "activation energy", "conversion", "selectivity"],
+        "Process Control": ["feedback control", "feedforward control", "PID controller", "transfer function", "control valves", "process dynamics", "stability", "cascade control", "instrumentation"],
+        "Mass Transfer": ["diffusion", "Fick's law", "absorption", "extraction", "adsorption", "distillation", "humidification", "mass transfer coefficient", "membrane separation", "crystallization"]
+    },
+    "BIOTECH": {
+        "Biochemistry": ["proteins", "enzymes", "carbohydrates", "lipids", "nucleic acids", "metabolism", "glycolysis", "Krebs cycle", "enzyme kinetics", "amino acids"],
+        "Cell Biology": ["cell structure", "cell membrane", "organelles", "mitochondria", "cell cycle", "mitosis", "meiosis", "cell signaling", "cytoskeleton", "apoptosis"],
+        "Bioprocess Engineering": ["fermentation", "bioreactors", "sterilization", "downstream processing", "upstream processing", "microbial growth kinetics", "scale-up", "aeration and agitation", "product recovery"],
+        "Molecular Biology": ["DNA replication", "transcription", "translation", "gene expression", "PCR", "recombinant DNA", "gene cloning", "CRISPR", "plasmids", "sequencing"]
+    }
+}
+
+# General computing vocabulary reported by content analysis for any branch
+GENERAL_TOPICS: List[str] = [
+    "algorithm", "data structure", "programming", "code", "software", "computer",
+    "network", "database", "machine learning", "ML", "AI", "artificial intelligence",
+    "web", "mobile", "security", "operating system", "compiler", "object oriented",
+    "recursion", "Python", "Java", "JavaScript", "React", "Node", "MongoDB", "MySQL"
+]
+
+# Canned tutor answers keyed by dictionary term, in priority order
+TUTOR_RESPONSES: Dict[str, Dict[str, Any]] = {
+    "algorithm": {
+        "message": "Algorithms are step-by-step procedures for solving problems. They're fundamental in computer science and help us solve complex problems efficiently.",
+        "sources": ["Data Structures and Algorithms Textbook", "Algorithm Design Manual"],
+        "confidence": 0.9
+    },
+    "data structure": {
+        "message": "Data structures organize and store data efficiently. Common ones include arrays, linked lists, trees, hash tables, and graphs. Each has specific use cases and performance characteristics.",
+        "sources": ["Introduction to Data Structures", "CS Fundamentals Course"],
+        "confidence": 0.9
+    },
+    "programming": {
+        "message": "Programming involves writing instructions for computers to execute. It requires logical thinking, problem-solving skills, and understanding of syntax and algorithms.",
+        "sources": ["Programming Fundamentals", "Software Development Best Practices"],
+        "confidence": 0.85
+    },
+    "database": {
+        "message": "Databases store and manage data systematically. SQL databases use structured tables, while NoSQL databases offer flexible schemas for different data types.",
+        "sources": ["Database Systems Concepts", "SQL and NoSQL Guide"],
+        "confidence": 0.88
+    },
+    "machine learning": {
+        "message": "Machine Learning enables computers to learn patterns from data without explicit programming. It includes supervised, unsupervised, and reinforcement learning approaches.",
+        "sources": ["Introduction to Machine Learning", "AI and ML Fundamentals"],
+        "confidence": 0.87
+    }
+}
+# Other dictionary terms that should get one of the answers above
+TUTOR_ALIASES: Dict[str, str] = {"code": "programming", "ml": "machine learning"}
+
+BRANCH_SUBJECTS: Dict[str, List[str]] = {
+    branch: list(subjects) for branch, subjects in BRANCH_TOPICS.items()
+}
+
+# Punctuation becomes whitespace ("node.js" -> "node js"); "+" and "#" stay for "c++" and "c#".
+# Terms and text go through the same tokenizer, so multi-token terms still match as sequences.
+_SEPARATORS = str.maketrans({char: " " for char in string.punctuation if char not in "+#"})
+
+
+def tokenize(text: str) -> List[str]:
+    """Split already-lowercased text into matcher tokens"""
+    return text.translate(_SEPARATORS).split()
+
+
+class TopicEntry(NamedTuple):
+    term: str
+    branch: str
+    subject: str
+
+
+class AhoCorasick:
+    """
+    Word-level Aho-Corasick automaton. Patterns are token sequences; scanning a
+    token list finds every occurrence of every pattern in one pass, so the cost
+    per request does not grow with the number of patterns.
+    """
+    
+    def __init__(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[Any, ...]] = [()]
+        self._built = False
+    
+    def add(self, tokens: Iterable[str], value: Any) -> None:
+        if self._built:
+            raise RuntimeError("Cannot add patterns after the automaton is built")
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][token] = next_state
+            state = next_state
+        if value not in self._output[state]:
+            self._output[state] = self._output[state] + (value,)
+    
+    def build(self) -> None:
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        self._built = True
+    
+    def iter_matches(self, tokens: Iterable[str]) -> Iterator[Tuple[int, Any]]:
+        """Yield (token index where the match ends, value) for every match"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        root = goto[0]
+        state = 0
+        for index, token in enumerate(tokens):
+            if state == 0:
+                # Fast path: most tokens do not start any pattern
+                state = root.get(token, 0)
+            else:
+                while state and token not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(token, 0)
+            if state and output[state]:
+                for value in output[state]:
+                    yield index, value
+    
+    def count(self, tokens: Iterable[str]) -> Dict[Any, int]:
+        """Count matches per value; same scan as iter_matches without the generator overhead"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        root = goto[0]
+        counts: Dict[Any, int] = {}
+        state = 0
+        for token in tokens:
+            if state == 0:
+                state = root.get(token, 0)
+                if not state:
+                    continue
+            else:
+                while state and token not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(token, 0)
+            for value in output[state]:
+                counts[value] = counts.get(value, 0) + 1
+        return counts
+    
+    def __len__(self) -> int:
+        return len(self._goto)
+
+
+class TopicMatcher:
+    """Multi-keyword lookup over the branch topic dictionary, backed by one automaton"""
+    
+    def __init__(self, branch_topics: Dict[str, Dict[str, List[str]]], general_topics: Iterable[str]):
+        self._automaton = AhoCorasick()
+        self._display: Dict[str, str] = {}
+        self._entries: Dict[str, List[TopicEntry]] = {}
+        self._subject_terms: Dict[str, List[str]] = {}
+        
+        for branch, subjects in branch_topics.items():
+            for subject, terms in subjects.items():
+                self._subject_terms.setdefault(subject, []).extend(terms)
+                for term in terms:
+                    self._add(term, TopicEntry(term, branch, subject))
+        for term in general_topics:
+            self._add(term, TopicEntry(term, "", ""))
+        self._automaton.build()
+    
+    def _add(self, term: str, entry: TopicEntry) -> None:
+        key = term.lower()
+        tokens = tokenize(key)
+        if not tokens:
+            return
+        # Lowercase words are shown capitalized; acronyms and names keep their spelling
+        display = " ".join(word.capitalize() if word.islower() else word for word in term.split())
+        self._display.setdefault(key, display)
+        self._entries.setdefault(key, []).append(entry)
+        self._automaton.add(tokens, key)
+        # Also match the simple plural/singular of the last word ("tree"/"trees")
+        last = tokens[-1]
+        if last.endswith("s") and len(last) > 3:
+            variant = last[:-1]
+        elif last.isalpha():
+            variant = last + "s"
+        else:
+            return
+        self._automaton.add(tokens[:-1] + [variant], key)
+    
+    @property
+    def size(self) -> int:
+        return len(self._display)
+    
+    def count_terms(self, tokens: Iterable[str]) -> Dict[str, int]:
+        """Count occurrences of every dictionary term in a token sequence"""
+        return self._automaton.count(tokens)
+    
+    def match(self, text: str) -> Dict[str, int]:
+        """Occurrences of each dictionary term (lowercase key) in raw text"""
+        return self._automaton.count(tokenize(text.lower()))
+    
+    def find_terms(self, text: str) -> List[str]:
+        """Dictionary terms found in text, as display names, in order of first occurrence"""
+        found: Dict[str, None] = {}
+        for _, key in self._automaton.iter_matches(tokenize(text.lower())):
+            found.setdefault(self._display[key], None)
+        return list(found)
+    
+    def display_name(self, key: str) -> str:
+        return self._display.get(key, key)
+    
+    def entries(self, key: str) -> List[TopicEntry]:
+        """Which branches/subjects a matched term belongs to"""
+        return self._entries.get(key.lower(), [])
+    
+    def subject_terms(self, subject: str) -> List[str]:
+        return self._subject_terms.get(subject, [])
+
+
+@lru_cache(maxsize=None)
+def get_topic_matcher() -> TopicMatcher:
+    """The shared matcher, compiled once per process"""
+    return TopicMatcher(BRANCH_TOPICS, GENERAL_TOPICS)
@@ -0,0 +1,51 @@
+from typing import Any, Callable, Dict, Iterable
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+
+class UploadLimitMiddleware:
+    """
+    Pure ASGI middleware capping the request body of upload routes before the multipart
+    parser spools it. A declared Content-Length over the limit is refused with 413 without
+    reading the body, a non-numeric one with 400; bodies sent without a length (or longer
+    than declared) are counted as they are received and cut off with 413.
+    """
+    
+    def __init__(self, app: Any, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = frozenset(paths)
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[..., Any], send: Callable[..., Any]) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope["headers"])
+        declared = headers.get(b"content-length")
+        if declared is not None:
+            try:
+                length = int(declared)
+            except ValueError:
+                length = -1
+            if length < 0:
+                await JSONResponse({"detail": "Invalid Content-Length header"}, status_code=400)(scope, receive, send)
+                return
+            if length > self.max_bytes:
+                await JSONResponse({"detail": "PDF exceeds the maximum allowed size"}, status_code=413)(scope, receive, send)
+                return
+        
+        received = 0
+        
+        async def limited_receive() -> Dict[str, Any]:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Surfaces through the body parser as a normal 413 response
+                    raise HTTPException(status_code=413, detail="PDF exceeds the maximum allowed size")
+            return message
+        
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,61 @@
+import asyncio
+import ipaddress
+import socket
+from typing import Any, Dict, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+ALLOWED_SCHEMES = ("http", "https")
+
+
+class UnsafeURLError(ValueError):
+    """Raised for a client-supplied URL the service must not fetch"""
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_public_url(url: str) -> str:
+    """
+    Reject URLs that are not http(s) or whose host resolves to a loopback, private,
+    link-local or otherwise non-public address (cloud metadata endpoints included),
+    so client-supplied URLs cannot reach the service's internal network.
+    Returns a checked address to connect to (see pin_url). Call it again for every redirect target.
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeURLError("Malformed URL")
+    if parts.scheme.lower() not in ALLOWED_SCHEMES:
+        raise UnsafeURLError("Only http and https URLs are allowed")
+    if not parts.hostname:
+        raise UnsafeURLError("URL has no host")
+    
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, port, type=socket.SOCK_STREAM
+        )
+    except (socket.gaierror, UnicodeError):
+        raise UnsafeURLError(f"Could not resolve host {parts.hostname}")
+    if not addresses or not all(_is_public(address[4][0]) for address in addresses):
+        raise UnsafeURLError(f"Host {parts.hostname} is not a public address")
+    return addresses[0][4][0].split("%", 1)[0]
+
+
+def pin_url(url: str, address: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """
+    Point url at an address check_public_url already validated, so the HTTP client cannot
+    resolve the host a second time and land somewhere else (DNS rebinding). Returns the URL
+    to request plus the Host header and request extensions that keep the original host for
+    virtual hosting, TLS SNI and certificate verification.
+    """
+    original = httpx.URL(url)
+    headers = {"Host": original.netloc.decode("ascii")}
+    extensions = {"sni_hostname": original.raw_host.decode("ascii")} if original.scheme == "https" else {}
+    return str(original.copy_with(host=address)), headers, extensions
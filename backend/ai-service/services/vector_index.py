@@ -0,0 +1,286 @@
+import json
+import os
+import tempfile
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None
+
+# Single-file layout written before segments existed; still readable
+VECTORS_FILE = "vectors.npy"
+PASSAGES_FILE = "passages.json"
+# Ordered list of the segments that make up a saved index, replaced atomically
+MANIFEST_FILE = "segments.json"
+LEGACY_SEGMENT = "vectors"
+
+
+class _Segment:
+    """One block of passages: a vector matrix, per-row collection ids and the passage metadata"""
+    
+    __slots__ = ("name", "vectors", "collection_ids", "collections", "passages", "size", "memory_mapped")
+    
+    def __init__(
+        self,
+        name: Optional[str],
+        vectors: Any,
+        passages: List[Dict[str, Any]],
+        collection_ids: Any,
+        collections: Dict[str, int],
+        memory_mapped: bool = False
+    ):
+        self.name = name
+        self.vectors = vectors
+        self.passages = passages
+        self.collection_ids = collection_ids
+        self.collections = collections
+        self.size = len(passages)
+        self.memory_mapped = memory_mapped
+    
+    def search(self, query: Any, k: int, collection: Optional[str]) -> List[Tuple[float, Dict[str, Any]]]:
+        size = self.size
+        if size == 0:
+            return []
+        scores = self.vectors[:size] @ query
+        if collection is not None:
+            collection_id = self.collections.get(collection)
+            if collection_id is None:
+                return []
+            scores = np.where(self.collection_ids[:size] == collection_id, scores, -np.inf)
+        
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1)[:k] if k < size else np.arange(size)
+        return [(float(scores[i]), self.passages[i]) for i in top]
+
+
+class VectorIndex:
+    """
+    In-memory index of unit-length passage embeddings stored as float32 matrices, so a
+    query is a matrix-vector product plus a partial sort per segment. A saved index is a
+    list of immutable segment files opened memory-mapped, letting every worker share the
+    same pages; passages added since then live in a growable in-memory tail, which
+    flush() writes out as one more segment. save() compacts everything into one segment.
+    """
+    
+    def __init__(self, dim: int = 0, initial_capacity: int = 1024):
+        if np is None:
+            raise RuntimeError("numpy is required for the vector index")
+        self.dim = dim
+        self._segments: List[_Segment] = []
+        self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32) if dim else None
+        self._size = 0
+        self._passages: List[Dict[str, Any]] = []
+        self._collections: Dict[str, int] = {}
+        self._collection_ids = np.zeros(initial_capacity, dtype=np.int32)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return sum(segment.size for segment in self._segments) + self._size
+    
+    @property
+    def segment_count(self) -> int:
+        return len(self._segments)
+    
+    def add(self, vectors: Any, passages: List[Dict[str, Any]], collection: str = "default") -> None:
+        """Append normalized vectors (n, dim) and their passage metadata to the in-memory tail"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(passages):
+            raise ValueError("vectors must be a 2-D array with one row per passage")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        
+        with self._lock:
+            if self._vectors is None or not self.dim:
+                self.dim = vectors.shape[1]
+                self._vectors = np.zeros((max(1024, len(vectors)), self.dim), dtype=np.float32)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+            
+            self._reserve(self._size + len(vectors))
+            collection_id = self._collections.setdefault(collection, len(self._collections))
+            end = self._size + len(vectors)
+            self._vectors[self._size:end] = vectors
+            self._collection_ids[self._size:end] = collection_id
+            self._passages.extend({**passage, "collection": collection} for passage in passages)
+            self._size = end
+    
+    def _reserve(self, capacity: int) -> None:
+        # Grow geometrically so repeated adds stay amortized O(n)
+        if capacity <= len(self._vectors):
+            return
+        new_capacity = max(capacity, 2 * len(self._vectors), 1024)
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        collection_ids = np.zeros(new_capacity, dtype=np.int32)
+        collection_ids[:self._size] = self._collection_ids[:self._size]
+        self._vectors = vectors
+        self._collection_ids = collection_ids
+    
+    def search(
+        self,
+        query: Any,
+        k: int = 4,
+        collection: Optional[str] = None,
+        min_score: float = 0.0
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return up to k (cosine similarity, passage) pairs, best first"""
+        if len(self) == 0 or not self.dim:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        
+        hits: List[Tuple[float, Dict[str, Any]]] = []
+        tail = _Segment(None, self._vectors, self._passages, self._collection_ids, self._collections)
+        for segment in self._segments + [tail]:
+            hits.extend(segment.search(query, k, collection))
+        hits.sort(key=lambda hit: -hit[0])
+        return [hit for hit in hits[:k] if hit[0] >= min_score]
+    
+    def flush(self, directory: str) -> None:
+        """
+        Write the passages added since the last load as a new segment and list it in the
+        manifest; nothing already on disk is rewritten. The tail is then reopened from
+        the new file, memory-mapped. The manifest is written from this index's segments,
+        so callers sharing a directory must load the latest one first (under a lock).
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            if self._size == 0:
+                return
+            vectors = np.array(self._vectors[:self._size])
+            passages = list(self._passages[:self._size])
+            name = _write_segment(directory, vectors, passages)
+            _write_manifest(directory, [segment.name for segment in self._segments] + [name])
+            self._segments.append(_load_segment(directory, name, mmap=True))
+            self._size = 0
+            self._passages = []
+            self._collections = {}
+    
+    def save(self, directory: str) -> None:
+        """Compact every segment and the tail into a single segment, then drop the old files"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            blocks = [segment.vectors[:segment.size] for segment in self._segments if segment.size]
+            if self._size:
+                blocks.append(self._vectors[:self._size])
+            vectors = np.concatenate(blocks).astype(np.float32) if blocks else np.zeros((0, self.dim), np.float32)
+            passages = [passage for segment in self._segments for passage in segment.passages]
+            passages.extend(self._passages[:self._size])
+        name = _write_segment(directory, vectors, passages)
+        _write_manifest(directory, [name])
+        _remove_unlisted(directory, name)
+    
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, reuse: Optional["VectorIndex"] = None) -> "VectorIndex":
+        """
+        Open the segments listed in the manifest (or the older single-file layout).
+        Segments already open in reuse are shared rather than read again.
+        """
+        names = _read_manifest(directory)
+        opened = {segment.name: segment for segment in reuse._segments} if reuse is not None else {}
+        index = cls(initial_capacity=1)
+        for name in names:
+            segment = opened.get(name) or _load_segment(directory, name, mmap)
+            if segment.size and index.dim and segment.vectors.shape[1] != index.dim:
+                raise ValueError("vector index segments have different dimensions")
+            if segment.size:
+                index.dim = segment.vectors.shape[1]
+            index._segments.append(segment)
+        index._vectors = np.zeros((1, index.dim), dtype=np.float32) if index.dim else None
+        return index
+    
+    def stats(self) -> Dict[str, Any]:
+        collections = set(self._collections)
+        for segment in self._segments:
+            collections.update(segment.collections)
+        return {
+            "passages": len(self),
+            "dim": self.dim,
+            "collections": len(collections),
+            "segments": len(self._segments),
+            # True when every passage is served from shared, memory-mapped pages
+            "memory_mapped": (
+                bool(self._segments) and self._size == 0 and all(segment.memory_mapped for segment in self._segments)
+            )
+        }
+
+
+def saved_mtime(directory: str) -> float:
+    """Modification time of the saved index in directory, 0.0 if there is none"""
+    for name in (MANIFEST_FILE, VECTORS_FILE):
+        try:
+            return os.path.getmtime(os.path.join(directory, name))
+        except OSError:
+            continue
+    return 0.0
+
+
+def _segment_files(name: str) -> Tuple[str, str]:
+    if name == LEGACY_SEGMENT:
+        return VECTORS_FILE, PASSAGES_FILE
+    return f"{name}.npy", f"{name}.json"
+
+
+def _write_segment(directory: str, vectors: Any, passages: List[Dict[str, Any]]) -> str:
+    name = f"segment-{uuid.uuid4().hex}"
+    vectors_file, passages_file = _segment_files(name)
+    _atomic_write(directory, vectors_file, lambda handle: np.save(handle, vectors), binary=True)
+    _atomic_write(directory, passages_file, lambda handle: json.dump(passages, handle, ensure_ascii=False))
+    return name
+
+
+def _load_segment(directory: str, name: str, mmap: bool) -> _Segment:
+    vectors_file, passages_file = _segment_files(name)
+    vectors = np.load(os.path.join(directory, vectors_file), mmap_mode="r" if mmap else None)
+    with open(os.path.join(directory, passages_file), "r", encoding="utf-8") as handle:
+        passages = json.load(handle)
+    if len(passages) != len(vectors):
+        raise ValueError("vector index files are out of sync")
+    collections: Dict[str, int] = {}
+    collection_ids = np.array(
+        [collections.setdefault(p.get("collection", "default"), len(collections)) for p in passages],
+        dtype=np.int32
+    )
+    return _Segment(name, vectors, passages, collection_ids, collections, memory_mapped=mmap)
+
+
+def _read_manifest(directory: str) -> List[str]:
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as handle:
+            return json.load(handle)["segments"]
+    except FileNotFoundError:
+        if os.path.exists(os.path.join(directory, VECTORS_FILE)):
+            return [LEGACY_SEGMENT]
+        raise
+
+
+def _write_manifest(directory: str, names: List[str]) -> None:
+    _atomic_write(directory, MANIFEST_FILE, lambda handle: json.dump({"segments": names}, handle))
+
+
+def _remove_unlisted(directory: str, keep: str) -> None:
+    # Workers that still have old segments mapped keep reading them until they reload
+    stale = {VECTORS_FILE, PASSAGES_FILE}
+    for entry in os.listdir(directory):
+        if entry.startswith("segment-") and not entry.startswith(f"{keep}."):
+            stale.add(entry)
+    for entry in stale:
+        try:
+            os.remove(os.path.join(directory, entry))
+        except FileNotFoundError:
+            pass
+
+
+def _atomic_write(directory: str, name: str, write: Any, binary: bool = False) -> None:
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if binary else "w", encoding=None if binary else "utf-8") as handle:
+            write(handle)
+        os.replace(temp_path, os.path.join(directory, name))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -3,13 +3,112 @@
 Test script for the AI service
 """
 import asyncio
+import json
+import re
 import sys
 import os
+import tempfile
+import time
 
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from services.question_generator import QuestionGenerator
+from services.question_cache import QuestionCache
+from services.question_model import decode_questions, encode_questions, pack_questions, parse_questions, unpack_questions
+from services.question_bank import QuestionBank
+from services.pool_warmer import QuestionPoolWarmer
+from services.jobs import JobQueue, JobStore
+from services.pdf_cache import PDFResultCache
+from services.fast_json import FastJSONResponse
+from services.metrics import AI_FALLBACKS, AI_RESPONSES_PARSED, GEMINI_CALL_SECONDS, MetricsRegistry
+from services.url_guard import UnsafeURLError, check_public_url, pin_url
+from services.upload_limit import UploadLimitMiddleware
+from services.token_verifier import InvalidTokenError, SigningKeyCache, TokenVerifier, jwt
+from services.gemini_scheduler import GeminiScheduler, TokenBucket
+from services.circuit_breaker import CircuitBreaker
+from services.content_analyzer import ContentAnalyzer
+from services.dedup import QuestionDeduplicator
+from services.vector_index import VectorIndex, np
+from services.chat_tutor import MAX_SEGMENTS, ChatTutor
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiModel:
+    """Local stand-in for the Gemini SDK model with a fixed, blocking latency"""
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.calls = 0
+        self.fail = False
+    
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if self.fail:
+            time.sleep(self.latency)
+            raise RuntimeError("503 Service Unavailable")
+        if stream:
+            return self._stream()
+        time.sleep(self.latency)
+        return FakeResponse(json.dumps({"questions": self._questions()}))
+    
+    def _stream(self):
+        """Emit each question in two chunks, with the model latency spread across questions"""
+        yield FakeResponse('Here you go:\n```json\n{"questions": [')
+        for i, question in enumerate(self._questions()):
+            text = ("," if i else "") + json.dumps(question)
+            time.sleep(self.latency / 3)
+            yield FakeResponse(text[:len(text) // 2])
+            yield FakeResponse(text[len(text) // 2:])
+        yield FakeResponse("]}\n```")
+    
+    def _questions(self):
+        return [{
+            "id": f"q{i}",
+            "question": f"Fake question {i} ({self.calls})?",
+            "type": "mcq",
+            "difficulty": "medium",
+            "options": ["A", "B", "C", "D"],
+            "correct_answer": 0,
+            "topic": "Fake"
+        } for i in range(1, 4)]
+
+class PromptedGeminiModel(FakeGeminiModel):
+    """FakeGeminiModel that reads the requested counts from each prompt and answers packed prompts per set"""
+    def __init__(self, latency=0.0, skip_sets=()):
+        super().__init__(latency)
+        self.prompts = []
+        self.skip_sets = set(skip_sets)
+    
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        self.prompts.append(prompt)
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("503 Service Unavailable")
+        sets = re.findall(r"- Set (\d+): (\d+) ", prompt)
+        if sets:
+            return FakeResponse(json.dumps({"question_sets": [
+                {"set": int(number), "questions": self._numbered(int(count), f"set {number}")}
+                for number, count in sets if int(number) not in self.skip_sets
+            ]}))
+        count = int(re.search(r"Generate (\d+) high-quality", prompt).group(1))
+        section = re.search(r"Section (\d+)", prompt)
+        questions = self._numbered(count - 1, f"section {section.group(1) if section else 0}")
+        # Every chunk also asks the same overview question, so merging has a repeat to drop
+        return FakeResponse(json.dumps({"questions": questions + self._numbered(1, "the whole course")}))
+    
+    def _numbered(self, count, tag):
+        return [{
+            "id": f"q{i}",
+            "question": f"Fake question {i} about {tag}?",
+            "type": "mcq",
+            "difficulty": "medium",
+            "options": ["A", "B", "C", "D"],
+            "correct_answer": 0,
+            "topic": "Fake"
+        } for i in range(1, count + 1)]
 
 async def test_question_generator():
     """Test the question generator without Gemini"""
@@ -57,11 +156,864 @@ async def test_question_generator():
         print(f"❌ Error generating questions: {str(e)}")
         return False
 
+async def test_gemini_calls_run_concurrently():
+    """Overlapping requests must not queue behind a blocking Gemini call"""
+    print("\nTesting concurrent Gemini calls...")
+    generator = QuestionGenerator(gemini_model=FakeGeminiModel(latency=0.2), max_concurrency=8)
+    
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        generator.generate_questions(content=f"Content {i}", num_questions=3)
+        for i in range(5)
+    ])
+    elapsed = time.perf_counter() - started
+    
+    if any(len(questions) != 3 for questions in results) or elapsed > 0.6:
+        print(f"❌ Concurrent generation took {elapsed:.2f}s")
+        return False
+    
+    print(f"✅ 5 overlapping requests finished in {elapsed:.2f}s")
+    return True
+
+async def test_gemini_timeout_holds_slot():
+    """A timed-out call keeps its slot until its worker thread returns, so the cap still holds"""
+    print("\nTesting Gemini call timeouts...")
+    generator = QuestionGenerator(gemini_model=FakeGeminiModel(latency=0.3), max_concurrency=1, request_timeout=0.1)
+    
+    try:
+        await generator._generate_with_gemini("prompt")
+        print("❌ Slow call did not time out")
+        return False
+    except asyncio.TimeoutError:
+        pass
+    held = generator.scheduler.stats()["active"]
+    await asyncio.sleep(0.3)
+    released = generator.scheduler.stats()["active"]
+    
+    if held != 1 or released != 0:
+        print(f"❌ Slot not held for the abandoned thread: active {held} after timeout, {released} after it returned")
+        return False
+    
+    print("✅ Slot held until the timed-out worker thread returned")
+    return True
+
+async def test_packed_batch():
+    """Small batch specs share one Gemini call, results split back per spec, and missing sets are topped up"""
+    print("\nTesting packed batch generation...")
+    model = PromptedGeminiModel(skip_sets=[2])
+    generator = QuestionGenerator(gemini_model=model)
+    content = "Stacks, queues and linked lists"
+    specs = [
+        {"content": content, "num_questions": count, "difficulty": "medium", "question_type": "mcq",
+         "subject": subject, "branch": "CSE", "semester": 3}
+        for subject, count in [("Data Structures", 3), ("Algorithms", 2), ("Databases", 4), ("Operating Systems", 12)]
+    ]
+    
+    results = await generator.generate_question_batch(specs)
+    counts = [len(result["questions"]) for result in results]
+    packed_calls = sum(1 for prompt in model.prompts if "QUESTION SETS" in prompt)
+    from_set = [
+        sum(1 for question in result["questions"] if f"about set {number}?" in question["question"])
+        for number, result in zip((1, 2, 3), results[:3])
+    ]
+    if (model.calls != 2 or packed_calls != 1 or counts != [3, 2, 4, 12] or from_set != [3, 0, 4]
+            or not all(result["success"] for result in results)):
+        print(f"❌ Batch not packed and split as expected: calls={model.calls}, counts={counts}, from_set={from_set}")
+        return False
+    
+    model.fail = True
+    failed = await generator.generate_question_batch([dict(spec, content="Hash tables") for spec in specs[:3]])
+    if [len(result["questions"]) for result in failed] != [3, 2, 4] or not all(result["success"] for result in failed):
+        print(f"❌ Failed packed call not answered with fallbacks: {failed}")
+        return False
+    
+    print(f"✅ 3 specs packed into one call and split back {counts[:3]}; missing set and failed call topped up")
+    return True
+
+async def test_chunked_generation():
+    """Long content is split into chunks, questions spread by chunk size, then merged without repeats"""
+    print("\nTesting chunked generation...")
+    model = PromptedGeminiModel()
+    generator = QuestionGenerator(gemini_model=model)
+    content = "\n\n".join(
+        f"Section {i}\n" + f"Topic {i} sentence about material number {i}. " * repeats
+        for i, repeats in [(1, 80), (2, 80), (3, 40)]
+    )
+    
+    merged = await generator._generate_chunked_questions(content, 10, "medium", "mcq", "Data Structures", "CSE", 3)
+    per_chunk = [int(re.search(r"Generate (\d+) high-quality", prompt).group(1)) for prompt in model.prompts]
+    # Each chunk answers with one shared overview question, kept once
+    expected_total = sum(per_chunk) - (len(per_chunk) - 1)
+    if per_chunk != [4, 4, 2] or len(merged) != expected_total or [q["id"] for q in merged] != [f"ai_q_{i}" for i in range(1, expected_total + 1)]:
+        print(f"❌ Unexpected chunking: per_chunk={per_chunk}, merged={len(merged)}")
+        return False
+    
+    questions = await generator.generate_questions(content=content, num_questions=10, subject="Data Structures", branch="CSE")
+    if len(questions) != 10 or len({q["question"] for q in questions}) != 10:
+        print(f"❌ Chunked request returned {len(questions)} questions")
+        return False
+    
+    print(f"✅ {len(per_chunk)} chunks asked for {per_chunk} questions, merged to {len(merged)}; request topped up to 10")
+    return True
+
+async def test_gemini_scheduler():
+    """Queued Gemini calls run by priority class and wait for per-minute quota"""
+    print("\nTesting Gemini scheduler...")
+    now = [0.0]
+    bucket = TokenBucket(per_minute=60, clock=lambda: now[0])
+    bucket.take(60)
+    if bucket.delay(1) != 1.0 or bucket.delay(1, reserve=0.25) != 16.0:
+        print(f"❌ Unexpected token bucket delays: {bucket.delay(1)}, {bucket.delay(1, reserve=0.25)}")
+        return False
+    
+    scheduler = GeminiScheduler(max_concurrency=1)
+    generator = QuestionGenerator(gemini_model=FakeGeminiModel(latency=0.05), scheduler=scheduler)
+    order = []
+    
+    async def call(priority):
+        await generator.generate_text(f"{priority} prompt", priority=priority)
+        order.append(priority)
+    
+    tasks = [asyncio.create_task(call("batch"))]
+    await asyncio.sleep(0.01)
+    tasks += [asyncio.create_task(call(priority)) for priority in ("batch", "feedback", "interactive")]
+    await asyncio.sleep(0.01)
+    depth = scheduler.queue_depth()
+    await asyncio.gather(*tasks)
+    
+    stats = scheduler.stats()
+    if order != ["batch", "interactive", "feedback", "batch"] or depth != {"interactive": 1, "feedback": 1, "batch": 1}:
+        print(f"❌ Calls ran out of priority order: {order}, queue depth {depth}")
+        return False
+    if stats["wait"]["batch"]["count"] != 2 or stats["wait"]["batch"]["max_ms"] < 100:
+        print(f"❌ Wait metrics not recorded: {stats['wait']}")
+        return False
+    
+    print(f"✅ Priority order {order}, waits {stats['wait']['batch']}")
+    return True
+
+async def test_circuit_breaker():
+    """Repeated Gemini failures open the circuit; a probe after the cool-down closes it"""
+    print("\nTesting Gemini circuit breaker...")
+    model = FakeGeminiModel(latency=0.1)
+    model.fail = True
+    breaker = CircuitBreaker(name="Gemini", min_calls=2, open_seconds=0.3)
+    generator = QuestionGenerator(gemini_model=model, breaker=breaker)
+    
+    for i in range(2):
+        await generator.generate_questions(content=f"Outage {i}", num_questions=2)
+    started = time.perf_counter()
+    questions = await generator.generate_questions(content="Outage 2", num_questions=2)
+    elapsed = time.perf_counter() - started
+    if breaker.state != "open" or model.calls != 2 or len(questions) != 2 or elapsed > 0.05:
+        print(f"❌ Circuit did not short-circuit: {breaker.stats()}, calls={model.calls}, {elapsed:.2f}s")
+        return False
+    
+    await asyncio.sleep(0.35)
+    model.fail = False
+    recovered = await generator.generate_questions(content="Outage 3", num_questions=2)
+    if breaker.state != "closed" or not recovered[0]["question"].startswith("Fake"):
+        print(f"❌ Circuit did not recover after a successful probe: {breaker.stats()}")
+        return False
+    
+    print(f"✅ Open circuit answered in {elapsed * 1000:.1f}ms, closed again after probe: {breaker.stats()}")
+    return True
+
+async def test_question_cache():
+    """Identical requests are served from the cache without another Gemini call"""
+    print("\nTesting question cache...")
+    model = FakeGeminiModel(latency=0.05)
+    cache = QuestionCache(max_entries=16, ttl=60)
+    generator = QuestionGenerator(gemini_model=model, cache=cache)
+    
+    first = await generator.generate_questions(content="Stacks and queues", num_questions=3, subject="Data Structures")
+    second = await generator.generate_questions(content="  Stacks and   queues ", num_questions=3, subject="data structures")
+    
+    stats = cache.stats()
+    if model.calls != 1 or first != second or stats["local_hits"] != 1 or stats["misses"] != 1:
+        print(f"❌ Cache did not serve the repeat request: calls={model.calls}, stats={stats}")
+        return False
+    
+    print(f"✅ Repeat request served from cache: {stats}")
+    return True
+
+async def test_question_model():
+    """Questions are validated once, share interned strings and round-trip through the cache forms"""
+    print("\nTesting question model...")
+    items = [
+        {"id": "q1", "question": "What is a heap?", "type": "MCQ", "difficulty": "Medium", "subject": "Data Structures",
+         "options": ["A", "B", "C", "D"], "correct_answer": 0, "source": "gemini"},
+        {"id": "q2", "question": "Define recursion.", "type": "short_answer", "subject": "Data Structures", "keywords": ["base case"]},
+        {"id": "q3", "question": "Too few options", "type": "mcq", "options": ["A", "B"], "correct_answer": 0},
+        {"question": "No id", "type": "essay"}
+    ]
+    questions = parse_questions(items)
+    if [question.id for question in questions] != ["q1", "q2"] or questions[0].to_dict()["source"] != "gemini":
+        print(f"❌ Validation kept the wrong questions: {questions}")
+        return False
+    
+    unpacked = unpack_questions(pack_questions(questions))
+    decoded = decode_questions(encode_questions(questions))
+    if unpacked != questions or decoded != questions or unpacked[1].subject is not questions[0].subject:
+        print(f"❌ Questions did not round-trip: {unpacked} / {decoded}")
+        return False
+    
+    cache = QuestionCache(max_entries=4, ttl=60)
+    await cache.set("key", items)
+    cached = await cache.get("key")
+    cached[0]["options"].append("E")
+    if [q["type"] for q in cached] != ["mcq", "short_answer"] or len((await cache.get("key"))[0]["options"]) != 4:
+        print(f"❌ Cache did not return fresh normalized questions: {cached}")
+        return False
+    
+    print(f"✅ Invalid questions dropped, {len(pack_questions(questions))} packed bytes for 2 questions")
+    return True
+
+async def test_request_coalescing():
+    """A burst of identical requests shares one Gemini call; different feedback inputs do not"""
+    print("\nTesting request coalescing...")
+    model = FakeGeminiModel(latency=0.1)
+    generator = QuestionGenerator(gemini_model=model)
+    
+    results = await asyncio.gather(*[
+        generator.generate_questions(content="Heaps", num_questions=3, subject="Data Structures")
+        for _ in range(50)
+    ])
+    if model.calls != 1 or any(result != results[0] for result in results):
+        print(f"❌ Burst was not coalesced: calls={model.calls}, stats={generator.inflight.stats()}")
+        return False
+    
+    generator = QuestionGenerator()
+    feedback = await asyncio.gather(
+        generator.generate_enhanced_feedback({"average_score": 40}, [], [], ["Graphs"]),
+        generator.generate_enhanced_feedback({"average_score": 40}, [], [], ["Graphs"]),
+        generator.generate_enhanced_feedback({"average_score": 90}, [], [], [])
+    )
+    if feedback[0] is not feedback[1] or generator.inflight.stats()["started"] != 2:
+        print(f"❌ Feedback coalescing keyed incorrectly: {generator.inflight.stats()}")
+        return False
+    
+    print(f"✅ 50 identical requests made {model.calls} Gemini call")
+    return True
+
+async def test_latency_budget():
+    """A slow model is cut off at the budget and its late answer still fills the cache"""
+    print("\nTesting latency budgets...")
+    model = FakeGeminiModel(latency=0.5)
+    generator = QuestionGenerator(gemini_model=model, cache=QuestionCache(max_entries=16, ttl=60))
+    
+    started = time.perf_counter()
+    fallback = await generator.generate_questions(content="Graphs", num_questions=3, budget=0.1)
+    elapsed = time.perf_counter() - started
+    if elapsed > 0.3 or len(fallback) != 3 or any(q["question"].startswith("Fake") for q in fallback):
+        print(f"❌ Budget not enforced: {elapsed:.2f}s, {[q['question'] for q in fallback]}")
+        return False
+    
+    await asyncio.sleep(0.6)
+    cached = await generator.generate_questions(content="Graphs", num_questions=3, budget=0.1)
+    if model.calls != 1 or not all(q["question"].startswith("Fake") for q in cached):
+        print(f"❌ Background generation did not fill the cache: calls={model.calls}")
+        return False
+    
+    print(f"✅ Rule-based answer after {elapsed:.2f}s, AI set cached in the background")
+    return True
+
+async def test_question_bank():
+    """Banked questions are reused across users on the same material but never shown to the same user twice"""
+    print("\nTesting question bank...")
+    model = FakeGeminiModel(latency=0.0)
+    with tempfile.TemporaryDirectory() as directory:
+        bank = QuestionBank(os.path.join(directory, "bank.sqlite3"))
+        # The cache is keyed on the request only; a returning user must still get new questions
+        generator = QuestionGenerator(gemini_model=model, bank=bank, cache=QuestionCache(max_entries=16, ttl=60))
+        spec = {"content": "Trees", "num_questions": 3, "subject": "Data Structures", "branch": "CSE"}
+        
+        first = await generator.generate_questions(user_id="alice", **spec)
+        shared = await generator.generate_questions(user_id="bob", **spec)
+        repeat = await generator.generate_questions(user_id="alice", **spec)
+        unrelated = await generator.generate_questions(user_id="dave", **{**spec, "content": "Thermodynamics of steam turbines"})
+        # Same question text banked for another difficulty gets its own row
+        await bank.add([dict(first[0])], "CSE", "Data Structures", 1, "hard", "mcq")
+        hard = await bank.fetch("CSE", "Data Structures", 1, "hard", "mcq", 5)
+        bank.close()
+    
+    first_ids = {q["id"] for q in first}
+    banked_ids = first_ids | {q["id"] for q in repeat}
+    if (model.calls != 3 or {q["id"] for q in shared} != first_ids or first_ids & {q["id"] for q in repeat}
+            or banked_ids & {q["id"] for q in unrelated} or [q["id"] for q in hard] == [first[0]["id"]]
+            or len(hard) != 1):
+        print(f"❌ Question bank misrouted requests: calls={model.calls}, stats={bank.stats()}")
+        return False
+    
+    print(f"✅ Second user served from the bank, repeat user got new questions: {bank.stats()}")
+    return True
+
+async def test_pool_warmer():
+    """Warm-up passes fill each pool to its size and interactive requests are then served from it"""
+    print("\nTesting question pool warmer...")
+    model = FakeGeminiModel(latency=0.0)
+    with tempfile.TemporaryDirectory() as directory:
+        bank = QuestionBank(os.path.join(directory, "bank.sqlite3"))
+        generator = QuestionGenerator(gemini_model=model, bank=bank)
+        warmer = QuestionPoolWarmer(
+            generator, bank, pool_size=5, batch_size=3,
+            difficulties=["medium"], question_types=["mcq"], branch_subjects={"CSE": ["Data Structures"]}
+        )
+        passes = [(await warmer.run_once())["generated"] for _ in range(3)]
+        stored = await bank.count("CSE", "Data Structures", 1, "medium", "mcq")
+        calls = model.calls
+        served = await generator.generate_questions(
+            content="Any syllabus text", num_questions=4, subject="Data Structures", branch="CSE", user_id="carol"
+        )
+        bank.close()
+    
+    if passes != [3, 2, 0] or stored != 5 or model.calls != calls or len(served) != 4:
+        print(f"❌ Pool not warmed as expected: passes={passes}, stored={stored}, calls={calls}->{model.calls}")
+        return False
+    
+    print(f"✅ Pool filled in passes {passes}; request served from the pool without a Gemini call")
+    return True
+
+async def test_pdf_cache():
+    """Overwriting a cached extraction does not count its size twice, even when writes run concurrently"""
+    print("\nTesting PDF result cache...")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PDFResultCache(directory, max_bytes=10 * 1024 * 1024)
+        extraction = {"text": "Fluid mechanics " * 100, "pages": 3}
+        for _ in range(3):
+            await cache.set("ab" * 32, extraction)
+        size = cache.stats()["size_bytes"]
+        on_disk = PDFResultCache(directory).stats()["size_bytes"]
+        cached = await cache.get("ab" * 32)
+        
+        # Worker threads writing new and overwritten entries at once must not lose updates
+        await asyncio.gather(*(
+            cache.set(f"{number % 8:02x}" * 32, {"text": "Thermodynamics " * (50 + number)}) for number in range(64)
+        ))
+        concurrent_size = cache.stats()["size_bytes"]
+        concurrent_on_disk = PDFResultCache(directory).stats()["size_bytes"]
+    
+    if size != on_disk or cached != extraction:
+        print(f"❌ Cache size drifted: counted {size} bytes, {on_disk} on disk")
+        return False
+    if concurrent_size != concurrent_on_disk:
+        print(f"❌ Concurrent writes drifted: counted {concurrent_size} bytes, {concurrent_on_disk} on disk")
+        return False
+    
+    print(f"✅ Overwrites counted once, sequentially and concurrently ({size} and {concurrent_size} bytes)")
+    return True
+
+async def test_job_queue():
+    """Jobs publish partial results, and a job orphaned by a crashed worker is rerun after restart"""
+    print("\nTesting background jobs...")
+    
+    async def count_up(job):
+        for number in range(job.params["to"]):
+            await job.report((number + 1) / job.params["to"], number)
+        return {"total": job.params["to"]}
+    
+    with tempfile.TemporaryDirectory() as directory:
+        store = JobStore(os.path.join(directory, "jobs.sqlite3"))
+        written = []
+        store_update = store.update
+        
+        async def recording_update(job_id, worker, progress, items, start):
+            written.append(len(items))
+            return await store_update(job_id, worker, progress, items, start)
+        
+        store.update = recording_update
+        queue = JobQueue(store, {"count": count_up}, heartbeat_seconds=0.05)
+        queue.start()
+        job = await queue.submit("count", {"to": 3}, user_id="dave")
+        events = [event async for event in queue.events(job["id"], poll_interval=0.05)]
+        await queue.stop()
+        
+        # A worker that claimed a job and died without finishing it
+        orphan = await store.create("count", {"to": 2}, "erin")
+        await store.claim(orphan["id"], "crashed-worker")
+        await asyncio.sleep(0.2)
+        restarted = JobQueue(store, {"count": count_up}, heartbeat_seconds=0.05)
+        restarted.start()
+        for _ in range(50):
+            recovered = await store.get(orphan["id"])
+            if recovered["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.1)
+        by_status = restarted.stats()["by_status"]
+        await restarted.stop()
+        store.close()
+    
+    partial = [item for event in events for item in event.get("partial_results", [])]
+    final = events[-1]
+    if partial != [0, 1, 2] or final["type"] != "succeeded" or final["job"]["result"] != {"total": 3}:
+        print(f"❌ Job events were wrong: {events}")
+        return False
+    if written[:3] != [1, 1, 1]:
+        print(f"❌ Progress reports rewrote earlier partial results: {written}")
+        return False
+    if recovered["status"] != "succeeded" or recovered["attempts"] != 2 or recovered["partial_results"] != [0, 1]:
+        print(f"❌ Orphaned job was not recovered: {recovered}")
+        return False
+    if by_status != {"succeeded": 2}:
+        print(f"❌ Job counts were not refreshed by the maintenance loop: {by_status}")
+        return False
+    
+    print(f"✅ Partial results streamed in order; orphaned job rerun after restart (attempt {recovered['attempts']})")
+    return True
+
+async def test_question_dedup():
+    """Repeated questions are dropped and short sets are padded with distinct questions"""
+    print("\nTesting question deduplication...")
+    deduplicator = QuestionDeduplicator()
+    questions = [
+        {"id": "q1", "question": "What is a stack?", "type": "short_answer"},
+        {"id": "q2", "question": "what is a STACK", "type": "short_answer"},
+        {"id": "q3", "question": "What is a queue?", "type": "short_answer"}
+    ]
+    unique = await deduplicator.dedupe(questions, keep=[{"question": "What is a queue"}])
+    if [q["id"] for q in unique] != ["q1"]:
+        print(f"❌ Unexpected dedup result: {unique}")
+        return False
+    
+    # The fake model answers 3 questions; the rest must be padded without repeats
+    generator = QuestionGenerator(gemini_model=FakeGeminiModel(latency=0.0))
+    padded = await generator.generate_questions(content="", num_questions=8)
+    texts = [q["question"].split(": ", 1)[-1] for q in padded]
+    if len(padded) != 8 or len(set(texts)) != 8:
+        print(f"❌ Padded set contains repeats: {texts}")
+        return False
+    
+    print(f"✅ Dropped duplicates, padded to {len(padded)} distinct questions")
+    return True
+
+async def test_response_parsing():
+    """Questions are recovered from model output with prose braces, truncation or a broken element"""
+    print("\nTesting AI response parsing...")
+    generator = QuestionGenerator()
+    fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_responses")
+    expected = {
+        "prose_with_braces.txt": 3,
+        "unclosed_prose_brace.txt": 3,
+        "truncated.txt": 2,
+        "broken_element.txt": 2,
+        "numbered_text.txt": 2
+    }
+    found = {}
+    for name in expected:
+        with open(os.path.join(fixtures_dir, name)) as fixture:
+            found[name] = len(generator._parse_ai_response(fixture.read(), "mcq"))
+    with open(os.path.join(fixtures_dir, "feedback_with_prose.txt")) as fixture:
+        feedback = generator._parse_feedback_response(fixture.read())
+    
+    if found != expected or feedback["overall_assessment"] != "Steady progress in {core} topics.":
+        print(f"❌ Parsed counts {found}, feedback {feedback.get('overall_assessment')}")
+        return False
+    
+    print(f"✅ Recovered questions from every malformed fixture: {found}")
+    return True
+
+async def test_fast_json_response():
+    """Fast responses decode to the same JSON, and values orjson cannot encode still serialize"""
+    print("\nTesting fast JSON responses...")
+    generator = QuestionGenerator()
+    questions = await generator.generate_questions(content="Stacks and queues", num_questions=5)
+    payload = {"success": True, "questions": questions, "metadata": {"tags": {"cse"}, "score": 0.5}}
+    
+    decoded = json.loads(FastJSONResponse(payload).body)
+    if decoded["questions"] != questions or decoded["metadata"] != {"tags": ["cse"], "score": 0.5}:
+        print(f"❌ Fast response changed the payload: {decoded['metadata']}")
+        return False
+    
+    print(f"✅ {len(FastJSONResponse(payload).body)} byte response round-trips, set fell back to a list")
+    return True
+
+async def test_metrics():
+    """Gemini calls, parsed responses and fallbacks are counted and rendered as Prometheus text"""
+    print("\nTesting metrics...")
+    calls = GEMINI_CALL_SECONDS.labels("generate", "success")
+    parsed = AI_RESPONSES_PARSED.labels("json")
+    fallbacks = AI_FALLBACKS.labels("questions", "ai_failed")
+    before = (sum(calls.counts), parsed.value, fallbacks.value)
+    
+    model = FakeGeminiModel(latency=0.01)
+    generator = QuestionGenerator(gemini_model=model)
+    await generator.generate_questions(content="Graphs", num_questions=3, subject="Data Structures")
+    model.fail = True
+    await generator.generate_questions(content="Tries", num_questions=3, subject="Data Structures")
+    after = (sum(calls.counts), parsed.value, fallbacks.value)
+    if [b - a for a, b in zip(before, after)] != [1, 1, 1]:
+        print(f"❌ Unexpected metric changes: {before} -> {after}")
+        return False
+    
+    registry = MetricsRegistry()
+    latency = registry.histogram("request_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.labels('/a"b').observe(value)
+    lines = registry.render().splitlines()
+    expected = [
+        'request_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'request_seconds_bucket{route="/a\\"b",le="1"} 3',
+        'request_seconds_bucket{route="/a\\"b",le="+Inf"} 4',
+        'request_seconds_sum{route="/a\\"b"} 4.05',
+        'request_seconds_count{route="/a\\"b"} 4'
+    ]
+    if lines[1] != "# TYPE request_seconds histogram" or lines[2:] != expected:
+        print(f"❌ Unexpected exposition: {lines}")
+        return False
+    
+    print("✅ Gemini latency, parse results and fallbacks recorded; histogram rendered cumulatively")
+    return True
+
+async def test_token_verifier():
+    """Tokens are checked against a local key set once, then served from the verified-token cache"""
+    print("\nTesting token verification...")
+    if jwt is None:
+        print("⚠️ python-jose not installed, skipping token verification test")
+        return True
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    fetches = []
+    
+    async def fetch_local_keys():
+        fetches.append(time.time())
+        return {"key-1": public_pem}, 3600
+    
+    def make_token(audience="adaptilearn-test", kid="key-1"):
+        now = int(time.time())
+        claims = {
+            "iss": "https://securetoken.google.com/adaptilearn-test", "aud": audience, "sub": "student-42",
+            "iat": now, "auth_time": now, "exp": now + 600, "email": "student@example.com"
+        }
+        return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": kid})
+    
+    verifier = TokenVerifier("adaptilearn-test", SigningKeyCache(fetch=fetch_local_keys, min_refresh_interval=0))
+    token = make_token()
+    claims = [await verifier.verify(token) for _ in range(3)]
+    rejected = 0
+    for bad_token in (make_token(audience="another-project"), make_token(kid="rotated-away"), token[:-4] + "AAAA"):
+        try:
+            await verifier.verify(bad_token)
+        except InvalidTokenError:
+            rejected += 1
+    
+    stats = verifier.stats()
+    if claims[0]["sub"] != "student-42" or stats["hits"] != 2 or rejected != 3 or len(fetches) != 2:
+        print(f"❌ Unexpected verification results: rejected={rejected}, fetches={len(fetches)}, {stats}")
+        return False
+    
+    print(f"✅ One signature check for three requests, bad tokens rejected, unknown key refetched once: {stats}")
+    return True
+
+async def test_url_guard():
+    """Client-supplied PDF URLs may only point at public http(s) hosts"""
+    print("\nTesting PDF URL guard...")
+    blocked = [
+        "http://localhost/admin", "http://127.0.0.1:8000/health", "http://169.254.169.254/latest/meta-data/",
+        "http://10.0.0.5/notes.pdf", "http://[::1]/notes.pdf", "http://[::ffff:192.168.1.1]/notes.pdf",
+        "file:///etc/passwd", "ftp://example.com/notes.pdf", "http:///notes.pdf"
+    ]
+    allowed = []
+    for url in blocked:
+        try:
+            await check_public_url(url)
+            allowed.append(url)
+        except UnsafeURLError:
+            pass
+    try:
+        address = await check_public_url("https://93.184.216.34/notes.pdf")
+    except UnsafeURLError as e:
+        print(f"❌ Public address rejected: {str(e)}")
+        return False
+    if allowed or address != "93.184.216.34":
+        print(f"❌ Internal URLs allowed: {allowed} (checked address {address})")
+        return False
+    
+    # The download connects to the checked address but keeps the original host for HTTP and TLS
+    pinned = pin_url("https://notes.example.com:8443/unit 1.pdf?v=2", "93.184.216.34")
+    expected = (
+        "https://93.184.216.34:8443/unit%201.pdf?v=2",
+        {"Host": "notes.example.com:8443"},
+        {"sni_hostname": "notes.example.com"}
+    )
+    if pinned != expected or pin_url("http://notes.example.com/a.pdf", "2606:2800::1")[0] != "http://[2606:2800::1]/a.pdf":
+        print(f"❌ URL was not pinned to the checked address: {pinned}")
+        return False
+    
+    print(f"✅ {len(blocked)} internal or non-http URLs rejected, public address allowed and pinned")
+    return True
+
+def _minimal_pdf(text):
+    """A one-page PDF with correct xref offsets, built in memory"""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+async def test_pdf_upload():
+    """The upload endpoint extracts a small PDF, rejects non-PDF and oversized files, and leaves no temp files behind"""
+    print("\nTesting PDF upload endpoint...")
+    try:
+        from fastapi.testclient import TestClient
+        import app as service
+    except ImportError as e:
+        print(f"⚠️ App dependencies not installed ({e}), skipping PDF upload test")
+        return True
+    
+    client = TestClient(service.app)
+    headers = {"Authorization": "Bearer abcdefghijkl"}
+    pdf = _minimal_pdf("Heat flows from hot to cold bodies")
+    
+    def upload(name, body, content_type="application/pdf"):
+        return client.post("/api/ai/process-pdf/upload", headers=headers, files={"file": (name, body, content_type)})
+    
+    max_size, temp_root = service.PDF_MAX_SIZE, tempfile.tempdir
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            tempfile.tempdir = directory
+            
+            response = upload("notes.pdf", pdf)
+            body = response.json()
+            if response.status_code != 200 or not body.get("success") or "Heat flows" not in body["extracted_content"]["text_content"]:
+                print(f"❌ Small PDF was not extracted: {response.status_code} {body}")
+                return False
+            
+            not_pdf = upload("notes.pdf", b"just some plain text, not a PDF", "text/plain")
+            service.PDF_MAX_SIZE = len(pdf) - 1
+            too_large = upload("notes.pdf", pdf)
+            service.PDF_MAX_SIZE = max_size
+            empty = upload("notes.pdf", b"")
+            
+            codes = (not_pdf.status_code, too_large.status_code, empty.status_code)
+            if codes != (415, 413, 400):
+                print(f"❌ Unexpected status codes for non-PDF, oversized and empty uploads: {codes}")
+                return False
+            
+            malformed = client.post(
+                "/api/ai/process-pdf/upload",
+                headers={**headers, "Content-Type": "multipart/form-data; boundary=x", "Content-Length": "lots"},
+                content=b"--x--"
+            )
+            if malformed.status_code != 400:
+                print(f"❌ Malformed Content-Length was not rejected with 400: {malformed.status_code}")
+                return False
+            
+            leftovers = os.listdir(directory)
+            if leftovers:
+                print(f"❌ Upload temp files were not removed: {leftovers}")
+                return False
+    finally:
+        service.PDF_MAX_SIZE, tempfile.tempdir = max_size, temp_root
+    
+    # Bodies over the cap are refused before the multipart parser runs, with or without a length
+    from fastapi import FastAPI, File, UploadFile
+    parsed = []
+    limited = FastAPI()
+    
+    @limited.post("/upload")
+    async def receive_upload(file: UploadFile = File(...)):
+        parsed.append(file.filename)
+        return {"ok": True}
+    
+    limited.add_middleware(UploadLimitMiddleware, max_bytes=1024, paths=["/upload"])
+    limited_client = TestClient(limited)
+    declared = limited_client.post("/upload", files={"file": ("big.pdf", pdf * 4, "application/pdf")})
+    streamed = limited_client.post(
+        "/upload",
+        headers={"Content-Type": "multipart/form-data; boundary=x"},
+        content=(pdf for _ in range(4))
+    )
+    small = limited_client.post("/upload", files={"file": ("small.pdf", b"%PDF-1.4", "application/pdf")})
+    if (declared.status_code, streamed.status_code, small.status_code) != (413, 413, 200) or parsed != ["small.pdf"]:
+        print(f"❌ Upload cap not enforced before parsing: {declared.status_code} {streamed.status_code} {small.status_code} {parsed}")
+        return False
+    
+    print("✅ Upload extracts small PDFs, caps bodies before parsing and rejects non-PDF (415), oversized (413), empty and malformed (400) uploads without leaking temp files")
+    return True
+
+async def test_streamed_questions():
+    """The first streamed question arrives before the whole response is generated"""
+    print("\nTesting streamed question generation...")
+    generator = QuestionGenerator(gemini_model=FakeGeminiModel(latency=0.3))
+    
+    started = time.perf_counter()
+    first_at = None
+    questions = []
+    async for question in generator.stream_questions(content="Queues", num_questions=3):
+        if first_at is None:
+            first_at = time.perf_counter() - started
+        questions.append(question)
+    total = time.perf_counter() - started
+    
+    if len(questions) != 3 or not questions[0]["id"].startswith("q") or first_at is None or first_at > total * 0.6:
+        print(f"❌ Streaming did not flush early: {len(questions)} questions, first at {first_at}, total {total:.2f}s")
+        return False
+    
+    print(f"✅ First question after {first_at:.2f}s of {total:.2f}s")
+    return True
+
+async def test_content_analyzer():
+    """Topics match whole words/phrases and keywords ignore punctuation"""
+    print("\nTesting content analyzer...")
+    analysis = ContentAnalyzer().analyze(
+        "Algorithms on data\nstructures. We maintain the database, database indexes and Python code."
+    )
+    
+    expected_topics = ["Database", "Algorithm", "Data Structure", "Python", "Code"]
+    if analysis["topics"] != expected_topics or analysis["keywords"][0] != "database":
+        print(f"❌ Unexpected analysis: {analysis['topics']} {analysis['keywords']}")
+        return False
+    
+    # Other branches are covered by the same dictionary, and "html" must not count as "ML"
+    mech = ContentAnalyzer().analyze(
+        "Apply Bernoulli's equation to flow through pipes; the Reynolds number decides laminar flow. See the HTML notes.",
+        branch="MECH"
+    )
+    if mech["topics"][:2] != ["Bernoulli's Equation", "Flow Through Pipes"] or "Ml" in mech["topics"]:
+        print(f"❌ Unexpected MECH topics: {mech['topics']}")
+        return False
+    
+    print(f"✅ Topics {analysis['topics']}, MECH topics {mech['topics']}, keywords {analysis['keywords'][:3]}")
+    return True
+
+async def test_keyword_engine():
+    """Corpus IDF ranks technical terms above common syllabus words, in single and batch mode"""
+    print("\nTesting keyword engine...")
+    analyzer = ContentAnalyzer()
+    content = (
+        "Using the Reynolds number, which is computed using velocity, which decides the regime. "
+        "Using pipes which carry water, the Reynolds number and viscosity are compared using tables."
+    )
+    keywords = analyzer.analyze(content)["keywords"]
+    if keywords[0] != "reynolds" or "using" in keywords[:3]:
+        print(f"❌ Unexpected keywords: {keywords}")
+        return False
+    
+    batch = analyzer.analyze_batch([content, "Dijkstra's algorithm relaxes edges using a priority queue."], ["MECH", "CSE"])
+    if batch[0]["keywords"][:3] != keywords[:3] or "dijkstra" not in batch[1]["keywords"]:
+        print(f"❌ Unexpected batch keywords: {[result['keywords'] for result in batch]}")
+        return False
+    
+    print(f"✅ Keywords {keywords[:4]}, batch {batch[1]['keywords'][:3]}")
+    return True
+
+async def test_vector_index():
+    """Top-k search finds the nearest passages, filters by collection and survives a memory-mapped reload"""
+    print("\nTesting tutor vector index...")
+    if np is None:
+        print("⚠️ numpy not installed, skipping vector index test")
+        return True
+    
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(2000, 64)).astype(np.float32)
+    index = VectorIndex()
+    index.add(vectors[:1000], [{"text": f"passage {i}", "source": "notes"} for i in range(1000)], "cse")
+    index.add(vectors[1000:], [{"text": f"passage {i}", "source": "notes"} for i in range(1000, 2000)], "mech")
+    
+    hits = index.search(vectors[1500], k=3)
+    filtered = index.search(vectors[1500], k=3, collection="cse")
+    if hits[0][1]["text"] != "passage 1500" or any(passage["collection"] != "cse" for _, passage in filtered):
+        print(f"❌ Unexpected search results: {hits[:1]} {filtered[:1]}")
+        return False
+    
+    with tempfile.TemporaryDirectory() as directory:
+        index.save(directory)
+        loaded = VectorIndex.load(directory, mmap=True)
+        reloaded_hit = loaded.search(vectors[42], k=1)[0][1]["text"]
+        loaded.add(vectors[:1], [{"text": "extra", "source": "notes"}])
+        if reloaded_hit != "passage 42" or len(loaded) != 2001 or loaded.stats()["memory_mapped"]:
+            print(f"❌ Memory-mapped reload failed: {reloaded_hit}, {loaded.stats()}")
+            return False
+    
+    class FakeEmbedder:
+        available = True
+        
+        async def embed(self, texts, use_cache=True):
+            return np.stack([vectors[len(text) % len(vectors)] for text in texts])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        tutor = ChatTutor(FakeEmbedder(), index_dir=directory)
+        before = tutor.index
+        await tutor.index_text("Bernoulli's equation relates pressure and velocity along a streamline.", "Fluids", "mech")
+        other_worker = ChatTutor(FakeEmbedder(), index_dir=directory)
+        if len(before) != 0 or tutor.index is before or len(tutor.index) != 1 or len(other_worker.index) != 1:
+            print(f"❌ Saved tutor index was not swapped in: {len(before)} -> {len(tutor.index)}")
+            return False
+        
+        # Each ingest writes only its own segment; earlier files are left untouched until compaction
+        first_segment = [name for name in os.listdir(directory) if name.endswith(".npy")]
+        first_written = os.stat(os.path.join(directory, first_segment[0])).st_mtime_ns
+        await other_worker.index_text("Pascal's law says pressure spreads equally through a fluid.", "Fluids", "mech")
+        await tutor.index_text("Reynolds number predicts laminar or turbulent flow.", "Fluids", "mech")
+        segments = sorted(name for name in os.listdir(directory) if name.endswith(".npy"))
+        if len(segments) != 3 or os.stat(os.path.join(directory, first_segment[0])).st_mtime_ns != first_written:
+            print(f"❌ Ingest rewrote saved segments: {segments}")
+            return False
+        if len(tutor.index) != 3 or not tutor.index.stats()["memory_mapped"]:
+            print(f"❌ Tutor index missed another worker's segment: {tutor.index.stats()}")
+            return False
+        for number in range(MAX_SEGMENTS):
+            await tutor.index_text(f"Extra fluids note number {number} about viscosity.", "Fluids", "mech")
+        segments = [name for name in os.listdir(directory) if name.endswith(".npy")]
+        if len(tutor.index) != MAX_SEGMENTS + 3 or tutor.index.segment_count >= MAX_SEGMENTS or len(segments) != tutor.index.segment_count:
+            print(f"❌ Segments were not compacted: {tutor.index.stats()} {len(segments)} files")
+            return False
+    
+    print(f"✅ Vector index search, collection filter and memory-mapped reload work ({index.stats()})")
+    return True
+
 async def main():
     """Main test function"""
     print("🚀 Starting AI Service Tests...\n")
     
     success = await test_question_generator()
+    success = await test_gemini_calls_run_concurrently() and success
+    success = await test_gemini_timeout_holds_slot() and success
+    success = await test_packed_batch() and success
+    success = await test_chunked_generation() and success
+    success = await test_gemini_scheduler() and success
+    success = await test_circuit_breaker() and success
+    success = await test_question_cache() and success
+    success = await test_question_model() and success
+    success = await test_request_coalescing() and success
+    success = await test_latency_budget() and success
+    success = await test_question_bank() and success
+    success = await test_pool_warmer() and success
+    success = await test_pdf_cache() and success
+    success = await test_job_queue() and success
+    success = await test_question_dedup() and success
+    success = await test_response_parsing() and success
+    success = await test_fast_json_response() and success
+    success = await test_token_verifier() and success
+    success = await test_metrics() and success
+    success = await test_url_guard() and success
+    success = await test_pdf_upload() and success
+    success = await test_streamed_questions() and success
+    success = await test_content_analyzer() and success
+    success = await test_keyword_engine() and success
+    success = await test_vector_index() and success
     
     if success:
         print("\n🎉 All tests passed! The AI service is working correctly.")
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Run the question pool warmer as its own local process, using the same .env
+settings as the service (no message broker needed).
+
+Usage: python warm_question_pool.py [--once]
+  --once   run a single top-up pass now, ignoring POOL_WARM_HOURS, then exit
+"""
+import asyncio
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as service
+
+async def run(once: bool) -> int:
+    warmer = service.pool_warmer
+    if warmer is None:
+        print("❌ Pool warming needs GEMINI_API_KEY and QUESTION_BANK_ENABLED=true")
+        return 1
+    
+    if once:
+        summary = await warmer.run_once()
+        print(f"✅ Topped up {summary['topped_up']} of {summary['combinations']} pools with {summary['generated']} questions")
+    else:
+        print(f"Warming {warmer.stats()['combinations']} question pools (off-peak hours: {warmer.off_peak_hours or 'always'})")
+        await warmer.run_forever()
+    service.question_bank.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run("--once" in sys.argv[1:])))